@@ -48,6 +48,13 @@ def run_tests():
         "Running test suite"
     )
 
+def run_benchmarks():
+    """Run the send throughput benchmark."""
+    return run_command(
+        "python benchmarks/wake_throughput.py",
+        "Running send throughput benchmark"
+    )
+
 def build_windows():
     """Build Windows executable."""
     return run_command(
@@ -124,7 +131,7 @@ def main():
     """Main function."""
     parser = argparse.ArgumentParser(description="Development task runner")
     parser.add_argument('task', choices=[
-        'install', 'install-build', 'run', 'test', 'build-windows', 
+        'install', 'install-build', 'run', 'test', 'bench', 'build-windows', 
         'build-linux', 'clean', 'help'
     ], help='Task to run')
     
@@ -136,6 +143,7 @@ def main():
         print("  install-build - Install build dependencies")
         print("  run          - Run application in development mode")
         print("  test         - Run test suite")
+        print("  bench        - Run send throughput benchmark")
         print("  build-windows - Build Windows executable")
         print("  build-linux  - Build Linux executable")
         print("  clean        - Clean build artifacts")
@@ -146,6 +154,7 @@ def main():
         'install-build': install_build_deps,
         'run': run_app,
         'test': run_tests,
+        'bench': run_benchmarks,
         'build-windows': build_windows,
         'build-linux': build_linux,
         'clean': clean,
@@ -46,9 +46,7 @@ setup(
         "Topic :: Utilities",
     ],
     python_requires=">=3.7",
-    install_requires=[
-        "wakeonlan>=3.1.0",
-    ],
+    install_requires=[],
     extras_require={
         "build": [
             "pyinstaller>=5.0",
@@ -10,6 +10,7 @@ __description__ = "Simple Wake-on-LAN Application"
 
 from .app import WakeOnLanApp
 from .device import Device
+from .registry import DeviceRegistry
 from .config import ConfigManager
 
-__all__ = ['WakeOnLanApp', 'Device', 'ConfigManager', '__version__']
+__all__ = ['WakeOnLanApp', 'Device', 'DeviceRegistry', 'ConfigManager', '__version__']
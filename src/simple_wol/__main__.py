@@ -1,9 +1,27 @@
 """
 Entry point for the Simple Wake-on-LAN application.
+
+Usage:
+    python -m simple_wol            Start the GUI
+    python -m simple_wol relay ...  Run a wake relay agent (see --help)
+    python -m simple_wol wake ...   Wake saved devices by group, tag or name
 """
 
-from .app import main
+import sys
 
 
-if __name__ == "__main__":
+def run():
+    """Dispatch to the GUI or to a command-line mode."""
+    if len(sys.argv) > 1 and sys.argv[1] == 'relay':
+        from .network.relay import main as relay_main
+        sys.exit(relay_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == 'wake':
+        from .cli import wake_main
+        sys.exit(wake_main(sys.argv[2:]))
+    
+    from .app import main
     main()
+
+
+if __name__ == "__main__":
+    run()
@@ -2,12 +2,17 @@
 Main application class for the Simple Wake-on-LAN application.
 """
 
+import queue
+import threading
 import tkinter as tk
 from tkinter import messagebox
-from typing import List
+from typing import Optional
 
-from .device import Device
 from .config import ConfigManager
+from .config.importer import ImportCancelled, ImportResult, StreamingImporter
+from .config.merge import ingest_neighbors, merge_devices
+from .network.discovery import read_neighbors
+from .ui.import_dialog import ImportDialog
 from .ui.main_window import MainWindow
 from . import __version__
 
@@ -24,76 +29,243 @@ class WakeOnLanApp:
         """
         self.root = root
         self.config_manager = ConfigManager()
-        self.devices: List[Device] = []
+        self.importer: Optional[StreamingImporter] = None
+        self._load_job: Optional[str] = None
         
-        # Create main window
+        # Create main window; its registry holds the devices shown and saved
         self.main_window = MainWindow(root)
         self.main_window.set_device_changed_callback(self.on_devices_changed)
+        self.registry = self.main_window.registry
+        
+        # Edits other programs make to the config file are picked up once
+        # the device list has loaded
+        self.external_changes: 'queue.Queue' = queue.Queue()
+        self.root.after(500, self.poll_external_changes)
         
         # Load devices from config
         self.load_devices()
+        
+        # Saves run on a background thread; report their errors and flush on exit
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(500, self.poll_save_errors)
     
     def load_devices(self):
-        """Load devices from config file and populate the UI."""
+        """
+        Load devices from config file and populate the UI.
+        
+        The first page is shown right away and the rest are appended with
+        after(), so a large list does not keep the window from appearing.
+        """
+        self.main_window.loading = True
+        try:
+            pages = self.config_manager.iter_device_pages()
+            self.main_window.set_devices(next(pages, []))
+        except Exception as e:
+            self.load_failed(e)
+            return
+        self._load_job = self.root.after(1, lambda: self.load_next_page(pages))
+    
+    def load_next_page(self, pages):
+        """Append the next page of devices, or finish loading after the last one."""
+        self._load_job = None
         try:
-            self.devices = self.config_manager.load_devices()
-            self.main_window.set_devices(self.devices)
+            page = next(pages, None)
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to load devices: {str(e)}")
-            self.devices = []
-            self.main_window.set_devices(self.devices)
+            self.load_failed(e)
+            return
+        if page is None:
+            self.load_finished()
+            return
+        self.main_window.append_devices(page)
+        self._load_job = self.root.after(1, lambda: self.load_next_page(pages))
+    
+    def load_failed(self, error: Exception):
+        """Show a loading error and start from an empty list."""
+        messagebox.showerror("Error", f"Failed to load devices: {str(error)}")
+        self.main_window.set_devices([])
+        self.load_finished()
+    
+    def load_finished(self):
+        """Allow edits and start watching the config file once the list has loaded."""
+        self.main_window.loading = False
+        self.config_manager.watch(self.external_changes.put)
     
     def save_devices(self):
-        """Save current devices to config file."""
+        """Save current devices to config file in the background."""
+        self.config_manager.schedule_save(self.registry.devices())
+    
+    def record_change(self, change):
+        """Journal a single device change in the background."""
+        self.config_manager.schedule_change(change)
+    
+    def poll_save_errors(self):
+        """Show errors raised by background saves."""
+        try:
+            error = self.config_manager.save_errors.get_nowait()
+        except queue.Empty:
+            pass
+        else:
+            messagebox.showerror("Error", str(error))
+        self.root.after(500, self.poll_save_errors)
+    
+    def poll_external_changes(self):
+        """Apply changes other programs made to the config file."""
+        changes = 0
         try:
-            self.config_manager.save_devices(self.devices)
+            while True:
+                diff = self.external_changes.get_nowait()
+                self.main_window.apply_device_diff(diff)
+                changes += len(diff.added) + len(diff.updated) + len(diff.removed)
+        except queue.Empty:
+            pass
+        
+        if changes:
+            # Save the merged list so edits made meanwhile cannot hide the external ones
+            self.save_devices()
+            self.main_window.set_status(f"Reloaded {changes} device change(s) made outside the app")
+        self.root.after(500, self.poll_external_changes)
+    
+    def on_close(self):
+        """Finish queued wakes and write pending saves before the window closes."""
+        if self.importer is not None:
+            self.importer.cancel()
+        self.main_window.close()
+        try:
+            self.config_manager.close()
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to save devices: {str(e)}")
+            if not messagebox.askyesno("Error", f"{str(e)}\n\nQuit anyway?"):
+                return
+        if self._load_job is not None:
+            self.root.after_cancel(self._load_job)
+            self._load_job = None
+        self.root.destroy()
     
-    def on_devices_changed(self, export_path=None, import_path=None):
+    def on_devices_changed(self, export_path=None, import_path=None, change=None, discover=None):
         """
         Handle device list changes.
         
         Args:
             export_path: Path to export devices to (if provided)
             import_path: Path to import devices from (if provided)
+            change: Journal record describing a single change (if known)
+            discover: (source, path) to add discovered devices from (if provided)
         """
         if export_path:
             self.export_devices(export_path)
         elif import_path:
             self.import_devices(import_path)
+        elif discover:
+            self.discover_devices(*discover)
         else:
             # Regular device list change
-            self.devices = self.main_window.devices
-            self.save_devices()
+            if change:
+                self.record_change(change)
+            else:
+                self.save_devices()
     
     def export_devices(self, export_path: str):
         """Export devices to a file."""
-        if not self.devices:
+        if not len(self.registry):
             messagebox.showwarning("No Devices", "No devices to export.")
             return
         
         try:
-            self.config_manager.export_devices(self.devices, export_path)
+            self.config_manager.export_devices(self.registry.devices(), export_path)
             messagebox.showinfo("Success", f"Devices exported to {export_path}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to export devices: {str(e)}")
     
-    def import_devices(self, import_path: str):
-        """Import devices from a file."""
+    def discover_devices(self, source: str, path: Optional[str] = None):
+        """Add devices found in a neighbour table or DHCP lease file."""
         try:
-            imported_devices = self.config_manager.import_devices(import_path)
-            
-            if messagebox.askyesno("Import Devices", 
-                                 f"Import {len(imported_devices)} device(s)? "
-                                 "This will replace your current device list."):
-                self.devices = imported_devices
-                self.main_window.set_devices(self.devices)
-                self.save_devices()
-                messagebox.showinfo("Success", f"Imported {len(imported_devices)} device(s)")
-            
+            neighbors = read_neighbors(source, path)
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to import devices: {str(e)}")
+            messagebox.showerror("Error", f"Failed to read devices: {str(e)}")
+            return
+        
+        devices, summary = ingest_neighbors(self.registry.devices(), neighbors)
+        if not summary.added and not summary.updated:
+            messagebox.showinfo("Discover Devices",
+                                f"Found {len(neighbors)} address(es); nothing new.")
+            return
+        
+        if messagebox.askyesno("Discover Devices",
+                               f"Found {summary.added} new device(s) and "
+                               f"{summary.updated} known device(s) with a new IP address. "
+                               "Add them to your device list?"):
+            self.main_window.set_devices(devices)
+            self.save_devices()
+    
+    def import_devices(self, import_path: str):
+        """Import devices from a file on a background thread."""
+        if self.importer is not None:
+            messagebox.showwarning("Import Running", "Another import is still running.")
+            return
+        
+        importer = self.importer = StreamingImporter(import_path)
+        events: 'queue.Queue' = queue.Queue()
+        
+        def work():
+            try:
+                events.put(('done', importer.run(lambda p: events.put(('progress', p)))))
+            except Exception as e:
+                events.put(('error', e))
+        
+        threading.Thread(target=work, name='simple-wol-import', daemon=True).start()
+        self.main_window.set_status("Importing devices...")
+        self.root.after(100, lambda: self.poll_import(events))
+    
+    def poll_import(self, events: 'queue.Queue'):
+        """Show import progress and ask for confirmation once parsing is done."""
+        result = None
+        try:
+            while True:
+                kind, value = events.get_nowait()
+                if kind == 'progress':
+                    self.main_window.set_status(
+                        f"Importing devices... {value.imported:,} read "
+                        f"({value.fraction:.0%}, {value.skipped:,} skipped)")
+                elif kind == 'done':
+                    result = value
+                    break
+                else:
+                    self.importer = None
+                    self.main_window.set_status("")
+                    if not isinstance(value, ImportCancelled):
+                        messagebox.showerror("Error", f"Failed to import devices: {str(value)}")
+                    return
+        except queue.Empty:
+            self.root.after(100, lambda: self.poll_import(events))
+            return
+        
+        self.importer = None
+        self.main_window.set_status("")
+        ImportDialog(self.root, result, len(self.registry),
+                     callback=lambda mode, policy: self.apply_import(result, mode, policy))
+    
+    def apply_import(self, result: ImportResult, mode: str, policy: str):
+        """
+        Replace the device list with imported devices or merge them into it.
+        
+        Args:
+            result: Devices read from the import file
+            mode: ImportDialog.MERGE or ImportDialog.REPLACE
+            policy: Conflict policy for merges (see config.merge)
+        """
+        if mode == ImportDialog.MERGE:
+            devices, summary = merge_devices(self.registry.devices(), result.devices, policy)
+            message = (f"Added {summary.added} device(s), updated {summary.updated}, "
+                       f"{summary.unchanged} already up to date.")
+            if summary.kept:
+                message += (f"\n{summary.kept} of {summary.conflicts} conflicting device(s) "
+                            "kept their current settings.")
+        else:
+            devices = result.devices
+            message = f"Imported {len(result.devices)} device(s)"
+        
+        self.main_window.set_devices(devices)
+        self.save_devices()
+        messagebox.showinfo("Success", message)
     
     def run(self):
         """Run the application main loop."""
@@ -0,0 +1,137 @@
+"""
+Command-line wake-up of saved devices.
+
+Usage:
+    python -m simple_wol wake [--config FILE] [--group GROUP] [--tag TAG]
+                              [--rate N] [--burst N] [--wave-size N] [--wave-delay SECONDS]
+                              [--relay HOST:PORT [--relay-key-file FILE]]
+                              [NAME ...]
+
+Devices are selected through the registry's indexes and handed to
+WakeOnLanSender.wake_many() in paced waves (WaveScheduler), planned by one
+NetworkPlanner. Devices with a retry policy (Device.retry) are resent to
+before the command exits. With --relay the selection is sent to a relay
+agent on the devices' subnet instead, in one signed request per batch.
+"""
+
+import argparse
+import functools
+from typing import Dict, Iterable, List, Optional
+
+from .config import ConfigManager
+from .device import Device
+from .network.planner import NetworkPlanner
+from .network.relay import KEY_ENV, parse_relay_address, read_key, relay_wake
+from .network.retry import RetryPolicy, RetryScheduler
+from .network.scheduler import WaveScheduler
+from .network.wol import WakeOnLanSender
+from .registry import DeviceRegistry
+
+
+def select_devices(registry: DeviceRegistry, groups: Iterable[str] = (),
+                   tags: Iterable[str] = (), names: Iterable[str] = ()) -> List[Device]:
+    """
+    Collect the devices in any of the groups, with any of the tags or with
+    any of the names, each device once.
+
+    Args:
+        registry: Devices to choose from
+        groups: Group names, ignoring case
+        tags: Tags, ignoring case
+        names: Device names, ignoring case
+
+    Returns:
+        The selected devices, in registry order
+    """
+    selected: Dict[int, None] = {}
+    for group in groups:
+        selected.update(dict.fromkeys(registry.by_group(group)))
+    for tag in tags:
+        selected.update(dict.fromkeys(registry.by_tag(tag)))
+    for name in names:
+        selected.update(dict.fromkeys(registry.by_name(name)))
+    return [registry.get(device_id) for device_id in sorted(selected, key=registry.position)]
+
+
+def wake_main(argv: Optional[List[str]] = None) -> int:
+    """Wake saved devices from the command line."""
+    parser = argparse.ArgumentParser(prog='simple_wol wake',
+                                     description="Wake saved devices by group, tag or name")
+    parser.add_argument('names', nargs='*', metavar='NAME', help='Device names to wake')
+    parser.add_argument('--config', default='devices.json', help='Device file to read')
+    parser.add_argument('--group', action='append', default=[], help='Wake every device in a group')
+    parser.add_argument('--tag', action='append', default=[], help='Wake every device with a tag')
+    parser.add_argument('--rate', type=float, default=100.0, help='Maximum packets per second')
+    parser.add_argument('--burst', type=int, default=10, help='Maximum packets sent back to back')
+    parser.add_argument('--wave-size', type=int, default=50, help='Devices per wave')
+    parser.add_argument('--wave-delay', type=float, default=5.0,
+                        help='Seconds to pause between waves')
+    parser.add_argument('--relay', metavar='HOST:PORT',
+                        help='Send through the relay agent at this address instead')
+    parser.add_argument('--relay-key-file', help=f'File holding the relay\'s shared secret '
+                                                 f'(default: ${KEY_ENV})')
+    args = parser.parse_args(argv)
+    if not (args.names or args.group or args.tag):
+        parser.error("give at least one NAME, --group or --tag")
+
+    relay = key = None
+    if args.relay:
+        try:
+            relay = parse_relay_address(args.relay)
+            key = read_key(args.relay_key_file)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        if key is None:
+            parser.error(f"--relay needs the relay's key: set ${KEY_ENV} or pass --relay-key-file")
+
+    planner = NetworkPlanner()
+    send = functools.partial(WakeOnLanSender.wake_many, planner=planner)
+    try:
+        waves = WaveScheduler(args.rate, args.burst, args.wave_size, args.wave_delay, send=send)
+    except ValueError as e:
+        parser.error(str(e))
+
+    config_manager = ConfigManager(args.config)
+    try:
+        registry = DeviceRegistry(config_manager.load_devices())
+    finally:
+        config_manager.close()
+
+    devices = select_devices(registry, args.group, args.tag, args.names)
+    if not devices:
+        print("No matching devices")
+        return 1
+
+    if relay is not None:
+        try:
+            sent = relay_wake(relay, devices, key)
+        except Exception as e:
+            print(str(e))
+            return 1
+        print(f"Relay {relay[0]}:{relay[1]} sent {sent} of {len(devices)} packet(s)")
+        return 0 if sent == len(devices) else 1
+
+    # Only devices with their own retry settings are resent to, counting
+    # from the wave each was sent in
+    retries = RetryScheduler(RetryPolicy(count=0), send=send)
+    retry_runs = []
+    failed = 0
+
+    def report(results):
+        nonlocal failed
+        for result in results:
+            if result.success:
+                print(f"Sent: {result.device.name} ({result.device.mac_address})")
+            else:
+                failed += 1
+                print(f"Failed: {result.device.name}: {result.error}")
+        retry_runs.append(retries.schedule([result.device for result in results]))
+
+    run = waves.start(devices, on_progress=report)
+    run.wait()
+    if run.error is not None:
+        print(f"Stopped after {len(run.results)} of {len(devices)} devices: {run.error}")
+        failed += len(devices) - len(run.results)
+    for retry_run in retry_runs:
+        retry_run.wait()
+    return 1 if failed else 0
@@ -0,0 +1,144 @@
+"""
+Storage backends for the device configuration.
+"""
+
+import json
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ..device import Device
+from .journal import DeviceJournal, apply_record, snapshot_signature
+from .load_cache import LoadCache, snapshot_digest
+from .writer import atomic_write
+
+
+class StorageBackend:
+    """Base class for device storage backends used by ConfigManager."""
+
+    def load_devices(self) -> List[Device]:
+        """Load the complete device list."""
+        raise NotImplementedError
+
+    def save_devices(self, devices: List[Device]) -> None:
+        """Replace the stored device list."""
+        raise NotImplementedError
+
+    def record_changes(self, records: List[Dict], devices: List[Device]) -> None:
+        """
+        Persist a batch of changes.
+
+        Args:
+            records: Journal records describing the changes (see config.journal)
+            devices: The complete device list after the changes
+        """
+        raise NotImplementedError
+
+    def iter_pages(self, page_size: int = 1000) -> Iterator[List[Device]]:
+        """
+        Load the device list one page at a time.
+
+        Args:
+            page_size: Devices per page
+
+        Yields:
+            Lists of at most page_size devices, in list order
+        """
+        devices = self.load_devices()
+        for start in range(0, len(devices), page_size):
+            yield devices[start:start + page_size]
+
+    def exists(self) -> bool:
+        """Check whether anything has been stored yet."""
+        raise NotImplementedError
+
+    def changed_externally(self) -> bool:
+        """Check whether another program has changed the storage since the last load or save."""
+        return False
+
+    def close(self) -> None:
+        """Release any open files or connections."""
+
+
+class JsonBackend(StorageBackend):
+    """Stores devices as a JSON snapshot plus an append-only change journal."""
+
+    def __init__(self, config_file: str, compact_after: int = 500, load_cache: bool = True):
+        """
+        Initialize the backend.
+
+        Args:
+            config_file: Path to the JSON snapshot
+            compact_after: Number of journaled changes after which the
+                journal is folded into a fresh snapshot
+            load_cache: Keep a binary copy of the parsed snapshot next to it
+                so later loads skip JSON parsing
+        """
+        self.config_file = config_file
+        self.compact_after = compact_after
+        self.journal = DeviceJournal(config_file + '.journal')
+        self.cache = LoadCache(config_file + '.cache') if load_cache else None
+        # Snapshot signature as of the last load or save
+        self.signature: Optional[Tuple[int, int]] = None
+
+    def load_devices(self) -> List[Device]:
+        devices = self._load_snapshot()
+
+        for record in self.journal.records(snapshot_signature(self.config_file)):
+            apply_record(devices, record)
+
+        if not self.journal.valid and self.journal.count:
+            # Fold the records recovered from a damaged journal into the snapshot.
+            self.save_devices(devices)
+        return devices
+
+    def save_devices(self, devices: List[Device]) -> None:
+        data = json.dumps([device.to_dict() for device in devices], indent=2).encode('utf-8')
+        atomic_write(self.config_file, data)
+        signature = self.signature = snapshot_signature(self.config_file)
+        self.journal.reset(signature)
+        self._store_cache(devices, signature, data)
+
+    def _load_snapshot(self) -> List[Device]:
+        """Read the snapshot, from the load cache when it is up to date."""
+        try:
+            with open(self.config_file, 'rb') as f:
+                data = f.read()
+                stat = os.fstat(f.fileno())
+        except FileNotFoundError:
+            self.signature = None
+            return []
+
+        signature = (stat.st_size, stat.st_mtime_ns)
+        devices = None
+        if self.cache is not None:
+            devices = self.cache.load(signature, snapshot_digest(data))
+        if devices is None:
+            devices = [Device.from_dict(item) for item in json.loads(data)]
+            self._store_cache(devices, signature, data)
+        self.signature = signature
+        return devices
+
+    def _store_cache(self, devices: List[Device], signature, data: bytes) -> None:
+        if self.cache is None:
+            return
+        try:
+            self.cache.store(devices, signature, snapshot_digest(data))
+        except OSError:
+            # The cache only speeds up loading; the snapshot itself was fine.
+            pass
+
+    def record_changes(self, records: List[Dict], devices: List[Device]) -> None:
+        if not self.journal.valid or self.journal.count + len(records) >= self.compact_after:
+            self.save_devices(devices)
+            return
+        for record in records:
+            self.journal.append(record)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.config_file)
+
+    def changed_externally(self) -> bool:
+        return snapshot_signature(self.config_file) != self.signature
+
+    def close(self) -> None:
+        self.journal.close()
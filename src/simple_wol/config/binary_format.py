@@ -0,0 +1,208 @@
+"""
+Compact binary device export format (.swol).
+
+Layout, all integers in network byte order:
+
+    header   '!4sBBI'   magic b'SWOL', version, flags, device count
+    body                zlib-compressed if FLAG_ZLIB is set
+      sizes  '!II'      byte length of the string table and of the extras
+      records           one RECORD per device
+      strings           UTF-8 device names separated by NUL bytes
+      extras            JSON object of rarely used fields by record index
+
+A record holds the 6 MAC bytes, the address family (0 for none, 4 or 6)
+and a 16-byte packed IP address, the port, the index of the name in the
+string table and the edit time (NaN if unknown). MAC addresses that do
+not parse (stored as zero bytes in the record), addresses that are not IP
+addresses (host names), retry settings, groups and tags go into the
+extras.
+
+Files may come from other hosts, so loads_devices() bounds decompression
+by the device count in the header and type-checks the extras; importers
+should still validate the devices like those of any other format.
+"""
+
+import json
+import math
+import struct
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from ..device import Device
+from ..validation import normalize_tags
+
+MAGIC = b'SWOL'
+VERSION = 1
+FLAG_ZLIB = 0x01
+
+HEADER = struct.Struct('!4sBBI')
+SIZES = struct.Struct('!II')
+RECORD = struct.Struct('!6sB16sHId')
+
+# Largest device count accepted in a header
+MAX_DEVICES = 1000000
+
+# Room allowed per device for its name and extras when decompressing, on
+# top of its fixed-size record; real files stay far below it
+MAX_VARIABLE_BYTES_PER_DEVICE = 4096
+
+
+def dumps_devices(devices: List[Device], compress: bool = True) -> bytes:
+    """
+    Encode devices in the binary format.
+
+    Args:
+        devices: Devices to encode
+        compress: Compress the body with zlib
+
+    Returns:
+        The encoded file contents
+
+    Raises:
+        ValueError: If a name contains a NUL character, a port is not a
+            number between 0 and 65535 or an edit time is not a number
+    """
+    names: Dict[str, int] = {}
+    extras: Dict[str, Dict] = {}
+    records = bytearray()
+    for index, device in enumerate(devices):
+        name, mac, ip, port, retry, updated_at, group, tags = device.to_packed()
+        if '\0' in name:
+            raise ValueError(f"Device name contains a NUL character: {name!r}")
+        name_index = names.setdefault(name, len(names))
+
+        if isinstance(port, bool) or not isinstance(port, int) or not 0 <= port <= 65535:
+            raise ValueError(f"Invalid port for {name!r}: {port!r}")
+        if updated_at is None:
+            updated_at = math.nan
+        elif isinstance(updated_at, bool) or not isinstance(updated_at, (int, float)):
+            raise ValueError(f"Invalid edit time for {name!r}: {updated_at!r}")
+
+        if not isinstance(mac, bytes):
+            extras.setdefault(str(index), {})['mac_address'] = mac
+            mac = bytes(6)
+        family, address = 0, b''
+        if isinstance(ip, bytes):
+            family, address = (4 if len(ip) == 4 else 6), ip
+        elif ip:
+            extras.setdefault(str(index), {})['ip_address'] = ip
+        if retry:
+            extras.setdefault(str(index), {})['retry'] = retry
+        if group:
+            extras.setdefault(str(index), {})['group'] = group
+        if tags:
+            extras.setdefault(str(index), {})['tags'] = tags
+
+        records += RECORD.pack(mac, family, address, port, name_index, updated_at)
+
+    strings = '\0'.join(names).encode('utf-8')
+    extra_data = json.dumps(extras, separators=(',', ':')).encode('utf-8') if extras else b''
+    body = SIZES.pack(len(strings), len(extra_data)) + bytes(records) + strings + extra_data
+    flags = 0
+    if compress:
+        body = zlib.compress(body)
+        flags |= FLAG_ZLIB
+    return HEADER.pack(MAGIC, VERSION, flags, len(devices)) + body
+
+
+def loads_devices(data: bytes) -> List[Device]:
+    """
+    Decode devices from the binary format.
+
+    Args:
+        data: Encoded file contents
+
+    Returns:
+        The devices, in their original order
+
+    Raises:
+        ValueError: If the data is not a supported binary device file
+    """
+    if len(data) < HEADER.size:
+        raise ValueError("File is too short to be a binary device file")
+    magic, version, flags, count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a binary device file")
+    if version != VERSION:
+        raise ValueError(f"Unsupported binary device file version: {version}")
+
+    if count > MAX_DEVICES:
+        raise ValueError(f"Binary device file lists too many devices: {count:,}")
+
+    body = data[HEADER.size:]
+    if flags & FLAG_ZLIB:
+        # Stop inflating at the largest body the header's count allows, so a
+        # small crafted file cannot expand without bound
+        limit = (SIZES.size + count * (RECORD.size + MAX_VARIABLE_BYTES_PER_DEVICE)
+                 + MAX_VARIABLE_BYTES_PER_DEVICE)
+        decompressor = zlib.decompressobj()
+        try:
+            body = decompressor.decompress(body, limit)
+        except zlib.error as e:
+            raise ValueError(f"Corrupt binary device file: {str(e)}")
+        if decompressor.unconsumed_tail:
+            raise ValueError("Binary device file is larger than its device count allows")
+        if not decompressor.eof:
+            raise ValueError("Binary device file is truncated")
+
+    if len(body) < SIZES.size:
+        raise ValueError("Binary device file is truncated")
+    strings_size, extras_size = SIZES.unpack_from(body)
+    start = SIZES.size
+    end = start + count * RECORD.size
+    if len(body) != end + strings_size + extras_size:
+        raise ValueError("Binary device file is truncated")
+
+    names = body[end:end + strings_size].decode('utf-8').split('\0')
+    extras = json.loads(body[end + strings_size:].decode('utf-8')) if extras_size else {}
+    if not isinstance(extras, dict):
+        raise ValueError("Corrupt binary device file: extras are not an object")
+
+    from_packed = Device.from_packed
+    devices = []
+    for index, (mac, family, address, port, name_index, updated_at) in enumerate(
+            RECORD.iter_unpack(body[start:end])):
+        if family == 4:
+            ip = address[:4]
+        elif family == 6:
+            ip = address
+        else:
+            ip = ''
+        retry = None
+        group, tags = '', ()
+        extra = extras.get(str(index))
+        if extra is not None:
+            mac, ip, retry, group, tags = _extra_fields(extra, index, mac, ip)
+        try:
+            name = names[name_index]
+        except IndexError:
+            raise ValueError(f"Corrupt binary device file: bad name index in record {index}")
+        devices.append(from_packed(name, mac, ip, port, retry,
+                                   None if math.isnan(updated_at) else updated_at, group, tags))
+    return devices
+
+
+def _extra_fields(extra, index: int, mac: bytes,
+                  ip) -> Tuple[object, object, Optional[Dict], str, Tuple[str, ...]]:
+    """
+    Check the extras of a record.
+
+    Returns:
+        The record's MAC address, IP address, retry settings, group and
+        normalized tags
+
+    Raises:
+        ValueError: If a field has the wrong type
+    """
+    if not isinstance(extra, dict):
+        raise ValueError(f"Corrupt binary device file: bad extras for record {index}")
+    mac = extra.get('mac_address', mac)
+    ip = extra.get('ip_address', ip)
+    retry = extra.get('retry')
+    group = extra.get('group', '')
+    tags = extra.get('tags', ())
+    if (not isinstance(mac, (str, bytes)) or not isinstance(ip, (str, bytes)) or not isinstance(retry, (dict, type(None)))
+            or not isinstance(group, str) or not isinstance(tags, (str, list, tuple))
+            or not all(isinstance(tag, str) for tag in tags)):
+        raise ValueError(f"Corrupt binary device file: bad extras for record {index}")
+    return mac, ip, retry, group.strip(), normalize_tags(tags)
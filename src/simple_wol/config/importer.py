@@ -0,0 +1,418 @@
+"""
+Streaming device import from JSON arrays, JSON Lines, CSV and binary files.
+
+Files are read in chunks and records are validated in small batches as
+they are parsed, so memory use does not depend on the size of the file
+beyond the devices themselves. Binary exports (see
+config.binary_format) are compact enough to be decoded in one go.
+"""
+
+import codecs
+import csv
+import json
+import os
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from .. import validation
+from ..device import Device
+from .binary_format import MAGIC, loads_devices
+
+FORMAT_JSON = 'json'
+FORMAT_JSON_LINES = 'jsonl'
+FORMAT_CSV = 'csv'
+FORMAT_BINARY = 'binary'
+
+BINARY_EXTENSION = '.swol'
+
+CHUNK_SIZE = 64 * 1024
+
+# Longest JSON array element accepted; a malformed element would otherwise
+# make the parser buffer the rest of the file looking for its end
+MAX_RECORD_SIZE = 1024 * 1024
+
+# Record errors beyond this many are counted but not kept.
+MAX_ERRORS = 100
+
+# CSV header names accepted for each device field.
+CSV_FIELDS = {
+    'name': 'name',
+    'device name': 'name',
+    'mac': 'mac_address',
+    'mac address': 'mac_address',
+    'mac_address': 'mac_address',
+    'ip': 'ip_address',
+    'ip address': 'ip_address',
+    'ip_address': 'ip_address',
+    'port': 'port',
+    'updated_at': 'updated_at',
+    'group': 'group',
+    'tags': 'tags',
+}
+
+
+class ImportProgress(NamedTuple):
+    """Progress of a running import."""
+    bytes_read: int
+    total_bytes: int
+    imported: int
+    skipped: int
+
+    @property
+    def fraction(self) -> float:
+        """Share of the file read so far, between 0 and 1."""
+        return self.bytes_read / self.total_bytes if self.total_bytes else 1.0
+
+
+class ImportResult(NamedTuple):
+    """Outcome of an import."""
+    devices: List[Device]
+    skipped: int
+    errors: List[Tuple[int, str]]  # (record number, message), at most MAX_ERRORS
+
+
+class ImportCancelled(Exception):
+    """Raised by StreamingImporter.run() after cancel() was called."""
+
+
+def detect_format(path: str) -> str:
+    """
+    Work out the format of an import file.
+
+    The file extension decides where it is unambiguous; otherwise the
+    binary magic number or the first non-blank character tell the formats
+    apart.
+
+    Args:
+        path: Import file path
+
+    Returns:
+        FORMAT_JSON, FORMAT_JSON_LINES, FORMAT_CSV or FORMAT_BINARY
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.jsonl', '.ndjson'):
+        return FORMAT_JSON_LINES
+    if extension in ('.csv', '.tsv'):
+        return FORMAT_CSV
+    if extension == BINARY_EXTENSION:
+        return FORMAT_BINARY
+
+    with open(path, 'rb') as f:
+        start = f.read(CHUNK_SIZE)
+    if start.startswith(MAGIC):
+        return FORMAT_BINARY
+    start = start.lstrip(codecs.BOM_UTF8 + b' \t\r\n')
+    if start.startswith(b'{'):
+        return FORMAT_JSON_LINES
+    return FORMAT_JSON
+
+
+def _validate_other_fields(data) -> Tuple[str, Optional[float], str, Tuple[str, ...]]:
+    """Check the name, updated_at, group and tags fields of a record."""
+    if not isinstance(data, dict):
+        raise ValueError("Record is not an object")
+
+    name = str(data.get('name') or '').strip()
+    if not name:
+        raise ValueError("Missing device name")
+
+    updated_at = data.get('updated_at')
+    if updated_at in (None, ''):
+        updated_at = None
+    else:
+        try:
+            updated_at = float(updated_at)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid updated_at timestamp: {updated_at!r}")
+
+    tags = data.get('tags')
+    if tags is not None and not isinstance(tags, (str, list)):
+        raise ValueError(f"Invalid tags: {tags!r}")
+
+    return name, updated_at, str(data.get('group') or '').strip(), validation.normalize_tags(tags)
+
+
+def _field(record, key: str) -> str:
+    value = record.get(key) if isinstance(record, dict) else None
+    return str(value or '').strip()
+
+
+def validate_records(records: List) -> Tuple[List[Device], List[Tuple[int, str]]]:
+    """
+    Check a batch of imported records and build their devices.
+
+    The MAC addresses, IP addresses and ports are validated column by
+    column (see simple_wol.validation); MAC addresses come out in
+    AA:BB:CC:DD:EE:FF form. The IP address may also be a host name, as
+    the device dialog allows.
+
+    Args:
+        records: Records with name, mac_address and optional ip_address,
+            port, retry, updated_at, group and tags (a list, or a string
+            separated by commas or semicolons)
+
+    Returns:
+        The devices of the valid records, in order, and a (position, message)
+        pair for each invalid one, position being its index in records
+    """
+    macs = validation.validate_macs([_field(record, 'mac_address') for record in records])
+    ips = validation.validate_ips([_field(record, 'ip_address') for record in records],
+                                  allow_host_names=True)
+    ports = validation.validate_ports([record.get('port') if isinstance(record, dict) else None
+                                       for record in records])
+
+    # First error per record; the name is checked before the other fields
+    failures: Dict[int, str] = {}
+    for error in macs.errors + ips.errors + ports.errors:
+        failures.setdefault(error.row, error.message)
+
+    devices: List[Device] = []
+    errors: List[Tuple[int, str]] = []
+    for row, record in enumerate(records):
+        try:
+            name, updated_at, group, tags = _validate_other_fields(record)
+        except ValueError as e:
+            errors.append((row, str(e)))
+            continue
+        if row in failures:
+            errors.append((row, failures[row]))
+            continue
+        retry = record.get('retry')
+        devices.append(Device(name, macs.values[row], ips.values[row], ports.values[row],
+                              retry if isinstance(retry, dict) else None, updated_at,
+                              group, tags))
+    return devices, errors
+
+
+def validate_record(data: Dict) -> Device:
+    """
+    Check an imported record and build its device.
+
+    Args:
+        data: Record with name, mac_address and optional ip_address, port,
+            retry, updated_at, group and tags
+
+    Returns:
+        The device
+
+    Raises:
+        ValueError: If the record is not a valid device
+    """
+    devices, errors = validate_records([data])
+    if errors:
+        raise ValueError(errors[0][1])
+    return devices[0]
+
+
+class StreamingImporter:
+    """
+    Reads devices from a file incrementally.
+
+    run() may be called on a background thread; on_progress is then called
+    on that thread and cancel() may be called from any other.
+    """
+
+    def __init__(self, path: str, file_format: Optional[str] = None,
+                 progress_every: int = 1000):
+        """
+        Initialize the importer.
+
+        Args:
+            path: File to import
+            file_format: FORMAT_JSON, FORMAT_JSON_LINES, FORMAT_CSV or
+                FORMAT_BINARY; detected from the file if not given
+            progress_every: Records per validation batch and between two
+                progress reports
+        """
+        self.path = path
+        self.file_format = file_format
+        self.progress_every = progress_every
+        self._cancelled = threading.Event()
+        self._bytes_read = 0
+
+    def cancel(self) -> None:
+        """Stop a running import at the next record."""
+        self._cancelled.set()
+
+    def run(self, on_progress: Optional[Callable[[ImportProgress], None]] = None) -> ImportResult:
+        """
+        Import the file.
+
+        Invalid records are skipped and reported in the result.
+
+        Args:
+            on_progress: Called with an ImportProgress every progress_every
+                records and once at the end
+
+        Returns:
+            The imported devices and the records that were skipped
+
+        Raises:
+            ImportCancelled: If cancel() was called
+            ValueError: If the file is not valid JSON, JSON Lines, CSV or binary
+            OSError: If the file cannot be read
+        """
+        file_format = self.file_format or detect_format(self.path)
+        total_bytes = os.path.getsize(self.path)
+        devices: List[Device] = []
+        errors: List[Tuple[int, str]] = []
+        skipped = 0
+        self._bytes_read = 0
+
+        with open(self.path, 'rb') as f:
+            if file_format == FORMAT_BINARY:
+                records = self._binary_records(f)
+            elif file_format == FORMAT_JSON:
+                records = self._json_array_records(f)
+            elif file_format == FORMAT_JSON_LINES:
+                records = self._json_lines_records(f)
+            elif file_format == FORMAT_CSV:
+                records = self._csv_records(f)
+            else:
+                raise ValueError(f"Unknown import format: {file_format!r}")
+
+            first = 1
+            for batch in self._batches(records):
+                if self._cancelled.is_set():
+                    raise ImportCancelled("Import cancelled")
+                valid, invalid = validate_records(batch)
+                devices.extend(valid)
+                skipped += len(invalid)
+                for position, message in invalid[:MAX_ERRORS - len(errors)]:
+                    errors.append((first + position, message))
+                first += len(batch)
+                if on_progress:
+                    on_progress(ImportProgress(self._bytes_read, total_bytes,
+                                               len(devices), skipped))
+
+        if on_progress:
+            on_progress(ImportProgress(total_bytes, total_bytes, len(devices), skipped))
+        return ImportResult(devices, skipped, errors)
+
+    def _batches(self, records: Iterable) -> Iterator[List]:
+        """Group parsed records into lists of progress_every records."""
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= self.progress_every:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _lines(self, f) -> Iterator[str]:
+        """Decode a binary file line by line, counting the bytes read."""
+        decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        for line in f:
+            self._bytes_read += len(line)
+            yield decoder.decode(line)
+
+    def _binary_records(self, f) -> Iterator[Dict]:
+        """
+        Decode a binary export in one go.
+
+        The file may come from another host, so its devices are validated
+        like records of the text formats rather than trusted.
+        """
+        data = f.read()
+        self._bytes_read = len(data)
+        for device in loads_devices(data):
+            yield device.to_dict()
+
+    def _json_lines_records(self, f) -> Iterator[Dict]:
+        for number, line in enumerate(self._lines(f), 1):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f"Line {number}: {str(e)}")
+
+    def _csv_records(self, f) -> Iterator[Dict]:
+        lines = self._lines(f)
+        first = next(lines, '')
+        dialect = 'excel-tab' if '\t' in first and ',' not in first else 'excel'
+
+        def all_lines() -> Iterable[str]:
+            yield first
+            yield from lines
+
+        reader = csv.reader(all_lines(), dialect)
+        header = next(reader, None)
+        if header is None:
+            return
+        fields = [CSV_FIELDS.get(column.strip().lower()) for column in header]
+        if 'mac_address' not in fields:
+            raise ValueError("CSV header has no MAC address column")
+        for row in reader:
+            if any(cell.strip() for cell in row):
+                yield {field: value for field, value in zip(fields, row) if field}
+
+    def _json_array_records(self, f) -> Iterator[Dict]:
+        """Yield the elements of a top-level JSON array without reading it whole."""
+        decoder = json.JSONDecoder()
+        text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        buffer = ''
+        pos = 0
+        eof = False
+        started = False
+        expect_value = True
+        count = 0
+
+        while True:
+            # Skip whitespace, refilling the buffer as needed
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    break
+                buffer, pos = buffer[pos:], 0
+                chunk = f.read(CHUNK_SIZE)
+                self._bytes_read += len(chunk)
+                eof = not chunk
+                buffer += text_decoder.decode(chunk, final=eof)
+
+            if pos >= len(buffer):
+                raise ValueError("Unexpected end of file in JSON array")
+            char = buffer[pos]
+
+            if not started:
+                if char != '[':
+                    raise ValueError("Expected a JSON array of devices")
+                started = True
+                pos += 1
+                continue
+            if char == ']':
+                if expect_value and count:
+                    # json.load() rejects '[{...},]' too
+                    raise ValueError("Trailing comma before ']' in JSON array")
+                return
+            if not expect_value:
+                if char != ',':
+                    raise ValueError("Expected ',' or ']' between devices in JSON array")
+                expect_value = True
+                pos += 1
+                continue
+
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                complete = end < len(buffer) or eof
+            except ValueError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                # The value runs past the end of the buffer; read more and retry
+                if len(buffer) - pos > MAX_RECORD_SIZE:
+                    raise ValueError(f"Device {count + 1} in JSON array is invalid "
+                                     f"or longer than {MAX_RECORD_SIZE:,} bytes")
+                chunk = f.read(CHUNK_SIZE)
+                self._bytes_read += len(chunk)
+                eof = not chunk
+                buffer = buffer[pos:] + text_decoder.decode(chunk, final=eof)
+                pos = 0
+                continue
+
+            pos = end
+            expect_value = False
+            count += 1
+            yield value
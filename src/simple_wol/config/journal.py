@@ -0,0 +1,176 @@
+"""
+Append-only change journal for the device configuration.
+
+Every add, edit, removal and sort is appended to a JSON Lines file next to
+the config file instead of rewriting the whole device list. Loading reads
+the snapshot (the config file itself) and replays the journal on top of
+it; compaction writes a fresh snapshot and starts a new journal.
+
+The first line of a journal records the size and modification time of
+the snapshot it applies to. If the snapshot has changed since (after a
+compaction that was interrupted, or an edit by another tool) the journal
+is stale and is ignored.
+"""
+
+import json
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ..device import Device, SORT_KEYS
+
+
+def snapshot_signature(path: str) -> Optional[Tuple[int, int]]:
+    """
+    Get the (size, modification time) signature of a snapshot file.
+
+    Args:
+        path: Snapshot file path
+
+    Returns:
+        The signature, or None if the file does not exist
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def add_record(device: Device) -> Dict:
+    """Build the journal record for adding a device at the end of the list."""
+    return {'op': 'add', 'device': device.to_dict()}
+
+
+def update_record(index: int, device: Device) -> Dict:
+    """Build the journal record for replacing the device at an index."""
+    return {'op': 'update', 'index': index, 'device': device.to_dict()}
+
+
+def delete_record(index: int) -> Dict:
+    """Build the journal record for removing the device at an index."""
+    return {'op': 'delete', 'index': index}
+
+
+def sort_record(key: str, reverse: bool = False) -> Dict:
+    """Build the journal record for sorting the list by a device field."""
+    return {'op': 'sort', 'key': key, 'reverse': reverse}
+
+
+def apply_record(devices: List[Device], record: Dict) -> None:
+    """
+    Apply a journal record to a device list in place.
+
+    Args:
+        devices: Device list to modify
+        record: Journal record
+
+    Raises:
+        ValueError: If the record is not understood
+    """
+    op = record.get('op')
+    if op == 'add':
+        devices.append(Device.from_dict(record['device']))
+    elif op == 'update':
+        devices[record['index']] = Device.from_dict(record['device'])
+    elif op == 'delete':
+        del devices[record['index']]
+    elif op == 'sort':
+        devices.sort(key=SORT_KEYS[record['key']], reverse=record.get('reverse', False))
+    else:
+        raise ValueError(f"Unknown journal operation: {op!r}")
+
+
+class DeviceJournal:
+    """Append-only JSON Lines log of device list changes."""
+
+    def __init__(self, path: str):
+        """
+        Initialize the journal.
+
+        Args:
+            path: Journal file path
+        """
+        self.path = path
+        self.count = 0
+        self.valid = False
+        self._file = None
+
+    def reset(self, signature: Optional[Tuple[int, int]]) -> None:
+        """
+        Start a new, empty journal for a snapshot.
+
+        Args:
+            signature: snapshot_signature() of the snapshot the journal applies to
+        """
+        self.close()
+        with open(self.path, 'w') as f:
+            f.write(json.dumps({'op': 'base', 'snapshot': signature}) + '\n')
+        self.count = 0
+        self.valid = True
+
+    def append(self, record: Dict) -> None:
+        """
+        Append a record and flush it to disk.
+
+        Args:
+            record: Journal record
+        """
+        if self._file is None:
+            self._file = open(self.path, 'a')
+        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self._file.flush()
+        self.count += 1
+
+    def records(self, signature: Optional[Tuple[int, int]]) -> Iterator[Dict]:
+        """
+        Read the records that apply to a snapshot.
+
+        A torn final line, left by a crash in the middle of an append, is
+        skipped. Afterwards, valid tells whether the journal applied to
+        the snapshot and can be appended to as it is.
+
+        Args:
+            signature: snapshot_signature() of the current snapshot
+
+        Yields:
+            Journal records in the order they were appended
+        """
+        self.count = 0
+        self.valid = False
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f:
+            header = f.readline()
+            try:
+                base = json.loads(header)
+            except ValueError:
+                return
+            if not isinstance(base, dict):
+                return
+            snapshot = base.get('snapshot')
+            if base.get('op') != 'base' or (tuple(snapshot) if snapshot else None) != signature:
+                return
+            self.valid = True
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Appending after a torn line would hide the new records.
+                    self.valid = False
+                    break
+                self.count += 1
+                yield record
+
+    def close(self) -> None:
+        """Close the journal file if it is open."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self) -> None:
+        """Delete the journal file."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.count = 0
+        self.valid = False
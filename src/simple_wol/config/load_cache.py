@@ -0,0 +1,92 @@
+"""
+Binary cache of the parsed device snapshot.
+
+Parsing a large devices.json dominates startup. The cache stores the
+parsed devices as marshal data next to the snapshot, keyed by the
+snapshot's size, modification time and BLAKE2b hash; when any of them
+differ the cache is ignored and rebuilt.
+
+marshal is not safe against maliciously crafted data, and the key check
+only runs after decoding. The cache is therefore written readable and
+writable by its owner only, and on POSIX a cache file that belongs to
+another user or that others can write to is never read.
+"""
+
+import hashlib
+import marshal
+import os
+import stat
+import sys
+from typing import List, Optional, Tuple
+
+from ..device import Device
+from .writer import atomic_write
+
+# Bumped whenever the cached row layout changes.
+CACHE_VERSION = 3
+
+
+def snapshot_digest(data: bytes) -> bytes:
+    """Hash snapshot contents for the cache key."""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class LoadCache:
+    """marshal-encoded device rows, valid for one exact snapshot."""
+
+    def __init__(self, path: str):
+        """
+        Initialize the cache.
+
+        Args:
+            path: Cache file path
+        """
+        self.path = path
+
+    def _key(self, signature: Tuple[int, int], digest: bytes) -> Tuple:
+        return (CACHE_VERSION, sys.version_info[:2], tuple(signature), digest)
+
+    def load(self, signature: Tuple[int, int], digest: bytes) -> Optional[List[Device]]:
+        """
+        Read the cached devices for a snapshot.
+
+        Args:
+            signature: snapshot_signature() of the snapshot
+            digest: snapshot_digest() of its contents
+
+        Returns:
+            The devices, or None if the cache is missing, damaged, stale or
+            writable by other users
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                if not self._trusted(os.fstat(f.fileno())):
+                    return None
+                key, rows = marshal.loads(f.read())
+            if key != self._key(signature, digest):
+                return None
+            return [Device.from_packed(*row) for row in rows]
+        except Exception:
+            return None
+
+    @staticmethod
+    def _trusted(st: os.stat_result) -> bool:
+        """Check that only the current user can have written a cache file."""
+        if not hasattr(os, 'getuid'):
+            return True
+        return st.st_uid == os.getuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+    def store(self, devices: List[Device], signature: Tuple[int, int], digest: bytes) -> None:
+        """
+        Write the cache for a snapshot.
+
+        Args:
+            devices: Devices parsed from the snapshot
+            signature: snapshot_signature() of the snapshot
+            digest: snapshot_digest() of its contents
+
+        Raises:
+            OSError: If the cache cannot be written
+        """
+        rows = [device.to_packed() for device in devices]
+        atomic_write(self.path, marshal.dumps((self._key(signature, digest), rows)), mode=0o600)
@@ -4,22 +4,63 @@ Configuration management for device storage and import/export.
 
 import json
 import os
-from typing import List
+import queue
+import threading
+from typing import Callable, Dict, Iterator, List, Optional
 
 from ..device import Device
+from .backends import JsonBackend, StorageBackend
+from .binary_format import dumps_devices
+from .importer import BINARY_EXTENSION, StreamingImporter
+from .journal import apply_record
+from .merge import DeviceDiff, apply_diff, diff_devices
+from .sqlite_backend import SQLiteBackend
+from .watcher import ConfigWatcher
+from .writer import SaveCoalescer
+
+# Config files with these extensions are stored in SQLite instead of JSON.
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
 
 
 class ConfigManager:
     """Manages saving and loading device configurations."""
     
-    def __init__(self, config_file: str = 'devices.json'):
+    def __init__(self, config_file: str = 'devices.json', compact_after: int = 500,
+                 save_interval: float = 1.0, backend: Optional[StorageBackend] = None):
         """
         Initialize ConfigManager.
         
         Args:
             config_file: Path to the configuration file
+            compact_after: Number of journaled changes after which the
+                journal is folded into a fresh config file
+            save_interval: Minimum seconds between two background saves
+            backend: Storage backend to use; by default SQLite for .db,
+                .sqlite and .sqlite3 files and JSON for anything else
         """
         self.config_file = config_file
+        self.compact_after = compact_after
+        if backend is None:
+            if config_file.lower().endswith(SQLITE_EXTENSIONS):
+                backend = SQLiteBackend(config_file)
+            else:
+                backend = JsonBackend(config_file, compact_after)
+        self.backend = backend
+        self._lock = threading.RLock()
+        
+        # The device list as last loaded or saved, to tell external changes apart
+        self._saved: List[Device] = []
+        self.watcher: Optional[ConfigWatcher] = None
+        self._on_external_change: Optional[Callable[[DeviceDiff], None]] = None
+        
+        # Background saving: changes are queued here and written by the saver thread
+        self.save_errors: 'queue.Queue[Exception]' = queue.Queue()
+        self._pending_lock = threading.Lock()
+        self._pending_snapshot: Optional[List[Device]] = None
+        self._pending_records: List[Dict] = []
+        # None while the list can still be rebuilt from _saved and _pending_records
+        self._pending_devices: Optional[List[Device]] = None
+        self._saver = SaveCoalescer(self._flush_pending, save_interval, self.save_errors.put)
     
     def save_devices(self, devices: List[Device]) -> None:
         """
@@ -32,12 +73,147 @@ class ConfigManager:
             Exception: If saving fails
         """
         try:
-            data = [device.to_dict() for device in devices]
-            with open(self.config_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            with self._lock:
+                self.backend.save_devices(devices)
+                self._saved = list(devices)
+        except Exception as e:
+            raise Exception(f"Failed to save devices: {str(e)}")
+    
+    def record_change(self, record: Dict, devices: List[Device]) -> None:
+        """
+        Persist a single change without rewriting the whole list.
+        
+        The JSON backend appends the change to its journal; once
+        compact_after changes have been journaled, the full list is written
+        out instead and the journal starts over. The SQLite backend updates
+        the affected rows in one transaction.
+        
+        Args:
+            record: Journal record describing the change (see config.journal)
+            devices: The complete device list after the change
+            
+        Raises:
+            Exception: If saving fails
+        """
+        self._record_changes([record], devices)
+    
+    def _record_changes(self, records: List[Dict], devices: List[Device]) -> None:
+        """Hand a batch of change records to the backend."""
+        try:
+            with self._lock:
+                self.backend.record_changes(records, devices)
+                self._saved = list(devices)
         except Exception as e:
             raise Exception(f"Failed to save devices: {str(e)}")
     
+    def schedule_save(self, devices: List[Device]) -> None:
+        """
+        Save the complete device list on the background saver thread.
+        
+        Returns immediately; errors are reported through save_errors.
+        
+        Args:
+            devices: List of Device objects to save
+        """
+        with self._pending_lock:
+            self._pending_snapshot = list(devices)
+            self._pending_records = []
+            self._pending_devices = self._pending_snapshot
+        self._saver.mark_dirty()
+    
+    def schedule_change(self, record: Dict, devices: Optional[List[Device]] = None) -> None:
+        """
+        Journal a single change on the background saver thread.
+        
+        Returns immediately; errors are reported through save_errors.
+        
+        Args:
+            record: Journal record describing the change (see config.journal)
+            devices: The complete device list after the change; if omitted,
+                the saver thread rebuilds it by applying the queued records
+                to the list as last loaded or saved, so callers need not
+                copy the whole list for every change
+        """
+        with self._pending_lock:
+            if devices is not None:
+                self._pending_devices = list(devices)
+                if self._pending_snapshot is not None:
+                    self._pending_snapshot = self._pending_devices
+                else:
+                    self._pending_records.append(record)
+            elif self._pending_snapshot is not None:
+                # The snapshot is our own copy, so the change can go straight into it
+                apply_record(self._pending_snapshot, record)
+            else:
+                if self._pending_devices is not None:
+                    apply_record(self._pending_devices, record)
+                self._pending_records.append(record)
+        self._saver.mark_dirty()
+    
+    def flush(self) -> None:
+        """
+        Write any pending background saves now.
+        
+        Raises:
+            Exception: If saving fails
+        """
+        self._saver.flush_now()
+    
+    def close(self) -> None:
+        """
+        Write any pending background saves and stop the saver thread.
+        
+        Raises:
+            Exception: If saving fails
+        """
+        if self.watcher is not None:
+            self.watcher.stop()
+        self._saver.close()
+        with self._lock:
+            self.backend.close()
+    
+    def _flush_pending(self) -> None:
+        """Write out the changes queued by schedule_save() and schedule_change()."""
+        if self._on_external_change is not None:
+            # Fold in changes made by other programs instead of overwriting them
+            self.check_external_change()
+        
+        with self._lock, self._pending_lock:
+            self._pending_list()
+            snapshot, self._pending_snapshot = self._pending_snapshot, None
+            records, self._pending_records = self._pending_records, []
+            devices, self._pending_devices = self._pending_devices, None
+        
+        try:
+            if snapshot is not None:
+                self.save_devices(snapshot)
+            elif records:
+                self._record_changes(records, devices)
+        except Exception:
+            # Journal records cannot be replayed safely after a partial write,
+            # so the next attempt saves the complete list.
+            with self._pending_lock:
+                if self._pending_devices is None:
+                    # Changes queued meanwhile still have to go on top
+                    for record in self._pending_records:
+                        apply_record(devices, record)
+                    self._pending_devices = devices
+                self._pending_snapshot = self._pending_devices
+                self._pending_records = []
+            raise
+    
+    def _pending_list(self) -> Optional[List[Device]]:
+        """
+        Get the device list the queued saves lead to, or None if nothing is queued.
+        
+        Called with _lock and _pending_lock held.
+        """
+        if self._pending_devices is None and self._pending_records:
+            self._pending_devices = list(self._saved)
+            for record in self._pending_records:
+                apply_record(self._pending_devices, record)
+        return self._pending_devices
+    
     def load_devices(self) -> List[Device]:
         """
         Load devices from config file.
@@ -48,20 +224,106 @@ class ConfigManager:
         Raises:
             Exception: If loading fails
         """
-        if not os.path.exists(self.config_file):
-            return []
+        try:
+            with self._lock:
+                devices = self.backend.load_devices()
+                self._saved = list(devices)
+                return devices
+        except Exception as e:
+            raise Exception(f"Failed to load devices: {str(e)}")
+    
+    def iter_device_pages(self, page_size: int = 1000) -> Iterator[List[Device]]:
+        """
+        Load devices one page at a time.
+        
+        The SQLite backend reads each page with its own query, so the first
+        rows are available before the whole list has been read. Once the
+        last page has been read the list counts as loaded, as with
+        load_devices(); until then no changes should be saved.
         
+        Args:
+            page_size: Devices per page
+            
+        Yields:
+            Lists of at most page_size devices, in list order
+            
+        Raises:
+            Exception: If loading fails
+        """
         try:
-            with open(self.config_file, 'r') as f:
-                data = json.load(f)
-            return [Device.from_dict(item) for item in data]
+            pages = self.backend.iter_pages(page_size)
+            loaded: List[Device] = []
+            while True:
+                with self._lock:
+                    page = next(pages, None)
+                    if page is None:
+                        self._saved = loaded
+                        return
+                loaded.extend(page)
+                yield page
         except Exception as e:
             raise Exception(f"Failed to load devices: {str(e)}")
     
+    def watch(self, on_external_change: Callable[[DeviceDiff], None], interval: float = 1.0,
+              use_inotify: bool = True) -> None:
+        """
+        Watch the config file for changes made by other programs.
+        
+        When another program changes the file, it is reloaded and the
+        differences to the device list as last loaded or saved are reported.
+        Pending background saves first take those differences in, so they
+        never overwrite the other program's changes. The app's own writes
+        are not reported.
+        
+        Args:
+            on_external_change: Called on the watcher or saver thread with a
+                DeviceDiff (see config.merge) for every external change
+            interval: Seconds between two checks when inotify is unavailable
+            use_inotify: Use inotify where available instead of polling
+        """
+        self._on_external_change = on_external_change
+        if self.watcher is None:
+            self.watcher = ConfigWatcher(self.config_file, self.check_external_change, interval,
+                                         use_inotify=use_inotify)
+            self.watcher.start()
+    
+    def check_external_change(self) -> Optional[DeviceDiff]:
+        """
+        Reload the config file if another program has changed it.
+        
+        Returns:
+            The changes, or None if there were none
+        """
+        with self._lock:
+            if not self.backend.changed_externally():
+                return None
+            try:
+                devices = self.backend.load_devices()
+            except Exception as e:
+                self.save_errors.put(Exception(f"Failed to reload devices: {str(e)}"))
+                return None
+            diff = diff_devices(self._saved, devices)
+            
+            with self._pending_lock:
+                pending = self._pending_list()
+                if pending is not None:
+                    # The backend no longer matches the journal; save everything
+                    apply_diff(pending, diff)
+                    self._pending_snapshot = pending
+                    self._pending_records = []
+            self._saved = list(devices)
+        
+        if diff and self._on_external_change is not None:
+            self._on_external_change(diff)
+        return diff or None
+    
     def export_devices(self, devices: List[Device], export_path: str) -> None:
         """
         Export devices to a specified file.
         
+        Files ending in .swol are written in the compressed binary format
+        (see config.binary_format); anything else is written as JSON.
+        
         Args:
             devices: List of Device objects to export
             export_path: Path to export file
@@ -70,6 +332,11 @@ class ConfigManager:
             Exception: If export fails
         """
         try:
+            if export_path.lower().endswith(BINARY_EXTENSION):
+                with open(export_path, 'wb') as f:
+                    f.write(dumps_devices(devices))
+                return
+            
             data = [device.to_dict() for device in devices]
             with open(export_path, 'w') as f:
                 json.dump(data, f, indent=2)
@@ -80,6 +347,10 @@ class ConfigManager:
         """
         Import devices from a specified file.
         
+        JSON arrays, JSON Lines and CSV files are read incrementally (see
+        config.importer); records that are not valid devices are skipped.
+        Binary .swol exports are decoded in one pass.
+        
         Args:
             import_path: Path to import file
             
@@ -90,15 +361,13 @@ class ConfigManager:
             Exception: If import fails
         """
         try:
-            with open(import_path, 'r') as f:
-                data = json.load(f)
-            return [Device.from_dict(item) for item in data]
+            return StreamingImporter(import_path).run().devices
         except Exception as e:
             raise Exception(f"Failed to import devices: {str(e)}")
     
     def config_exists(self) -> bool:
         """Check if config file exists."""
-        return os.path.exists(self.config_file)
+        return self.backend.exists()
     
     def get_config_path(self) -> str:
         """Get the full path to the config file."""
@@ -0,0 +1,249 @@
+"""
+Merging and diffing device lists.
+
+Devices are matched by normalized MAC address through a dictionary, so a
+merge or diff takes time proportional to the size of both lists.
+"""
+
+from typing import Dict, List, NamedTuple, Tuple
+
+from ..device import Device
+from ..network.discovery import Neighbor
+
+KEEP_EXISTING = 'keep_existing'
+TAKE_INCOMING = 'take_incoming'
+NEWEST = 'newest'
+
+CONFLICT_POLICIES = (KEEP_EXISTING, TAKE_INCOMING, NEWEST)
+
+# Separators stripped from MAC addresses before comparing them.
+_MAC_SEPARATORS = str.maketrans('', '', ':-. ')
+
+
+class MergeSummary(NamedTuple):
+    """What a merge did."""
+    added: int
+    updated: int       # conflicts resolved in favour of the incoming device
+    unchanged: int     # incoming devices identical to an existing one
+    conflicts: int     # incoming devices that differed from an existing one
+    kept: int          # conflicts resolved in favour of the existing device
+
+
+def mac_key(mac_address: str) -> str:
+    """
+    Normalize a MAC address for matching.
+
+    Args:
+        mac_address: MAC address in any supported notation
+
+    Returns:
+        The twelve hex digits in upper case
+    """
+    return mac_address.translate(_MAC_SEPARATORS).upper()
+
+
+def _same(a: Device, b: Device) -> bool:
+    """Check whether two devices match in everything but their edit time."""
+    return (a.name == b.name and mac_key(a.mac_address) == mac_key(b.mac_address) and
+            a.ip_address == b.ip_address and a.port == b.port and
+            (a.retry or None) == (b.retry or None) and
+            a.group == b.group and a.tags == b.tags)
+
+
+def merge_devices(existing: List[Device], incoming: List[Device],
+                  policy: str = NEWEST) -> Tuple[List[Device], MergeSummary]:
+    """
+    Merge imported devices into a device list.
+
+    Incoming devices with a new MAC address are appended. A device whose MAC
+    address is already listed but whose settings differ is a conflict,
+    resolved by the policy:
+
+    - KEEP_EXISTING keeps the listed device
+    - TAKE_INCOMING replaces it with the incoming one
+    - NEWEST takes whichever has the later updated_at; devices without a
+      timestamp count as older, and ties keep the listed device
+
+    Args:
+        existing: Current device list; not modified
+        incoming: Imported devices, matched in order
+        policy: One of CONFLICT_POLICIES
+
+    Returns:
+        The merged list and a summary of the changes
+
+    Raises:
+        ValueError: If the policy is unknown
+    """
+    if policy not in CONFLICT_POLICIES:
+        raise ValueError(f"Unknown conflict policy: {policy!r}")
+
+    merged = list(existing)
+    index: Dict[str, int] = {}
+    for position, device in enumerate(merged):
+        index.setdefault(mac_key(device.mac_address), position)
+
+    added = updated = unchanged = conflicts = kept = 0
+    for device in incoming:
+        key = mac_key(device.mac_address)
+        position = index.get(key)
+        if position is None:
+            index[key] = len(merged)
+            merged.append(device)
+            added += 1
+            continue
+
+        current = merged[position]
+        if _same(current, device):
+            unchanged += 1
+            continue
+
+        conflicts += 1
+        if policy == TAKE_INCOMING:
+            take = True
+        elif policy == NEWEST:
+            take = (device.updated_at or 0) > (current.updated_at or 0)
+        else:
+            take = False
+        if take:
+            merged[position] = device
+            updated += 1
+        else:
+            kept += 1
+
+    return merged, MergeSummary(added, updated, unchanged, conflicts, kept)
+
+
+def ingest_neighbors(existing: List[Device],
+                     neighbors: List[Neighbor]) -> Tuple[List[Device], MergeSummary]:
+    """
+    Add discovered MAC/IP pairs to a device list.
+
+    Duplicate MAC addresses among the neighbours are collapsed, the last IP
+    address winning. Known MAC addresses only get their IP address updated;
+    new ones become devices named after their hostname or IP address.
+
+    Args:
+        existing: Current device list; not modified
+        neighbors: Discovered neighbours (see network.discovery)
+
+    Returns:
+        The updated list and a summary; conflicts are always zero
+    """
+    found: Dict[str, Neighbor] = {}
+    for neighbor in neighbors:
+        key = mac_key(neighbor.mac_address)
+        previous = found.get(key)
+        if previous is not None and not neighbor.hostname:
+            neighbor = neighbor._replace(hostname=previous.hostname)
+        found[key] = neighbor
+
+    merged = list(existing)
+    index = {mac_key(device.mac_address): position for position, device in enumerate(merged)}
+    added = updated = unchanged = 0
+    for key, neighbor in found.items():
+        position = index.get(key)
+        if position is None:
+            merged.append(Device(neighbor.hostname or neighbor.ip_address or neighbor.mac_address,
+                                 neighbor.mac_address, neighbor.ip_address))
+            added += 1
+        elif merged[position].ip_address == neighbor.ip_address or not neighbor.ip_address:
+            unchanged += 1
+        else:
+            current = merged[position]
+            merged[position] = Device(current.name, current.mac_address, neighbor.ip_address,
+                                      current.port, current.retry, current.updated_at,
+                                      current.group, current.tags)
+            updated += 1
+    return merged, MergeSummary(added, updated, unchanged, 0, 0)
+
+
+# A device in a diff: its mac_key() and how many devices with the same MAC
+# come before it in the list. Several devices may share a MAC address.
+DeviceKey = Tuple[str, int]
+
+
+class DeviceDiff(NamedTuple):
+    """Changes between two versions of a device list, keyed by (MAC, occurrence)."""
+    added: List[Device]
+    updated: List[Tuple[DeviceKey, Device]]  # each replaces exactly one device
+    removed: List[DeviceKey]                 # each removes exactly one device
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.updated or self.removed)
+
+
+def device_keys(devices: List[Device]) -> List[DeviceKey]:
+    """
+    Key each device of a list by its MAC address and occurrence.
+
+    Args:
+        devices: Device list
+
+    Returns:
+        One DeviceKey per device, in list order
+    """
+    seen: Dict[str, int] = {}
+    keys = []
+    for device in devices:
+        key = mac_key(device.mac_address)
+        count = seen.get(key, 0)
+        seen[key] = count + 1
+        keys.append((key, count))
+    return keys
+
+
+def diff_devices(old: List[Device], new: List[Device]) -> DeviceDiff:
+    """
+    Work out which devices were added, changed or removed.
+
+    The n-th device with a MAC address in new is matched with the n-th
+    device with that MAC address in old, so devices sharing a MAC address
+    are added, changed and removed one at a time.
+
+    Args:
+        old: Earlier device list
+        new: Later device list
+
+    Returns:
+        The changes, with added and updated devices in the order of new
+    """
+    old_index = dict(zip(device_keys(old), old))
+    added, updated = [], []
+    seen = set()
+    for key, device in zip(device_keys(new), new):
+        seen.add(key)
+        previous = old_index.get(key)
+        if previous is None:
+            added.append(device)
+        elif not _same(previous, device):
+            updated.append((key, device))
+    removed = [key for key in old_index if key not in seen]
+    return DeviceDiff(added, updated, removed)
+
+
+def apply_diff(devices: List[Device], diff: DeviceDiff) -> None:
+    """
+    Apply changes from diff_devices() to a device list in place.
+
+    Keys are resolved against the list as it is before any change. Updated
+    devices replace the device with their key, or are appended if it is
+    gone; added devices are appended.
+
+    Args:
+        devices: Device list to modify
+        diff: Changes to apply
+    """
+    index = {key: position for position, key in enumerate(device_keys(devices))}
+    appended = []
+    for key, device in diff.updated:
+        position = index.get(key)
+        if position is None:
+            appended.append(device)
+        else:
+            devices[position] = device
+    removed = {index[key] for key in diff.removed if key in index}
+    if removed:
+        devices[:] = [device for position, device in enumerate(devices)
+                      if position not in removed]
+    devices.extend(appended + diff.added)
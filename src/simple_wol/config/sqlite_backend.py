@@ -0,0 +1,255 @@
+"""
+SQLite storage backend for large device inventories.
+"""
+
+import json
+import os
+import sqlite3
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..device import Device, SORT_KEYS
+from .backends import StorageBackend
+
+# Fields stored in their own columns or tables; anything else goes into
+# the JSON 'extra' column.
+_COLUMNS = ('name', 'mac_address', 'ip_address', 'port', 'group', 'tags')
+
+# Devices may share a MAC address, like in the JSON file, so rows are
+# keyed by id and mac_address only has a plain index
+_TABLE = """
+CREATE TABLE IF NOT EXISTS {name} (
+    id INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    mac_address TEXT NOT NULL,
+    ip_address TEXT NOT NULL DEFAULT '',
+    port INTEGER NOT NULL DEFAULT 9,
+    extra TEXT,
+    group_name TEXT NOT NULL DEFAULT ''
+);
+"""
+
+_SCHEMA = _TABLE.format(name='devices')
+
+# Databases written before MAC addresses could repeat declared the column
+# UNIQUE, which SQLite can only drop by rebuilding the table
+_REBUILD = _TABLE.format(name='devices_rebuilt') + """
+INSERT INTO devices_rebuilt (id, position, name, mac_address, ip_address, port, extra, group_name)
+SELECT id, position, name, mac_address, ip_address, port, extra, group_name FROM devices;
+DROP TABLE devices;
+ALTER TABLE devices_rebuilt RENAME TO devices;
+"""
+
+# Columns added after the first release, for upgrading older databases
+_ADDED_COLUMNS = {
+    'group_name': "ALTER TABLE devices ADD COLUMN group_name TEXT NOT NULL DEFAULT ''",
+}
+
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS devices_position ON devices (position);
+CREATE INDEX IF NOT EXISTS devices_mac_address ON devices (mac_address);
+CREATE INDEX IF NOT EXISTS devices_name ON devices (name);
+CREATE INDEX IF NOT EXISTS devices_ip_address ON devices (ip_address);
+CREATE INDEX IF NOT EXISTS devices_group_name ON devices (group_name COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS device_tags (
+    tag TEXT NOT NULL COLLATE NOCASE,
+    device_id INTEGER NOT NULL REFERENCES devices (id) ON DELETE CASCADE,
+    PRIMARY KEY (tag, device_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS device_tags_device_id ON device_tags (device_id);
+"""
+
+_INSERT = """
+INSERT INTO devices (position, name, mac_address, ip_address, port, extra, group_name, id)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_UPDATE = """
+UPDATE devices SET position = ?, name = ?, mac_address = ?, ip_address = ?, port = ?, extra = ?,
+                   group_name = ?
+WHERE id = ?
+"""
+
+# Tags are replaced as a whole whenever a device is written
+_CLEAR_TAGS = "DELETE FROM device_tags WHERE device_id = ?"
+_INSERT_TAG = "INSERT OR IGNORE INTO device_tags (tag, device_id) VALUES (?, ?)"
+
+# Tags come back joined by the ASCII unit separator
+_TAG_SEPARATOR = '\x1f'
+
+_SELECT = """
+SELECT id, position, name, mac_address, ip_address, port, extra, group_name,
+       (SELECT group_concat(tag, char(31)) FROM device_tags WHERE device_id = devices.id)
+FROM devices"""
+
+
+def _row(device: Device, position: int, device_id: int) -> Tuple:
+    """Convert a device to a row for _INSERT or _UPDATE."""
+    data = device.to_dict()
+    extra = {key: value for key, value in data.items() if key not in _COLUMNS}
+    return (position, device.name, device.mac_address, device.ip_address, device.port,
+            json.dumps(extra) if extra else None, device.group, device_id)
+
+
+def _device(row: Tuple) -> Device:
+    """Convert a row selected with _SELECT to a device."""
+    _, _, name, mac_address, ip_address, port, extra, group, tags = row
+    data = json.loads(extra) if extra else {}
+    data.update(name=name, mac_address=mac_address, ip_address=ip_address, port=port,
+                group=group, tags=tags.split(_TAG_SEPARATOR) if tags else ())
+    return Device.from_dict(data)
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Stores devices in an SQLite database.
+
+    Rows are read in list order with keyset pagination, so the first page
+    is available before the whole list has been read. As in the JSON file,
+    several devices may share a MAC address. Every batch of changes is one
+    transaction.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the backend; the database is created on first use.
+
+        Args:
+            path: Path to the database file
+        """
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """The open database connection."""
+        if self._connection is None:
+            # ConfigManager serializes access, so the connection may be
+            # used from its background saver thread as well.
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.executescript(_SCHEMA)
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(devices)")}
+            for column, statement in _ADDED_COLUMNS.items():
+                if column not in columns:
+                    connection.execute(statement)
+            if any(row[2] and row[3] == 'u' for row in connection.execute("PRAGMA index_list(devices)")):
+                # Foreign keys are still off, so dropping the old table
+                # leaves device_tags alone
+                connection.executescript("BEGIN;" + _REBUILD + "COMMIT;")
+            connection.executescript(_INDEXES)
+            connection.execute("PRAGMA foreign_keys = ON")
+            self._connection = connection
+        return self._connection
+
+    def load_devices(self) -> List[Device]:
+        devices = []
+        for page in self.iter_pages():
+            devices.extend(page)
+        return devices
+
+    def iter_pages(self, page_size: int = 1000) -> Iterator[List[Device]]:
+        self._data_version = self._current_data_version()
+        last = None
+        while True:
+            if last is None:
+                rows = self.connection.execute(
+                    _SELECT + " ORDER BY position, id LIMIT ?", (page_size,)).fetchall()
+            else:
+                # Keyset pagination: each page starts after the last row of the previous one
+                rows = self.connection.execute(
+                    _SELECT + " WHERE (position, id) > (?, ?) ORDER BY position, id LIMIT ?",
+                    (*last, page_size)).fetchall()
+            if not rows:
+                return
+            last = (rows[-1][1], rows[-1][0])
+            yield [_device(row) for row in rows]
+
+    def save_devices(self, devices: List[Device]) -> None:
+        with self.connection:
+            self._store(devices)
+
+    def record_changes(self, records: List[Dict], devices: List[Device]) -> None:
+        with self.connection:
+            for record in records:
+                op = record.get('op')
+                if op == 'add':
+                    self._insert([(self._next_position(), Device.from_dict(record['device']))])
+                elif op == 'update':
+                    device_id, position = self._row_at(record['index'])
+                    self._replace(device_id, position, Device.from_dict(record['device']))
+                elif op == 'delete':
+                    self.connection.execute("DELETE FROM devices WHERE id = ?",
+                                            (self._row_at(record['index'])[0],))
+                elif op == 'sort':
+                    self._sort(SORT_KEYS[record['key']], record.get('reverse', False))
+                else:
+                    raise ValueError(f"Unknown journal operation: {op!r}")
+            if self.count() != len(devices):
+                # The table no longer mirrors the caller's list, e.g. after
+                # a record was lost; store the list as given.
+                self._store(devices)
+
+    def count(self) -> int:
+        """Get the number of stored devices."""
+        return self.connection.execute("SELECT COUNT(*) FROM devices").fetchone()[0]
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def changed_externally(self) -> bool:
+        # data_version only changes for commits made by other connections.
+        return self._data_version is not None and self._current_data_version() != self._data_version
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _store(self, devices: List[Device]) -> None:
+        """Replace every row with the devices, in the open transaction."""
+        # Tags of the deleted rows go with them (ON DELETE CASCADE)
+        self.connection.execute("DELETE FROM devices")
+        self._insert(enumerate(devices))
+
+    def _insert(self, rows: Iterable[Tuple[int, Device]]) -> None:
+        """Insert (position, device) pairs as new rows, with their tags."""
+        row = self.connection.execute("SELECT MAX(id) FROM devices").fetchone()
+        first_id = 1 if row[0] is None else row[0] + 1
+        rows = [(device_id, position, device)
+                for device_id, (position, device) in enumerate(rows, first_id)]
+        self.connection.executemany(_INSERT, (_row(device, position, device_id)
+                                             for device_id, position, device in rows))
+        self.connection.executemany(_INSERT_TAG, ((tag, device_id) for device_id, _, device in rows
+                                                  for tag in device.tags))
+
+    def _replace(self, device_id: int, position: int, device: Device) -> None:
+        """Overwrite the row with an id, and its tags, with a device."""
+        self.connection.execute(_UPDATE, _row(device, position, device_id))
+        self.connection.execute(_CLEAR_TAGS, (device_id,))
+        self.connection.executemany(_INSERT_TAG, ((tag, device_id) for tag in device.tags))
+
+    def _sort(self, key: Callable[[Device], object], reverse: bool) -> None:
+        """Renumber the positions of all rows in sorted order, in the open transaction."""
+        rows = self.connection.execute(
+            _SELECT + " ORDER BY position, id").fetchall()
+        # Sorted like journal.apply_record() sorts the list, so ties keep their order
+        rows.sort(key=lambda row: key(_device(row)), reverse=reverse)
+        self.connection.executemany("UPDATE devices SET position = ? WHERE id = ?",
+                                    ((position, row[0]) for position, row in enumerate(rows)))
+
+    def _current_data_version(self) -> int:
+        return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def _next_position(self) -> int:
+        row = self.connection.execute("SELECT MAX(position) FROM devices").fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def _row_at(self, index: int) -> Tuple[int, int]:
+        """Get the id and position value of the device at a list index."""
+        row = self.connection.execute(
+            "SELECT id, position FROM devices ORDER BY position, id LIMIT 1 OFFSET ?",
+            (index,)).fetchone()
+        if row is None:
+            raise IndexError(f"No device at index {index}")
+        return row[0], row[1]
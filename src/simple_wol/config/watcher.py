@@ -0,0 +1,162 @@
+"""
+Watching the config file for changes made by other programs.
+
+On Linux the watcher uses inotify on the config file's directory (atomic
+saves replace the file, which a watch on the file itself would not see);
+elsewhere, or if inotify is unavailable, it polls the file's size and
+modification time.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+from typing import Callable, Optional
+
+from .journal import snapshot_signature
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_EVENT = struct.Struct('iIII')
+
+_libc = None
+
+
+def _inotify():
+    """Load the libc inotify functions, or return None where they are missing."""
+    global _libc
+    if _libc is None:
+        if not sys.platform.startswith('linux'):
+            _libc = False
+        else:
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+                libc.inotify_init1.argtypes = [ctypes.c_int]
+                libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+                _libc = libc
+            except (OSError, AttributeError):
+                _libc = False
+    return _libc or None
+
+
+class ConfigWatcher:
+    """
+    Calls a function on a background thread whenever a file may have changed.
+
+    Bursts of changes within the debounce interval result in one call. The
+    callback should check for itself whether the change is interesting; the
+    watcher also fires for the program's own writes.
+    """
+
+    def __init__(self, path: str, on_change: Callable[[], None], interval: float = 1.0,
+                 debounce: float = 0.2, use_inotify: bool = True):
+        """
+        Initialize the watcher; call start() to begin watching.
+
+        Args:
+            path: File to watch; related files starting with its name
+                (journals, SQLite WAL files) count as well
+            on_change: Called on the watcher thread after a change
+            interval: Seconds between two checks when polling
+            debounce: Seconds to wait for further events before calling on_change
+            use_inotify: Use inotify where available instead of polling
+        """
+        self.path = os.path.abspath(path)
+        self.on_change = on_change
+        self.interval = interval
+        self.debounce = debounce
+        self.use_inotify = use_inotify
+        self.mode: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start watching."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        fd = self._open_inotify() if self.use_inotify else None
+        self.mode = 'inotify' if fd is not None else 'poll'
+        target = (lambda: self._run_inotify(fd)) if fd is not None else self._run_poll
+        self._thread = threading.Thread(target=target, name='simple-wol-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop watching and wait for the thread to exit."""
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _open_inotify(self) -> Optional[int]:
+        libc = _inotify()
+        if libc is None:
+            return None
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        directory = os.path.dirname(self.path).encode()
+        if libc.inotify_add_watch(fd, directory, WATCH_MASK) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def _notify(self) -> None:
+        try:
+            self.on_change()
+        except Exception:
+            # A failing callback must not stop the watcher.
+            pass
+
+    def _run_inotify(self, fd: int) -> None:
+        name = os.path.basename(self.path).encode()
+        try:
+            while not self._stop.is_set():
+                if not select.select([fd], [], [], 0.5)[0]:
+                    continue
+                if not self._matching_events(fd, name):
+                    continue
+                # Swallow the rest of the burst, then report once
+                while select.select([fd], [], [], self.debounce)[0]:
+                    self._matching_events(fd, name)
+                if not self._stop.is_set():
+                    self._notify()
+        finally:
+            os.close(fd)
+
+    def _matching_events(self, fd: int, name: bytes) -> bool:
+        """Read pending events and tell whether any concerns the watched file."""
+        try:
+            data = os.read(fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        matched = False
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            _, _, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            event_name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if event_name.startswith(name):
+                matched = True
+        return matched
+
+    def _run_poll(self) -> None:
+        wal_path = self.path + '-wal'
+        last = (snapshot_signature(self.path), snapshot_signature(wal_path))
+        while not self._stop.wait(self.interval):
+            current = (snapshot_signature(self.path), snapshot_signature(wal_path))
+            if current != last:
+                last = current
+                self._notify()
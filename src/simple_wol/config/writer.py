@@ -0,0 +1,168 @@
+"""
+Atomic file writes and debounced background saving.
+"""
+
+import os
+import stat
+import tempfile
+import threading
+import time
+from typing import Callable, Optional, Union
+
+# Read once at import; changing the umask is process-wide and not thread-safe.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def atomic_write(path: str, data: Union[str, bytes], mode: Optional[int] = None) -> None:
+    """
+    Replace a file's contents so it is never left half-written.
+
+    The data is written to a temporary file in the same directory, flushed
+    to disk, and then renamed over the target in a single step. The file
+    keeps the permissions of the file it replaces; a new file gets the
+    usual umask-based permissions rather than mkstemp()'s owner-only ones.
+
+    Args:
+        path: File to write
+        data: Text or bytes to write
+        mode: Permissions for the file, instead of keeping the current ones
+
+    Raises:
+        OSError: If writing fails; the original file is left untouched
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    if mode is None:
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except OSError:
+            mode = 0o666 & ~_UMASK
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp',
+                                    dir=directory)
+    try:
+        os.chmod(tmp_path, mode)
+        with os.fdopen(fd, 'wb' if isinstance(data, bytes) else 'w') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    # Make the rename itself durable where directories can be opened.
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+class SaveCoalescer:
+    """
+    Runs a flush function on a background thread, at most once per interval.
+
+    Callers mark the state dirty as often as they like; every burst of
+    changes within an interval results in a single flush.
+    """
+
+    def __init__(self, flush: Callable[[], None], interval: float = 1.0,
+                 on_error: Optional[Callable[[Exception], None]] = None):
+        """
+        Initialize the coalescer; the thread starts on first use.
+
+        Args:
+            flush: Function writing out the pending state
+            interval: Minimum seconds between two flushes
+            on_error: Called on the background thread with any exception raised by flush
+        """
+        self._flush = flush
+        self.interval = interval
+        self.on_error = on_error
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._dirty = False
+        self._closed = False
+        self._last_flush = 0.0
+        self._thread: Optional[threading.Thread] = None
+
+    def mark_dirty(self) -> None:
+        """Request a flush; returns immediately."""
+        with self._condition:
+            if self._closed:
+                return
+            self._dirty = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='simple-wol-saver',
+                                                daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def flush_now(self) -> None:
+        """
+        Flush synchronously if anything is pending.
+
+        Raises:
+            Exception: Whatever the flush function raises
+        """
+        with self._condition:
+            dirty, self._dirty = self._dirty, False
+        if dirty:
+            self._run_flush()
+
+    def close(self) -> None:
+        """
+        Flush anything pending and stop the background thread.
+
+        Raises:
+            Exception: Whatever the flush function raises; the coalescer
+                then stays usable so the flush can be retried
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+        try:
+            self.flush_now()
+        except Exception:
+            with self._condition:
+                self._closed = False
+                self._dirty = True
+            raise
+
+    def _run_flush(self) -> None:
+        with self._flush_lock:
+            self._last_flush = time.monotonic()
+            self._flush()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._dirty and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                # Let more changes pile up until the interval has passed.
+                while not self._closed:
+                    wait = self._last_flush + self.interval - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self._condition.wait(wait)
+                if self._closed:
+                    return
+                self._dirty = False
+            try:
+                self._run_flush()
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(e)
@@ -2,35 +2,163 @@
 Device class for representing network devices that can be woken up.
 """
 
-from typing import Dict
+import ipaddress
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+from .validation import format_ip, format_mac, mac_to_bytes, normalize_tags, pack_ip
 
 
 class Device:
-    """Represents a network device that can be woken up."""
+    """
+    Represents a network device that can be woken up.
+    
+    The MAC address is kept as its 6 raw bytes and the IP address as its
+    4 or 16 raw bytes; mac_address and ip_address format them on access.
+    Values that do not parse (malformed MACs in old config files, host
+    names in place of IP addresses) are kept as given.
+    """
     
-    def __init__(self, name: str, mac_address: str, ip_address: str = "", port: int = 9):
+    __slots__ = ('name', '_mac', '_ip', 'port', 'retry', 'updated_at', '_group', '_tags')
+    
+    def __init__(self, name: str, mac_address: str, ip_address: str = "", port: int = 9,
+                 retry: Optional[Dict] = None, updated_at: Optional[float] = None,
+                 group: str = "", tags: Iterable[str] = ()):
         """
         Initialize a Device.
         
         Args:
             name: Friendly name for the device
-            mac_address: MAC address of the device
+            mac_address: MAC address of the device, in any notation
+                validation.mac_to_bytes() accepts
             ip_address: IP address (optional, uses broadcast if empty)
             port: UDP port for Wake-on-LAN (default: 9)
+            retry: Per-device retry policy overrides (see network.retry.RetryPolicy)
+            updated_at: Time of the last edit in seconds since the epoch, if known
+            group: Group the device belongs to, such as a room or rack
+            tags: Free-form labels, such as roles ("build-agent")
         """
         self.name = name
-        self.mac_address = mac_address.upper()
+        self.mac_address = mac_address
         self.ip_address = ip_address
         self.port = port
+        self.retry = retry
+        self.updated_at = updated_at
+        self.group = group
+        self.tags = tags
+    
+    @property
+    def mac_address(self) -> str:
+        """MAC address as AA:BB:CC:DD:EE:FF."""
+        mac = self._mac
+        return format_mac(mac) if mac.__class__ is bytes else mac
+    
+    @mac_address.setter
+    def mac_address(self, value: str) -> None:
+        try:
+            self._mac = mac_to_bytes(value)
+        except ValueError:
+            self._mac = value.upper()
+    
+    @property
+    def mac_bytes(self) -> Optional[bytes]:
+        """The 6 raw MAC bytes, or None if the MAC address is malformed."""
+        mac = self._mac
+        return mac if mac.__class__ is bytes else None
+    
+    @property
+    def ip_address(self) -> str:
+        """IP address in canonical form, or "" for broadcast."""
+        ip = self._ip
+        return format_ip(ip) if ip.__class__ is bytes else ip
+    
+    @ip_address.setter
+    def ip_address(self, value: str) -> None:
+        try:
+            self._ip = pack_ip(value) if value else ''
+        except ValueError:
+            self._ip = value
+    
+    @property
+    def ip(self) -> Optional[Union[ipaddress.IPv4Address, ipaddress.IPv6Address]]:
+        """The parsed IP address, or None if there is none or it is a host name."""
+        ip = self._ip
+        return ipaddress.ip_address(ip) if ip.__class__ is bytes else None
+    
+    @property
+    def group(self) -> str:
+        """Group name, stripped; "" for none."""
+        return self._group
+    
+    @group.setter
+    def group(self, value: Optional[str]) -> None:
+        # Hand-edited files may hold null or a number here
+        self._group = str(value or '').strip()
+    
+    @property
+    def tags(self) -> Tuple[str, ...]:
+        """Distinct tags, sorted."""
+        return self._tags
+    
+    @tags.setter
+    def tags(self, value: Iterable[str]) -> None:
+        self._tags = normalize_tags(value)
+    
+    def to_packed(self) -> Tuple:
+        """
+        Return the device's fields without formatting them.
+        
+        Returns:
+            (name, mac, ip, port, retry, updated_at, group, tags), with mac
+            and ip as raw bytes where they parsed; see from_packed()
+        """
+        return (self.name, self._mac, self._ip, self.port, self.retry, self.updated_at,
+                self.group, self._tags)
+    
+    @classmethod
+    def from_packed(cls, name: str, mac: Union[bytes, str], ip: Union[bytes, str], port: int,
+                    retry: Optional[Dict] = None, updated_at: Optional[float] = None,
+                    group: str = "", tags: Tuple[str, ...] = ()) -> 'Device':
+        """
+        Create a device from to_packed() fields without parsing them again.
+        
+        Args:
+            name: Friendly name for the device
+            mac: 6 raw MAC bytes, or the MAC address string if it is malformed
+            ip: 4 or 16 raw IP bytes, or the IP address string (possibly empty)
+            port: UDP port for Wake-on-LAN
+            retry: Per-device retry policy overrides
+            updated_at: Time of the last edit, if known
+            group: Group the device belongs to
+            tags: Tags as returned by to_packed()
+        """
+        device = cls.__new__(cls)
+        device.name = name
+        device._mac = mac
+        device._ip = ip
+        device.port = port
+        device.retry = retry
+        device.updated_at = updated_at
+        device.group = group
+        device._tags = tags
+        return device
     
     def to_dict(self) -> Dict:
         """Convert device to dictionary for serialization."""
-        return {
+        data = {
             'name': self.name,
             'mac_address': self.mac_address,
             'ip_address': self.ip_address,
             'port': self.port
         }
+        if self.retry:
+            data['retry'] = self.retry
+        if self.updated_at is not None:
+            data['updated_at'] = self.updated_at
+        if self.group:
+            data['group'] = self.group
+        if self._tags:
+            data['tags'] = list(self._tags)
+        return data
     
     @classmethod
     def from_dict(cls, data: Dict) -> 'Device':
@@ -39,7 +167,11 @@ class Device:
             name=data['name'],
             mac_address=data['mac_address'],
             ip_address=data.get('ip_address', ''),
-            port=data.get('port', 9)
+            port=data.get('port', 9),
+            retry=data.get('retry'),
+            updated_at=data.get('updated_at'),
+            group=data.get('group', ''),
+            tags=data.get('tags', ())
         )
     
     def __str__(self) -> str:
@@ -49,3 +181,14 @@ class Device:
     def __repr__(self) -> str:
         """Detailed string representation of the device."""
         return self.__str__()
+
+
+# Sort keys for each sortable device field, shared by the UI and the config journal.
+SORT_KEYS = {
+    'name': lambda device: device.name.lower(),
+    'mac_address': lambda device: device.mac_address,
+    'ip_address': lambda device: device.ip_address or '',
+    'port': lambda device: device.port,
+    'group': lambda device: device.group.lower(),
+    'tags': lambda device: [tag.lower() for tag in device.tags],
+}
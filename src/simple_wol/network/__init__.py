@@ -2,6 +2,26 @@
 Network functionality for Wake-on-LAN operations.
 """
 
-from .wol import WakeOnLanSender
+from .async_engine import AsyncWakeEngine, BackgroundLoop
+from .discovery import Neighbor, read_neighbors
+from .packet import MagicPacketCache, build_magic_packet, get_magic_packet, mac_to_bytes
+from .planner import Destination, NetworkPlanner
+from .probe import LivenessProber, VerifyResult, wake_and_verify
+from .relay import RelayServer, relay_wake
+from .retry import RetryPolicy, RetryRun, RetryScheduler, TimerQueue
+from .scheduler import TokenBucket, WaveRun, WaveScheduler
+from .wol import WakeOnLanSender, WakeResult
+from .worker import WakeUpdate, WakeWorker
 
-__all__ = ['WakeOnLanSender']
+__all__ = [
+    'WakeOnLanSender', 'WakeResult',
+    'AsyncWakeEngine', 'BackgroundLoop',
+    'WakeUpdate', 'WakeWorker',
+    'Destination', 'NetworkPlanner',
+    'Neighbor', 'read_neighbors',
+    'LivenessProber', 'VerifyResult', 'wake_and_verify',
+    'RelayServer', 'relay_wake',
+    'RetryPolicy', 'RetryRun', 'RetryScheduler', 'TimerQueue',
+    'TokenBucket', 'WaveRun', 'WaveScheduler',
+    'MagicPacketCache', 'build_magic_packet', 'get_magic_packet', 'mac_to_bytes',
+]
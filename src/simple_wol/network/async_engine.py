@@ -0,0 +1,202 @@
+"""
+Asynchronous Wake-on-LAN engine built on asyncio.
+"""
+
+import asyncio
+import ipaddress
+import socket
+import threading
+from concurrent.futures import Future
+from typing import Coroutine, Dict, Iterable, List, Optional, Tuple
+
+from ..device import Device
+from .packet import get_magic_packet
+from .planner import NetworkPlanner
+from .wol import BROADCAST_IP, WakeResult
+
+
+class _WakeProtocol(asyncio.DatagramProtocol):
+    """Datagram protocol tracking transport flow control for the wake engine."""
+
+    def __init__(self):
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self._writable = asyncio.Event()
+        self._writable.set()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def error_received(self, exc):
+        # Unconnected UDP errors cannot be attributed to a single target; the
+        # packet is fire-and-forget so there is nothing to report back.
+        pass
+
+    def pause_writing(self):
+        self._writable.clear()
+
+    def resume_writing(self):
+        self._writable.set()
+
+    async def wait_writable(self) -> None:
+        """Wait until the transport's send buffer has drained below its high-water mark."""
+        await self._writable.wait()
+
+
+class AsyncWakeEngine:
+    """Sends Wake-on-LAN packets to many devices concurrently from one event loop."""
+
+    def __init__(self, concurrency: int = 256, timeout: float = 2.0,
+                 planner: Optional[NetworkPlanner] = None):
+        """
+        Initialize the engine.
+
+        Args:
+            concurrency: Maximum number of wakes in flight at once
+            timeout: Seconds allowed per target for resolving and sending
+            planner: Planner choosing each device's directed broadcast address;
+                packets share one endpoint per address family, so its egress
+                interfaces are not applied
+        """
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.planner = planner
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._endpoints: Dict[int, _WakeProtocol] = {}
+        self._endpoint_lock: Optional[asyncio.Lock] = None
+
+    async def __aenter__(self) -> 'AsyncWakeEngine':
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Close all open datagram endpoints."""
+        for protocol in self._endpoints.values():
+            if protocol.transport is not None:
+                protocol.transport.close()
+        self._endpoints.clear()
+
+    async def wake(self, device: Device) -> WakeResult:
+        """
+        Send a Wake-on-LAN packet to a device.
+
+        Args:
+            device: Device to wake up
+
+        Returns:
+            The WakeResult for the device
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            try:
+                await asyncio.wait_for(self._send(device), self.timeout)
+                return WakeResult(device, True)
+            except asyncio.TimeoutError:
+                return WakeResult(device, False, "Failed to send Wake-on-LAN packet: timed out")
+            except Exception as e:
+                return WakeResult(device, False, f"Failed to send Wake-on-LAN packet: {str(e)}")
+
+    async def wake_all(self, devices: Iterable[Device]) -> List[WakeResult]:
+        """
+        Send Wake-on-LAN packets to many devices concurrently.
+
+        Args:
+            devices: Devices to wake up
+
+        Returns:
+            One WakeResult per device, in the order the devices were given
+        """
+        return list(await asyncio.gather(*(self.wake(device) for device in devices)))
+
+    async def _send(self, device: Device) -> None:
+        """Resolve a device's destination and send its magic packet."""
+        packet = get_magic_packet(device.mac_bytes or device.mac_address)
+        if self.planner:
+            host, port = self.planner.plan(device)[:2]
+        else:
+            host, port = device.ip_address or BROADCAST_IP, device.port
+        family, address = await self._resolve(host, port)
+        protocol = await self._endpoint(family)
+        await protocol.wait_writable()
+        protocol.transport.sendto(packet, address)
+
+    async def _resolve(self, host: str, port: int) -> Tuple[int, tuple]:
+        """Resolve a host to an (address family, socket address) pair."""
+        try:
+            ip = ipaddress.ip_address(host)
+        except ValueError:
+            loop = asyncio.get_running_loop()
+            infos = await loop.getaddrinfo(host, port, type=socket.SOCK_DGRAM)
+            if not infos:
+                raise OSError(f"Could not resolve {host}")
+            family, _, _, _, address = infos[0]
+            return family, address
+        if ip.version == 6:
+            return socket.AF_INET6, (host, port, 0, 0)
+        return socket.AF_INET, (host, port)
+
+    async def _endpoint(self, family: int) -> _WakeProtocol:
+        """Get the shared broadcast-capable endpoint for an address family."""
+        protocol = self._endpoints.get(family)
+        if protocol is not None:
+            return protocol
+
+        if self._endpoint_lock is None:
+            self._endpoint_lock = asyncio.Lock()
+        async with self._endpoint_lock:
+            protocol = self._endpoints.get(family)
+            if protocol is None:
+                loop = asyncio.get_running_loop()
+                _, protocol = await loop.create_datagram_endpoint(
+                    _WakeProtocol, family=family, allow_broadcast=True)
+                self._endpoints[family] = protocol
+        return protocol
+
+
+class BackgroundLoop:
+    """Runs an asyncio event loop on a daemon thread for use from synchronous code."""
+
+    def __init__(self):
+        """Initialize the loop; the thread starts on first use."""
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the event loop thread if it is not already running."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._run, name='simple-wol-loop', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro: Coroutine) -> Future:
+        """
+        Schedule a coroutine on the background loop.
+
+        Args:
+            coro: Coroutine to run
+
+        Returns:
+            A concurrent.futures.Future for the coroutine's result
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self) -> None:
+        """Stop the event loop and wait for its thread to exit."""
+        with self._lock:
+            if self._thread is None:
+                return
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            self.loop.close()
+            self._thread = None
+            self.loop = None
@@ -0,0 +1,185 @@
+"""
+Reading MAC/IP pairs from neighbour tables and DHCP lease files.
+
+Supported sources are the kernel ARP table (/proc/net/arp), the output
+of `ip neigh`, dnsmasq lease files and ISC dhcpd lease files. Every
+parser returns Neighbor tuples with normalized MAC addresses; entries
+without a usable Ethernet address are dropped.
+"""
+
+import re
+import subprocess
+from typing import Dict, List, NamedTuple, Optional
+
+from .. import validation
+
+SOURCE_ARP = 'arp'
+SOURCE_IP_NEIGH = 'ip-neigh'
+SOURCE_DNSMASQ = 'dnsmasq'
+SOURCE_DHCPD = 'dhcpd'
+
+SOURCES = (SOURCE_ARP, SOURCE_IP_NEIGH, SOURCE_DNSMASQ, SOURCE_DHCPD)
+
+# Default locations of each source
+DEFAULT_PATHS = {
+    SOURCE_ARP: '/proc/net/arp',
+    SOURCE_DNSMASQ: '/var/lib/misc/dnsmasq.leases',
+    SOURCE_DHCPD: '/var/lib/dhcp/dhcpd.leases',
+}
+
+_ZERO_MAC = '00:00:00:00:00:00'
+
+_LEASE = re.compile(r'lease\s+(\S+)\s*\{(.*?)\}', re.S)
+_HARDWARE = re.compile(r'hardware\s+ethernet\s+([0-9A-Fa-f:]+)\s*;')
+_HOSTNAME = re.compile(r'client-hostname\s+"([^"]*)"\s*;')
+_BINDING = re.compile(r'^\s*binding\s+state\s+(\w+)\s*;', re.M)
+
+
+class Neighbor(NamedTuple):
+    """A MAC address seen on the network."""
+    mac_address: str  # AA:BB:CC:DD:EE:FF
+    ip_address: str
+    hostname: str = ''
+    interface: str = ''
+
+
+def normalize_mac(mac_address: str) -> Optional[str]:
+    """
+    Bring a MAC address into AA:BB:CC:DD:EE:FF form.
+
+    Args:
+        mac_address: MAC address in any notation validation.mac_to_bytes() accepts
+
+    Returns:
+        The normalized address, or None if it is malformed or all zeros
+    """
+    try:
+        mac = validation.normalize_mac(mac_address)
+    except ValueError:
+        return None
+    return None if mac == _ZERO_MAC else mac
+
+
+def parse_proc_arp(text: str) -> List[Neighbor]:
+    """
+    Parse the kernel ARP table as found in /proc/net/arp.
+
+    Incomplete entries (flags 0x0) are skipped.
+    """
+    neighbors = []
+    for line in text.splitlines()[1:]:
+        fields = line.split()
+        if len(fields) < 6 or fields[2] == '0x0':
+            continue
+        mac = normalize_mac(fields[3])
+        if mac:
+            neighbors.append(Neighbor(mac, fields[0], interface=fields[5]))
+    return neighbors
+
+
+def parse_ip_neigh(text: str) -> List[Neighbor]:
+    """
+    Parse the output of `ip neigh show`.
+
+    Entries without a link-layer address (FAILED, INCOMPLETE) are skipped.
+    """
+    neighbors = []
+    for line in text.splitlines():
+        fields = line.split()
+        if 'lladdr' not in fields:
+            continue
+        position = fields.index('lladdr')
+        if position + 1 >= len(fields):
+            continue
+        mac = normalize_mac(fields[position + 1])
+        if not mac:
+            continue
+        interface = fields[fields.index('dev') + 1] if 'dev' in fields[:-1] else ''
+        neighbors.append(Neighbor(mac, fields[0], interface=interface))
+    return neighbors
+
+
+def parse_dnsmasq_leases(text: str) -> List[Neighbor]:
+    """
+    Parse a dnsmasq lease file.
+
+    Lines have the form "<expiry> <mac> <ip> <hostname> <client id>"; a
+    hostname of "*" means none was sent.
+    """
+    neighbors = []
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) < 4 or fields[0] == 'duid':
+            continue
+        mac = normalize_mac(fields[1])
+        if mac:
+            hostname = '' if fields[3] == '*' else fields[3]
+            neighbors.append(Neighbor(mac, fields[2], hostname))
+    return neighbors
+
+
+def parse_dhcpd_leases(text: str) -> List[Neighbor]:
+    """
+    Parse an ISC dhcpd lease file.
+
+    The file is a log in which later lease blocks supersede earlier ones,
+    so only the last block per MAC address is kept. Free and abandoned
+    leases are skipped.
+    """
+    latest: Dict[str, Neighbor] = {}
+    for match in _LEASE.finditer(text):
+        ip_address, body = match.groups()
+        hardware = _HARDWARE.search(body)
+        if not hardware:
+            continue
+        mac = normalize_mac(hardware.group(1))
+        if not mac:
+            continue
+        binding = _BINDING.search(body)
+        if binding and binding.group(1) in ('free', 'abandoned', 'backup'):
+            latest.pop(mac, None)
+            continue
+        hostname = _HOSTNAME.search(body)
+        latest.pop(mac, None)
+        latest[mac] = Neighbor(mac, ip_address, hostname.group(1) if hostname else '')
+    return list(latest.values())
+
+
+PARSERS = {
+    SOURCE_ARP: parse_proc_arp,
+    SOURCE_IP_NEIGH: parse_ip_neigh,
+    SOURCE_DNSMASQ: parse_dnsmasq_leases,
+    SOURCE_DHCPD: parse_dhcpd_leases,
+}
+
+
+def read_neighbors(source: str, path: Optional[str] = None) -> List[Neighbor]:
+    """
+    Read the neighbours listed by a source.
+
+    Args:
+        source: One of SOURCES
+        path: File to read; defaults to the usual location of the source.
+            For SOURCE_IP_NEIGH without a path, `ip neigh show` is run.
+
+    Returns:
+        The neighbours, in the order the source lists them
+
+    Raises:
+        ValueError: If the source is unknown
+        OSError: If the file cannot be read or `ip` cannot be run
+    """
+    if source not in PARSERS:
+        raise ValueError(f"Unknown discovery source: {source!r}")
+
+    if source == SOURCE_IP_NEIGH and path is None:
+        try:
+            text = subprocess.run(['ip', 'neigh', 'show'], stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE, universal_newlines=True,
+                                  check=True, timeout=10).stdout
+        except subprocess.SubprocessError as e:
+            raise OSError(f"Could not run 'ip neigh': {str(e)}")
+    else:
+        with open(path or DEFAULT_PATHS[source], 'r', errors='replace') as f:
+            text = f.read()
+    return PARSERS[source](text)
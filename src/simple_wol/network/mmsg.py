@@ -0,0 +1,142 @@
+"""
+Batched datagram sending with the Linux sendmmsg() system call.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import socket
+import struct
+import sys
+from typing import Sequence
+
+# The kernel caps the number of messages per sendmmsg() call at UIO_MAXIOV.
+MAX_BATCH = 1024
+
+
+class _IoVec(ctypes.Structure):
+    _fields_ = [
+        ('iov_base', ctypes.c_void_p),
+        ('iov_len', ctypes.c_size_t),
+    ]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_name', ctypes.c_void_p),
+        ('msg_namelen', ctypes.c_uint32),
+        ('msg_iov', ctypes.POINTER(_IoVec)),
+        ('msg_iovlen', ctypes.c_size_t),
+        ('msg_control', ctypes.c_void_p),
+        ('msg_controllen', ctypes.c_size_t),
+        ('msg_flags', ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_hdr', _MsgHdr),
+        ('msg_len', ctypes.c_uint),
+    ]
+
+
+def _load_sendmmsg():
+    """Look up sendmmsg() in the C library, returning None where it is unavailable."""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        func = libc.sendmmsg
+    except (OSError, AttributeError):
+        return None
+    func.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int]
+    func.restype = ctypes.c_int
+    return func
+
+
+_sendmmsg = _load_sendmmsg()
+
+
+def _message_template():
+    """Split a single-iovec mmsghdr into the bytes before and after its msg_iov pointer."""
+    template = _MMsgHdr()
+    template.msg_hdr.msg_iovlen = 1
+    raw = bytes(template)
+    offset = _MsgHdr.msg_iov.offset
+    return raw[:offset], raw[offset + ctypes.sizeof(ctypes.c_void_p):]
+
+
+_MSG_PREFIX, _MSG_SUFFIX = _message_template()
+
+
+def sendmmsg_available() -> bool:
+    """Check whether the sendmmsg() fast path can be used on this platform."""
+    return _sendmmsg is not None
+
+
+def send_batch(sock: socket.socket, packets: Sequence[bytes]) -> int:
+    """
+    Send packets through a connected datagram socket using as few system calls as possible.
+
+    Args:
+        sock: Connected UDP socket
+        packets: Datagram payloads to send
+
+    Returns:
+        The number of packets sent. This is less than len(packets) only if
+        an error occurred after some packets had already been sent.
+
+    Raises:
+        OSError: If sendmmsg() is unavailable, or the first packet of the batch fails
+    """
+    if _sendmmsg is None:
+        raise OSError("sendmmsg() is not available on this platform")
+
+    sent = 0
+    fd = sock.fileno()
+    while sent < len(packets):
+        chunk = packets[sent:sent + MAX_BATCH]
+        count = len(chunk)
+        messages, keepalive = _build_messages(chunk)
+
+        result = _sendmmsg(fd, messages, count, 0)
+        if result < 0:
+            if sent:
+                return sent
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        if result == 0:
+            return sent
+        sent += result
+    return sent
+
+
+def _build_messages(packets: Sequence[bytes]):
+    """
+    Build the mmsghdr array for a batch of packets.
+
+    The payloads are copied into one contiguous buffer and the iovec and
+    mmsghdr arrays are packed with struct in bulk, which avoids setting
+    ctypes structure fields one message at a time.
+
+    Returns:
+        The mmsghdr array and the buffers it points into, which must stay
+        alive until the system call returns
+    """
+    count = len(packets)
+    payload = ctypes.create_string_buffer(b''.join(packets), sum(map(len, packets)))
+
+    iov_fields = []
+    address = ctypes.addressof(payload)
+    for packet in packets:
+        iov_fields.append(address)
+        iov_fields.append(len(packet))
+        address += len(packet)
+    iovecs = (_IoVec * count).from_buffer_copy(struct.pack('@' + 'PN' * count, *iov_fields))
+
+    iov_base = ctypes.addressof(iovecs)
+    iov_size = ctypes.sizeof(_IoVec)
+    records = b''.join(_MSG_PREFIX + struct.pack('@P', iov_base + i * iov_size) + _MSG_SUFFIX
+                       for i in range(count))
+    messages = (_MMsgHdr * count).from_buffer_copy(records)
+    return messages, (payload, iovecs)
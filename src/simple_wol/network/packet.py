@@ -0,0 +1,112 @@
+"""
+Magic packet construction for Wake-on-LAN.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Union
+
+from ..validation import mac_to_bytes
+
+# A magic packet is 6 bytes of 0xFF followed by the target MAC repeated 16 times.
+PACKET_HEADER = b'\xff' * 6
+MAC_REPEAT = 16
+PACKET_SIZE = len(PACKET_HEADER) + 6 * MAC_REPEAT
+
+# Limited broadcast address used when a device has no IP address.
+BROADCAST_IP = '255.255.255.255'
+
+
+def build_magic_packet(mac_bytes: bytes) -> bytes:
+    """
+    Build the 102-byte magic packet for a 6-byte MAC address.
+
+    Args:
+        mac_bytes: Raw MAC address as returned by mac_to_bytes()
+
+    Returns:
+        The magic packet payload
+
+    Raises:
+        ValueError: If mac_bytes is not exactly 6 bytes long
+    """
+    if len(mac_bytes) != 6:
+        raise ValueError("MAC address must be exactly 6 bytes")
+    packet = bytearray(PACKET_SIZE)
+    packet[:6] = PACKET_HEADER
+    packet[6:] = mac_bytes * MAC_REPEAT
+    return bytes(packet)
+
+
+class MagicPacketCache:
+    """Bounded LRU cache of ready-to-send magic packets keyed by MAC address."""
+
+    def __init__(self, maxsize: int = 4096):
+        """
+        Initialize the cache.
+
+        Args:
+            maxsize: Maximum number of packets to keep
+        """
+        self.maxsize = maxsize
+        self._packets: 'OrderedDict[Union[str, bytes], bytes]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, mac_address: Union[str, bytes]) -> bytes:
+        """
+        Get the magic packet for a MAC address, building it on a cache miss.
+
+        Args:
+            mac_address: MAC address in any format accepted by mac_to_bytes(),
+                or its 6 raw bytes (Device.mac_bytes)
+
+        Returns:
+            The magic packet payload
+
+        Raises:
+            ValueError: If the MAC address is malformed
+        """
+        with self._lock:
+            packet = self._packets.get(mac_address)
+            if packet is not None:
+                self._packets.move_to_end(mac_address)
+                return packet
+
+        if isinstance(mac_address, bytes):
+            packet = build_magic_packet(mac_address)
+        else:
+            packet = build_magic_packet(mac_to_bytes(mac_address))
+
+        with self._lock:
+            self._packets[mac_address] = packet
+            if len(self._packets) > self.maxsize:
+                self._packets.popitem(last=False)
+        return packet
+
+    def clear(self) -> None:
+        """Remove all cached packets."""
+        with self._lock:
+            self._packets.clear()
+
+    def __len__(self) -> int:
+        return len(self._packets)
+
+
+_default_cache = MagicPacketCache()
+
+
+def get_magic_packet(mac_address: Union[str, bytes]) -> bytes:
+    """
+    Get the magic packet for a MAC address from the shared packet cache.
+
+    Args:
+        mac_address: MAC address in any format accepted by mac_to_bytes(),
+            or its 6 raw bytes
+
+    Returns:
+        The magic packet payload
+
+    Raises:
+        ValueError: If the MAC address is malformed
+    """
+    return _default_cache.get(mac_address)
@@ -0,0 +1,272 @@
+"""
+Subnet-aware destination planning for Wake-on-LAN packets.
+
+The planner reads the local IPv4 interfaces and routing table and works
+out, for each device, which directed broadcast address to send to and
+which local interface the packet should leave through. Plans are cached
+until the tables are read again, every max_age seconds.
+"""
+
+import ipaddress
+import socket
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from ..device import Device
+from .packet import BROADCAST_IP
+
+_RTF_UP = 0x0001
+_RTF_GATEWAY = 0x0002
+
+
+class Route(NamedTuple):
+    """An IPv4 route from the kernel routing table."""
+    interface: str
+    network: ipaddress.IPv4Network
+    gateway: Optional[ipaddress.IPv4Address]
+    metric: int
+
+
+class Interface(NamedTuple):
+    """A local IPv4 address and the subnet it is attached to."""
+    name: str
+    address: ipaddress.IPv4Address
+    network: ipaddress.IPv4Network
+
+
+class Destination(NamedTuple):
+    """Where a magic packet is sent and the local address it is sent from."""
+    address: str
+    port: int
+    interface: Optional[str] = None
+    source: Optional[str] = None
+
+
+def _hex_ipv4(value: str) -> ipaddress.IPv4Address:
+    """Decode a little-endian hex IPv4 address as found in /proc/net/route."""
+    return ipaddress.IPv4Address(struct.pack('<I', int(value, 16)))
+
+
+def parse_proc_route(text: str) -> List[Route]:
+    """
+    Parse the contents of /proc/net/route.
+
+    Args:
+        text: File contents
+
+    Returns:
+        The routes that are up
+    """
+    routes = []
+    for line in text.splitlines()[1:]:
+        fields = line.split()
+        if len(fields) < 8:
+            continue
+        flags = int(fields[3], 16)
+        if not flags & _RTF_UP:
+            continue
+        destination = _hex_ipv4(fields[1])
+        mask = _hex_ipv4(fields[7])
+        gateway = _hex_ipv4(fields[2]) if flags & _RTF_GATEWAY else None
+        network = ipaddress.IPv4Network(f'{destination}/{mask}', strict=False)
+        routes.append(Route(fields[0], network, gateway, int(fields[6])))
+    return routes
+
+
+def parse_fib_trie_locals(text: str) -> Set[ipaddress.IPv4Address]:
+    """
+    Parse the local host addresses out of /proc/net/fib_trie.
+
+    Args:
+        text: File contents
+
+    Returns:
+        Addresses marked as '/32 host LOCAL'
+    """
+    addresses = set()
+    last = None
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('|--'):
+            last = stripped[3:].strip()
+        elif stripped.startswith('/32 host LOCAL') and last:
+            addresses.add(ipaddress.IPv4Address(last))
+    return addresses
+
+
+def _read(path: str) -> str:
+    try:
+        with open(path, 'r') as f:
+            return f.read()
+    except OSError:
+        return ''
+
+
+class NetworkPlanner:
+    """Plans the destination and egress interface of each device's magic packet."""
+
+    def __init__(self, route_text: Optional[str] = None, fib_trie_text: Optional[str] = None,
+                 max_age: Optional[float] = 60.0, clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the planner.
+
+        On Linux the routing table and local addresses are read from /proc
+        unless given. Elsewhere, and when nothing can be read, the planner
+        keeps the plain broadcast and unicast behaviour.
+
+        Args:
+            route_text: Contents of /proc/net/route
+            fib_trie_text: Contents of /proc/net/fib_trie
+            max_age: Seconds before the tables are read again and cached
+                plans are dropped, e.g. after a DHCP renewal or VPN change;
+                None keeps them for the planner's lifetime
+            clock: Monotonic time source in seconds
+        """
+        self.max_age = max_age
+        self._route_text = route_text
+        self._fib_trie_text = fib_trie_text
+        self._clock = clock
+        # One planner is shared by the wake worker, the retry timer thread and
+        # the CLI, so the tables and plans are only read or replaced together.
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Read the routing table and local addresses again and drop every cached plan."""
+        with self._lock:
+            self._load()
+
+    def _load(self) -> None:
+        """Read the tables and reset the plan cache; the caller holds the lock."""
+        route_text, fib_trie_text = self._route_text, self._fib_trie_text
+        if route_text is None and sys.platform.startswith('linux'):
+            route_text = _read('/proc/net/route')
+        if fib_trie_text is None and sys.platform.startswith('linux'):
+            fib_trie_text = _read('/proc/net/fib_trie')
+        routes = parse_proc_route(route_text or '')
+        local_addresses = parse_fib_trie_locals(fib_trie_text or '')
+
+        # Connected subnets, most specific first, with the local address on each.
+        interfaces: List[Interface] = []
+        for route in routes:
+            if route.gateway is not None or route.network.prefixlen == 0:
+                continue
+            for address in sorted(local_addresses):
+                if address in route.network:
+                    interfaces.append(Interface(route.interface, address, route.network))
+                    break
+        interfaces.sort(key=lambda interface: -interface.network.prefixlen)
+
+        self.routes = routes
+        self.interfaces = interfaces
+        self._plans: Dict[Tuple[str, int], Destination] = {}
+        self._loaded = self._clock()
+
+    def _route_for(self, address: ipaddress.IPv4Address) -> Optional[Route]:
+        """Find the longest-prefix, lowest-metric route for an address."""
+        best = None
+        for route in self.routes:
+            if address in route.network:
+                if (best is None or route.network.prefixlen > best.network.prefixlen or
+                        (route.network.prefixlen == best.network.prefixlen and
+                         route.metric < best.metric)):
+                    best = route
+        return best
+
+    def _source_on(self, interface: str) -> Optional[ipaddress.IPv4Address]:
+        for candidate in self.interfaces:
+            if candidate.name == interface:
+                return candidate.address
+        return None
+
+    def plan(self, device: Device) -> Destination:
+        """
+        Work out where to send a device's magic packet.
+
+        Devices on a directly connected subnet get that subnet's directed
+        broadcast address. Devices behind a gateway are sent to directly.
+        Devices without an IP address use the limited broadcast address on
+        the default route's interface.
+
+        Args:
+            device: Device to plan for
+
+        Returns:
+            The planned Destination
+        """
+        with self._lock:
+            if self.max_age is not None and self._clock() - self._loaded >= self.max_age:
+                self._load()
+            key = (device.ip_address, device.port)
+            plan = self._plans.get(key)
+            if plan is None:
+                plan = self._plan(device.ip_address, device.port)
+                self._plans[key] = plan
+            return plan
+
+    def _plan(self, ip_address: str, port: int) -> Destination:
+        try:
+            address = ipaddress.ip_address(ip_address) if ip_address else None
+        except ValueError:
+            # Hostnames and other unparseable values are left to the resolver.
+            return Destination(ip_address, port)
+        if address is not None and (address.version != 4 or address.is_loopback):
+            return Destination(ip_address, port)
+
+        if address is None:
+            default = [route for route in self.routes if route.network.prefixlen == 0]
+            if not default:
+                return Destination(BROADCAST_IP, port)
+            route = min(default, key=lambda route: route.metric)
+            source = self._source_on(route.interface)
+            return Destination(BROADCAST_IP, port, route.interface, source and str(source))
+
+        for interface in self.interfaces:
+            if address in interface.network:
+                broadcast = interface.network.broadcast_address
+                return Destination(str(broadcast), port, interface.name, str(interface.address))
+
+        route = self._route_for(address)
+        if route is None:
+            return Destination(ip_address, port)
+        source = self._source_on(route.interface)
+        return Destination(ip_address, port, route.interface, source and str(source))
+
+    def group(self, devices: Iterable[Device]) -> Dict[Destination, List[Device]]:
+        """
+        Group devices that can share one socket.
+
+        Args:
+            devices: Devices to group
+
+        Returns:
+            Devices keyed by their planned Destination
+        """
+        groups: Dict[Destination, List[Device]] = {}
+        for device in devices:
+            groups.setdefault(self.plan(device), []).append(device)
+        return groups
+
+
+def bind_to_source(sock: socket.socket, destination: Destination) -> None:
+    """
+    Bind a socket so packets leave through the planned interface.
+
+    Binding to the device itself needs extra privileges on Linux, so that
+    is attempted first and binding to the source address is the fallback.
+
+    Args:
+        sock: Unbound UDP socket
+        destination: Planned destination
+    """
+    if destination.interface and hasattr(socket, 'SO_BINDTODEVICE'):
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE,
+                            destination.interface.encode())
+        except OSError:
+            pass
+    if destination.source:
+        sock.bind((destination.source, 0))
@@ -0,0 +1,209 @@
+"""
+Liveness probing and wake-and-verify for Wake-on-LAN targets.
+"""
+
+import asyncio
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from ..device import Device
+from .async_engine import AsyncWakeEngine
+from .planner import NetworkPlanner
+
+PROBE_PAYLOAD = b'simple-wol probe'
+
+
+class VerifyResult(NamedTuple):
+    """Outcome of waking a device and waiting for it to come up."""
+    device: Device
+    awake: bool
+    time_to_wake: Optional[float] = None
+    packets_sent: int = 0
+    error: Optional[str] = None
+
+
+class _EchoProtocol(asyncio.DatagramProtocol):
+    """Datagram protocol resolving a future on the first reply or ICMP error."""
+
+    def __init__(self, answered: asyncio.Future):
+        self.answered = answered
+
+    def datagram_received(self, data, addr):
+        if not self.answered.done():
+            self.answered.set_result(True)
+
+    def error_received(self, exc):
+        # Port unreachable means the host's network stack answered.
+        if not self.answered.done():
+            self.answered.set_result(isinstance(exc, ConnectionRefusedError))
+
+
+class LivenessProber:
+    """Checks whether devices are up, probing many devices concurrently."""
+
+    def __init__(self, port: int = 22, method: str = 'tcp', timeout: float = 1.0,
+                 concurrency: int = 256):
+        """
+        Initialize the prober.
+
+        Args:
+            port: Port to probe on each device
+            method: 'tcp' to attempt a TCP connection, 'udp' to send a UDP echo
+            timeout: Seconds to wait for each probe
+            concurrency: Maximum number of probes (and sockets) open at once
+
+        Raises:
+            ValueError: If method is not 'tcp' or 'udp'
+        """
+        if method not in ('tcp', 'udp'):
+            raise ValueError(f"Unknown probe method: {method!r}")
+        self.port = port
+        self.method = method
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def probe(self, device: Device) -> bool:
+        """
+        Check whether a device is up.
+
+        A refused connection counts as up, since only a running host can refuse it.
+
+        Args:
+            device: Device to probe; devices without an IP address are never up
+
+        Returns:
+            True if the device answered within the timeout
+        """
+        if not device.ip_address:
+            return False
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            try:
+                if self.method == 'tcp':
+                    return await asyncio.wait_for(self._probe_tcp(device.ip_address), self.timeout)
+                return await asyncio.wait_for(self._probe_udp(device.ip_address), self.timeout)
+            except (asyncio.TimeoutError, OSError):
+                return False
+
+    async def probe_all(self, devices: Iterable[Device]) -> List[bool]:
+        """
+        Probe many devices concurrently.
+
+        Args:
+            devices: Devices to probe
+
+        Returns:
+            One liveness flag per device, in the order the devices were given
+        """
+        return list(await asyncio.gather(*(self.probe(device) for device in devices)))
+
+    async def _probe_tcp(self, host: str) -> bool:
+        try:
+            _, writer = await asyncio.open_connection(host, self.port)
+        except ConnectionRefusedError:
+            return True
+        writer.close()
+        return True
+
+    async def _probe_udp(self, host: str) -> bool:
+        loop = asyncio.get_running_loop()
+        answered = loop.create_future()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _EchoProtocol(answered), remote_addr=(host, self.port))
+        try:
+            transport.sendto(PROBE_PAYLOAD)
+            return await answered
+        finally:
+            transport.close()
+
+
+async def wake_and_verify(devices: Iterable[Device], prober: Optional[LivenessProber] = None,
+                          engine: Optional[AsyncWakeEngine] = None, deadline: float = 120.0,
+                          interval: float = 2.0, backoff: float = 1.5,
+                          max_interval: float = 15.0,
+                          planner: Optional[NetworkPlanner] = None) -> List[VerifyResult]:
+    """
+    Wake devices and wait until they answer probes.
+
+    All devices are sent a magic packet and then probed concurrently. After
+    each probe round, devices that are still down are sent another packet,
+    and the wait before the next round grows by the backoff factor. A
+    device's time to wake is taken when its own probe answers, not when
+    the whole round is over.
+
+    Args:
+        devices: Devices to wake up
+        prober: Prober used to check liveness (default: TCP port 22)
+        engine: Engine used to send packets (default: a new AsyncWakeEngine)
+        deadline: Seconds to keep trying before giving up
+        interval: Seconds to wait before the first probe round
+        backoff: Factor the wait grows by after each round
+        max_interval: Upper bound on the wait between rounds
+        planner: Destination planner for the default engine
+
+    Returns:
+        One VerifyResult per device, in the order the devices were given
+    """
+    devices = list(devices)
+    prober = prober or LivenessProber()
+    own_engine = engine is None
+    engine = engine or AsyncWakeEngine(planner=planner)
+
+    results: Dict[int, VerifyResult] = {}
+    sent = {index: 0 for index in range(len(devices))}
+    pending = []
+    for index, device in enumerate(devices):
+        if device.ip_address:
+            pending.append(index)
+        else:
+            results[index] = VerifyResult(device, False, error="No IP address to probe")
+
+    started = time.monotonic()
+    try:
+        to_send = list(range(len(devices)))
+        while True:
+            for index, result in zip(to_send, await engine.wake_all(devices[i] for i in to_send)):
+                if result.success:
+                    sent[index] += 1
+                elif index in pending:
+                    pending.remove(index)
+                    results[index] = VerifyResult(devices[index], False, packets_sent=sent[index],
+                                                  error=result.error)
+            if not pending:
+                break
+
+            remaining = deadline - (time.monotonic() - started)
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(interval, remaining))
+            interval = min(interval * backoff, max_interval)
+
+            answered: Dict[int, float] = {}
+
+            async def probe(index: int) -> None:
+                if await prober.probe(devices[index]):
+                    answered[index] = time.monotonic() - started
+
+            await asyncio.gather(*(probe(index) for index in pending))
+            elapsed = time.monotonic() - started
+            still_down = []
+            for index in pending:
+                if index in answered:
+                    results[index] = VerifyResult(devices[index], True, answered[index],
+                                                  sent[index])
+                else:
+                    still_down.append(index)
+            pending = still_down
+            if not pending or elapsed >= deadline:
+                break
+            to_send = pending
+    finally:
+        if own_engine:
+            await engine.close()
+
+    for index in pending:
+        results[index] = VerifyResult(devices[index], False, packets_sent=sent[index],
+                                      error="Device did not respond before the deadline")
+    return [results[index] for index in range(len(devices))]
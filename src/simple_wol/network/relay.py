@@ -0,0 +1,342 @@
+"""
+Wake relay agent for waking devices on remote subnets.
+
+A relay runs on a host in the target subnet and accepts compact batched
+requests over UDP. Each request lists the raw MAC addresses to wake, and
+the relay broadcasts their magic packets on its local segment.
+
+Request datagram::
+
+    b'SWR' | version (1 byte) | port (uint16) | count (uint16)
+    | timestamp (uint64, Unix seconds) | nonce (8 bytes) | count * 6 MAC bytes
+    | HMAC-SHA256 of everything before it
+
+Every request is signed with a shared key. The relay rejects requests
+whose timestamp is more than REQUEST_MAX_AGE seconds off its own clock
+and requests whose nonce it has already seen within that time, so a
+captured request cannot be replayed.
+
+Reply datagram::
+
+    b'SWR' | status (1 byte) | packets sent (uint16)
+"""
+
+import argparse
+import hashlib
+import hmac
+import os
+import socket
+import socketserver
+import struct
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from ..device import Device
+from ..validation import format_mac, parse_port
+from .packet import mac_to_bytes
+from .wol import BROADCAST_IP, WakeOnLanSender
+
+RELAY_MAGIC = b'SWR'
+RELAY_VERSION = 2
+DEFAULT_RELAY_PORT = 9009
+
+STATUS_OK = 0
+STATUS_BAD_REQUEST = 1
+STATUS_UNAUTHORIZED = 2
+
+_HEADER = struct.Struct('!3sBHHQ8s')
+_REPLY = struct.Struct('!3sBH')
+_DIGEST_SIZE = hashlib.sha256().digest_size
+
+# 200 MACs make a 1,261-byte request, which fits a 1500-byte Ethernet MTU
+# without IP fragmentation
+MAX_MACS_PER_REQUEST = 200
+
+# Seconds a request stays valid, either way of the relay's clock
+REQUEST_MAX_AGE = 30.0
+
+KEY_ENV = 'SIMPLE_WOL_RELAY_KEY'
+
+
+class RelayRequest(NamedTuple):
+    """A decoded, authenticated relay request."""
+    port: int
+    macs: List[bytes]
+    timestamp: int
+    nonce: bytes
+
+
+def encode_request(macs: List[bytes], port: int, key: bytes,
+                   timestamp: Optional[int] = None, nonce: Optional[bytes] = None) -> bytes:
+    """
+    Encode and sign a relay request.
+
+    Args:
+        macs: Raw 6-byte MAC addresses
+        port: UDP port the relay should send magic packets to
+        key: Shared secret used to sign the request
+        timestamp: Unix time of the request; defaults to now
+        nonce: 8 bytes never used before with this key; defaults to random bytes
+
+    Returns:
+        The request datagram
+
+    Raises:
+        ValueError: If the key is empty, there are too many MACs, a MAC or
+            the nonce has the wrong length, or the port or timestamp is
+            out of range
+    """
+    if not key:
+        raise ValueError("A shared key is required to sign relay requests")
+    port = parse_port(port)
+    if len(macs) > MAX_MACS_PER_REQUEST:
+        raise ValueError(f"At most {MAX_MACS_PER_REQUEST} MAC addresses per request")
+    if any(len(mac) != 6 for mac in macs):
+        raise ValueError("MAC addresses must be exactly 6 bytes")
+    nonce = os.urandom(8) if nonce is None else nonce
+    if len(nonce) != 8:
+        raise ValueError("The nonce must be exactly 8 bytes")
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    if not isinstance(timestamp, int) or not 0 <= timestamp < 2 ** 64:
+        raise ValueError(f"Invalid timestamp: {timestamp!r}")
+    data = _HEADER.pack(RELAY_MAGIC, RELAY_VERSION, port, len(macs), timestamp, nonce)
+    data += b''.join(macs)
+    return data + hmac.new(key, data, hashlib.sha256).digest()
+
+
+def decode_request(data: bytes, key: bytes, now: Optional[float] = None,
+                   max_age: float = REQUEST_MAX_AGE) -> RelayRequest:
+    """
+    Decode and authenticate a relay request.
+
+    Checking that the nonce is new is left to the caller; see RelayServer.
+
+    Args:
+        data: Request datagram
+        key: Shared secret the request must be signed with
+        now: Current Unix time; defaults to the system clock
+        max_age: Seconds the request's timestamp may differ from now
+
+    Returns:
+        The decoded request
+
+    Raises:
+        PermissionError: If the signature is missing or wrong or the
+            request is stale
+        ValueError: If the request is malformed
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("Request too short")
+    magic, version, port, count, timestamp, nonce = _HEADER.unpack_from(data)
+    if magic != RELAY_MAGIC or version != RELAY_VERSION:
+        raise ValueError("Not a relay request")
+    if count > MAX_MACS_PER_REQUEST:
+        raise ValueError(f"At most {MAX_MACS_PER_REQUEST} MAC addresses per request")
+
+    end = _HEADER.size + count * 6
+    if len(data) != end + _DIGEST_SIZE:
+        raise PermissionError("Request is not signed")
+    expected = hmac.new(key, data[:end], hashlib.sha256).digest()
+    if not hmac.compare_digest(expected, data[end:]):
+        raise PermissionError("Bad request signature")
+    now = time.time() if now is None else now
+    if abs(now - timestamp) > max_age:
+        raise PermissionError("Request is stale")
+
+    macs = [data[offset:offset + 6] for offset in range(_HEADER.size, end, 6)]
+    return RelayRequest(port, macs, timestamp, nonce)
+
+
+class _RelayHandler(socketserver.BaseRequestHandler):
+    """Handles one relay request datagram."""
+
+    def handle(self):
+        data, sock = self.request
+        try:
+            request = decode_request(data, self.server.key)
+            if not self.server.remember_nonce(request.nonce):
+                raise PermissionError("Request was replayed")
+        except PermissionError:
+            sock.sendto(_REPLY.pack(RELAY_MAGIC, STATUS_UNAUTHORIZED, 0), self.client_address)
+            return
+        except ValueError:
+            sock.sendto(_REPLY.pack(RELAY_MAGIC, STATUS_BAD_REQUEST, 0), self.client_address)
+            return
+
+        devices = [Device('', format_mac(mac), self.server.broadcast, request.port)
+                   for mac in request.macs]
+        results = WakeOnLanSender.wake_many(devices)
+        sent = sum(1 for result in results if result.success)
+        sock.sendto(_REPLY.pack(RELAY_MAGIC, STATUS_OK, sent), self.client_address)
+
+
+class RelayServer(socketserver.UDPServer):
+    """UDP server that fans relay requests out as local magic packets."""
+
+    allow_reuse_address = True
+
+    def __init__(self, address: Tuple[str, int], broadcast: str, key: bytes):
+        """
+        Initialize and bind the relay server.
+
+        Args:
+            address: (host, port) to listen on
+            broadcast: Address magic packets are sent to on the local segment
+            key: Shared secret requests must be signed with
+
+        Raises:
+            ValueError: If the key is empty
+        """
+        if not key:
+            raise ValueError("A relay needs a shared key")
+        self.broadcast = broadcast
+        self.key = key
+        # Nonces of accepted requests, with the time they were accepted
+        self._nonces: Dict[bytes, float] = {}
+        super().__init__(address, _RelayHandler)
+
+    def remember_nonce(self, nonce: bytes) -> bool:
+        """
+        Record the nonce of an authenticated request.
+
+        Nonces are kept for twice REQUEST_MAX_AGE, after which decode_request()
+        rejects their requests as stale anyway.
+
+        Returns:
+            False if the nonce was already seen, i.e. the request is a replay
+        """
+        now = time.monotonic()
+        nonces = self._nonces
+        if nonces:
+            # Entries are in insertion order, so expired ones come first
+            horizon = now - 2 * REQUEST_MAX_AGE
+            for seen, accepted in list(nonces.items()):
+                if accepted >= horizon:
+                    break
+                del nonces[seen]
+        if nonce in nonces:
+            return False
+        nonces[nonce] = now
+        return True
+
+
+def parse_relay_address(text: str) -> Tuple[str, int]:
+    """
+    Parse a relay address given as host, host:port or [IPv6 address]:port.
+
+    Args:
+        text: Address text; the port defaults to DEFAULT_RELAY_PORT
+
+    Returns:
+        (host, port)
+
+    Raises:
+        ValueError: If the host is missing or the port is invalid
+    """
+    host, port = text.strip(), DEFAULT_RELAY_PORT
+    if host.startswith('['):
+        host, bracket, rest = host[1:].partition(']')
+        if not bracket or rest and not rest.startswith(':'):
+            raise ValueError(f"Invalid relay address: {text!r}")
+        if rest:
+            port = parse_port(rest[1:])
+    elif host.count(':') == 1:
+        host, port = host.split(':')
+        port = parse_port(port)
+    if not host:
+        raise ValueError(f"Invalid relay address: {text!r}")
+    return host, port
+
+
+def relay_wake(relay: Tuple[str, int], devices: Iterable[Device], key: bytes,
+               timeout: float = 2.0) -> int:
+    """
+    Ask a relay to wake devices on its local segment.
+
+    Devices are grouped by port and sent in as few requests as possible.
+
+    Args:
+        relay: (host, port) of the relay
+        devices: Devices to wake up
+        key: Shared secret configured on the relay
+        timeout: Seconds to wait for each reply
+
+    Returns:
+        The number of magic packets the relay reports as sent
+
+    Raises:
+        Exception: If the relay cannot be reached or rejects a request
+    """
+    by_port = {}
+    for device in devices:
+        by_port.setdefault(device.port, []).append(device.mac_bytes or mac_to_bytes(device.mac_address))
+
+    sent = 0
+    try:
+        with socket.socket(socket.AF_INET6 if ':' in relay[0] else socket.AF_INET,
+                           socket.SOCK_DGRAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(relay)
+            for port, macs in by_port.items():
+                for start in range(0, len(macs), MAX_MACS_PER_REQUEST):
+                    sock.send(encode_request(macs[start:start + MAX_MACS_PER_REQUEST], port, key))
+                    magic, status, count = _REPLY.unpack(sock.recv(_REPLY.size))
+                    if magic != RELAY_MAGIC or status != STATUS_OK:
+                        raise Exception(f"relay rejected the request (status {status})")
+                    sent += count
+    except Exception as e:
+        raise Exception(f"Failed to send relay request: {str(e)}")
+    return sent
+
+
+def read_key(key_file: Optional[str] = None) -> Optional[bytes]:
+    """
+    Read the relay's shared key from a file or the environment.
+
+    The key is never taken from the command line, where other users could
+    see it in the process list.
+
+    Args:
+        key_file: File holding the key; surrounding whitespace is ignored
+
+    Returns:
+        The key, or None if neither key_file nor $SIMPLE_WOL_RELAY_KEY gives one
+
+    Raises:
+        OSError: If key_file cannot be read
+    """
+    if key_file:
+        with open(key_file, 'rb') as f:
+            key = f.read().strip()
+    else:
+        key = os.environ.get(KEY_ENV, '').strip().encode()
+    return key or None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run a relay agent from the command line."""
+    parser = argparse.ArgumentParser(prog='simple_wol relay',
+                                     description="Relay Wake-on-LAN requests onto the local network")
+    parser.add_argument('--bind', default='0.0.0.0', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_RELAY_PORT, help='UDP port to listen on')
+    parser.add_argument('--broadcast', default=BROADCAST_IP,
+                        help='Address magic packets are sent to')
+    parser.add_argument('--key-file', help=f'File holding the shared secret requests must be '
+                                           f'signed with (default: ${KEY_ENV})')
+    args = parser.parse_args(argv)
+
+    try:
+        key = read_key(args.key_file)
+    except OSError as e:
+        parser.error(f"cannot read key file: {str(e)}")
+    if key is None:
+        parser.error(f"a shared key is required: set ${KEY_ENV} or pass --key-file")
+
+    with RelayServer((args.bind, args.port), args.broadcast, key) as server:
+        print(f"Relaying Wake-on-LAN requests on {args.bind}:{server.server_address[1]} "
+              f"to {args.broadcast}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
@@ -0,0 +1,363 @@
+"""
+Retrying Wake-on-LAN packets with exponential backoff.
+"""
+
+import heapq
+import itertools
+import logging
+import math
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from ..device import Device
+from .wol import WakeOnLanSender, WakeResult
+
+logger = logging.getLogger(__name__)
+
+
+class TimerHandle:
+    """Handle for a callback scheduled on a TimerQueue."""
+
+    __slots__ = ('due', 'callback', 'cancelled')
+
+    def __init__(self, due: float, callback: Callable[[], None]):
+        self.due = due
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        """Prevent the callback from running."""
+        self.cancelled = True
+
+
+class TimerQueue:
+    """
+    Runs delayed callbacks from a heap on a single daemon thread.
+
+    However many callbacks are scheduled, only one thread is used.
+    Callbacks run on that thread, one at a time.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the queue; the thread starts on first use.
+
+        Args:
+            clock: Monotonic time source in seconds
+        """
+        self._clock = clock
+        self._heap: List[Tuple[float, int, TimerHandle]] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> TimerHandle:
+        """
+        Schedule a callback after a delay.
+
+        Args:
+            delay: Seconds to wait
+            callback: Function to call
+
+        Returns:
+            A handle that can be used to cancel the callback
+        """
+        handle = TimerHandle(self._clock() + max(0.0, delay), callback)
+        with self._condition:
+            if self._thread is None:
+                self._stopped = False
+                self._thread = threading.Thread(target=self._run, name='simple-wol-timers',
+                                                daemon=True)
+                self._thread.start()
+            heapq.heappush(self._heap, (handle.due, next(self._counter), handle))
+            self._condition.notify()
+        return handle
+
+    # Lets a TimerQueue be passed anywhere a timer(delay, callback) function is expected.
+    __call__ = call_later
+
+    def pending(self) -> int:
+        """Get the number of callbacks waiting to run, including cancelled ones."""
+        with self._condition:
+            return len(self._heap)
+
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        """
+        Stop the timer thread, dropping callbacks that have not run yet.
+
+        Args:
+            timeout: Seconds to wait for a callback that is already running;
+                None waits until it returns
+
+        Returns:
+            True if the thread has exited
+        """
+        with self._condition:
+            self._stopped = True
+            self._heap.clear()
+            self._condition.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    if self._heap:
+                        wait = self._heap[0][0] - self._clock()
+                        if wait <= 0:
+                            break
+                        self._condition.wait(wait)
+                    else:
+                        self._condition.wait()
+                if self._stopped:
+                    return
+                _, _, handle = heapq.heappop(self._heap)
+            if not handle.cancelled:
+                try:
+                    handle.callback()
+                except Exception:
+                    # A failing callback must not take the shared timer thread down.
+                    logger.exception("Timer callback failed")
+
+
+class RetryPolicy:
+    """How many times, and how often, a magic packet is resent."""
+
+    def __init__(self, count: int = 2, interval: float = 1.0, jitter: float = 0.1,
+                 max_interval: float = 30.0, backoff: float = 2.0):
+        """
+        Initialize a retry policy.
+
+        Args:
+            count: Number of retries after the first packet
+            interval: Seconds before the first retry
+            jitter: Random fraction (0-1) each delay may vary by, to spread bursts out
+            max_interval: Upper bound on the delay between two packets
+            backoff: Factor the delay grows by after each retry
+
+        Raises:
+            ValueError: If a value is out of range
+        """
+        if count < 0 or interval < 0 or not 0 <= jitter <= 1 or max_interval < 0 or backoff < 1:
+            raise ValueError("Invalid retry policy")
+        self.count = count
+        self.interval = interval
+        self.jitter = jitter
+        self.max_interval = max_interval
+        self.backoff = backoff
+
+    def delays(self, rng: Optional[random.Random] = None) -> List[float]:
+        """
+        Get the offsets of each retry from the first packet, in seconds.
+
+        Args:
+            rng: Random number generator used for jitter
+
+        Returns:
+            One increasing offset per retry
+        """
+        rng = rng or random
+        offsets = []
+        elapsed = 0.0
+        delay = self.interval
+        for _ in range(self.count):
+            spread = delay * self.jitter
+            elapsed += min(self.max_interval, max(0.0, delay + rng.uniform(-spread, spread)))
+            offsets.append(elapsed)
+            delay = min(self.max_interval, delay * self.backoff)
+        return offsets
+
+    def to_dict(self) -> Dict:
+        """Convert the policy to a dictionary for serialization."""
+        return {
+            'count': self.count,
+            'interval': self.interval,
+            'jitter': self.jitter,
+            'max_interval': self.max_interval,
+            'backoff': self.backoff
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, default: Optional['RetryPolicy'] = None) -> 'RetryPolicy':
+        """
+        Create a policy from a dictionary, taking missing values from a default policy.
+
+        Args:
+            data: Policy values, e.g. a device's retry overrides
+            default: Policy supplying values missing from data
+        """
+        values = (default or cls()).to_dict()
+        values.update({key: value for key, value in data.items() if key in values})
+        return cls(**values)
+
+    @classmethod
+    def for_device(cls, device: Device, default: Optional['RetryPolicy'] = None) -> 'RetryPolicy':
+        """Get the policy for a device, applying its per-device overrides to a default policy."""
+        default = default or cls()
+        if not device.retry:
+            return default
+        return cls.from_dict(device.retry, default)
+
+
+def _retry_key(device: Device) -> Union[bytes, str]:
+    """Identify a device by its MAC address, as its magic packet does."""
+    return device.mac_bytes or device.mac_address
+
+
+class RetryRun:
+    """Handle for the pending retries of one RetryScheduler.start() call."""
+
+    def __init__(self):
+        self._handles: List[TimerHandle] = []
+        self._discarded: Set[Union[bytes, str]] = set()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._done = threading.Event()
+        self._done.set()
+
+    def discard(self, device: Device) -> None:
+        """
+        Skip the remaining retries for a device, e.g. once it is known to be up.
+
+        Devices are matched by MAC address, so an equal copy of a device
+        (say, one reloaded from the config file) works too, and devices
+        sharing the MAC address are skipped with it.
+        """
+        with self._lock:
+            self._discarded.add(_retry_key(device))
+
+    def cancel(self) -> None:
+        """Skip all remaining retries."""
+        with self._lock:
+            for handle in self._handles:
+                handle.cancel()
+        self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the last retry to be sent.
+
+        Args:
+            timeout: Maximum seconds to wait, None to wait forever
+
+        Returns:
+            True if no retries are pending, False on timeout
+        """
+        return self._done.wait(timeout)
+
+    def _sent(self) -> None:
+        with self._lock:
+            self._pending -= 1
+            if self._pending <= 0:
+                self._done.set()
+
+    def _filter(self, devices: List[Device]) -> List[Device]:
+        with self._lock:
+            return [device for device in devices if _retry_key(device) not in self._discarded]
+
+
+class RetryScheduler:
+    """
+    Resends magic packets according to retry policies.
+
+    Retries are grouped into time slots and each slot is sent as one batch
+    from a shared TimerQueue, so the number of threads does not depend on
+    the number of devices or retries.
+    """
+
+    def __init__(self, policy: Optional[RetryPolicy] = None, timer: Optional[TimerQueue] = None,
+                 send: Callable[[List[Device]], List[WakeResult]] = WakeOnLanSender.wake_many,
+                 resolution: float = 0.05, rng: Optional[random.Random] = None):
+        """
+        Initialize the scheduler.
+
+        Args:
+            policy: Default retry policy for devices without their own
+            timer: Timer queue retries are scheduled on (default: a new one)
+            send: Function sending a batch of devices
+            resolution: Seconds per time slot; retries due in the same slot share a batch
+            rng: Random number generator used for jitter
+
+        Raises:
+            ValueError: If resolution is not positive
+        """
+        if not resolution > 0:
+            raise ValueError("Invalid retry resolution")
+        self.policy = policy or RetryPolicy()
+        self.timer = timer or TimerQueue()
+        self.send = send
+        self.resolution = resolution
+        self.rng = rng or random.Random()
+
+    def start(self, devices: Iterable[Device],
+              on_result: Optional[Callable[[List[WakeResult]], None]] = None) -> RetryRun:
+        """
+        Send magic packets now and schedule their retries.
+
+        Args:
+            devices: Devices to wake up
+            on_result: Called with the results of each batch, including the first
+
+        Returns:
+            A RetryRun handle for discarding or cancelling pending retries
+        """
+        devices = list(devices)
+        results = self.send(devices)
+        if on_result:
+            on_result(results)
+        return self.schedule(devices, on_result)
+
+    def schedule(self, devices: Iterable[Device],
+                 on_result: Optional[Callable[[List[WakeResult]], None]] = None) -> RetryRun:
+        """
+        Schedule the retries for devices whose first packet was just sent.
+
+        Retry offsets count from this call, and a retry is never moved
+        earlier than its offset to share a time slot.
+
+        Args:
+            devices: Devices already sent to
+            on_result: Called on the timer thread with the results of each retry batch
+
+        Returns:
+            A RetryRun handle for discarding, cancelling or waiting for the retries
+        """
+        run = RetryRun()
+        slots: Dict[int, List[Device]] = {}
+        for device in devices:
+            for offset in RetryPolicy.for_device(device, self.policy).delays(self.rng):
+                slots.setdefault(math.ceil(offset / self.resolution), []).append(device)
+
+        if slots:
+            run._pending = len(slots)
+            run._done.clear()
+        for slot, batch in sorted(slots.items()):
+            run._handles.append(self.timer.call_later(
+                slot * self.resolution, self._make_retry(run, batch, on_result)))
+        return run
+
+    def _make_retry(self, run: RetryRun, batch: List[Device],
+                    on_result: Optional[Callable[[List[WakeResult]], None]]) -> Callable[[], None]:
+        def retry():
+            try:
+                devices = run._filter(batch)
+                if not devices:
+                    return
+                try:
+                    results = self.send(devices)
+                except Exception as e:
+                    results = [WakeResult(device, False,
+                                          f"Failed to send Wake-on-LAN packet: {str(e)}")
+                               for device in devices]
+                if on_result:
+                    on_result(results)
+            finally:
+                run._sent()
+        return retry
@@ -0,0 +1,294 @@
+"""
+Paced Wake-on-LAN sending in staggered waves.
+"""
+
+import math
+import threading
+import time
+from typing import Callable, Iterable, List, Optional
+
+from ..device import Device
+from .retry import TimerHandle, TimerQueue
+from .wol import WakeOnLanSender, WakeResult
+
+# Shared by every run, so steps do not each start a thread of their own.
+_timers = TimerQueue()
+
+
+def thread_timer(delay: float, callback: Callable[[], None]) -> TimerHandle:
+    """
+    Run a callback after a delay on the shared daemon timer thread.
+
+    Args:
+        delay: Seconds to wait
+        callback: Function to call
+
+    Returns:
+        A handle that can be used to cancel the callback
+    """
+    return _timers.call_later(delay, callback)
+
+
+class TokenBucket:
+    """Token bucket rate limiter that never blocks the caller."""
+
+    def __init__(self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize a full bucket.
+
+        Args:
+            rate: Tokens added per second
+            burst: Maximum number of tokens the bucket holds
+            clock: Monotonic time source in seconds
+
+        Raises:
+            ValueError: If rate or burst is not positive
+        """
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self, limit: int) -> int:
+        """
+        Take as many whole tokens as are available, up to a limit.
+
+        Args:
+            limit: Maximum number of tokens to take
+
+        Returns:
+            The number of tokens taken
+        """
+        with self._lock:
+            self._refill()
+            taken = min(limit, int(self._tokens))
+            self._tokens -= taken
+            return taken
+
+    def time_until(self, tokens: int) -> float:
+        """
+        Get the number of seconds until a number of tokens is available.
+
+        Args:
+            tokens: Tokens wanted, capped at the bucket's burst size
+
+        Returns:
+            Seconds to wait, 0 if the tokens are already available
+        """
+        with self._lock:
+            self._refill()
+            missing = min(tokens, self.burst) - self._tokens
+        return max(0.0, missing / self.rate)
+
+
+class WaveRun:
+    """Handle for an in-progress wave wake started by WaveScheduler."""
+
+    def __init__(self, devices: List[Device],
+                 on_complete: Optional[Callable[['WaveRun'], None]] = None):
+        self.devices = devices
+        self.results: List[WakeResult] = []
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+        self.error: Optional[Exception] = None  # what ended the run early, if anything
+        self._done = threading.Event()
+        self._cancelled = False
+        self._timer = None
+        self._on_complete = on_complete
+        # Held while a batch is sent, so cancel() never overlaps a send
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the run was cancelled before all devices were sent to."""
+        return self._cancelled
+
+    def cancel(self) -> None:
+        """
+        Stop sending; devices not yet sent to are skipped.
+
+        A batch that is being sent finishes first. The run's on_complete
+        callback is called with the cancelled run, unless the run had
+        already finished.
+        """
+        with self._lock:
+            if self._done.is_set():
+                return
+            self._cancelled = True
+            if self._timer is not None and hasattr(self._timer, 'cancel'):
+                self._timer.cancel()
+        self._finish()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the run to finish.
+
+        Args:
+            timeout: Maximum seconds to wait, None to wait forever
+
+        Returns:
+            True if the run finished, False on timeout
+        """
+        return self._done.wait(timeout)
+
+    def done(self) -> bool:
+        """Check whether the run has finished."""
+        return self._done.is_set()
+
+    def _finish(self) -> None:
+        """Mark the run finished and call on_complete, once."""
+        with self._lock:
+            if self._done.is_set():
+                return
+            self.finished = time.monotonic()
+            self._done.set()
+        if self._on_complete:
+            self._on_complete(self)
+
+
+class WaveScheduler:
+    """
+    Wakes devices in waves at a bounded packet rate.
+
+    Packets are paced by a token bucket and each wave is followed by a
+    pause. Sending is driven by a timer callback, so starting a run never
+    blocks the caller.
+    """
+
+    def __init__(self, rate: float = 100.0, burst: int = 10, wave_size: int = 50,
+                 wave_delay: float = 5.0,
+                 timer: Callable[[float, Callable[[], None]], object] = thread_timer,
+                 send: Callable[[List[Device]], List[WakeResult]] = WakeOnLanSender.wake_many):
+        """
+        Initialize the scheduler.
+
+        Args:
+            rate: Maximum packets per second
+            burst: Maximum packets sent back to back
+            wave_size: Devices per wave
+            wave_delay: Seconds to pause between waves
+            timer: Function scheduling a callback after a delay in seconds,
+                e.g. thread_timer, a network.retry.TimerQueue or a wrapper
+                around Tk's after()
+            send: Function sending a batch of devices
+
+        Raises:
+            ValueError: If any limit is not positive
+        """
+        if rate <= 0 or burst < 1 or wave_size < 1 or wave_delay < 0:
+            raise ValueError("rate must be positive, burst and wave_size at least 1, "
+                             "and wave_delay not negative")
+        self.rate = rate
+        self.burst = burst
+        self.wave_size = wave_size
+        self.wave_delay = wave_delay
+        self.timer = timer
+        self.send = send
+
+    def estimate_duration(self, count: int) -> float:
+        """
+        Estimate how long waking a number of devices will take.
+
+        Args:
+            count: Number of devices
+
+        Returns:
+            Total seconds from the first packet to the last
+        """
+        total = 0.0
+        tokens = float(self.burst)
+        remaining = count
+        while remaining > 0:
+            wave = min(self.wave_size, remaining)
+            # The bucket covers what it holds; the rest trickles in at the packet rate.
+            sending = max(0.0, (wave - tokens) / self.rate)
+            tokens = max(0.0, tokens - wave)
+            total += sending
+            remaining -= wave
+            if remaining > 0:
+                total += self.wave_delay
+                tokens = min(self.burst, tokens + self.wave_delay * self.rate)
+        return total
+
+    def waves(self, count: int) -> int:
+        """Get the number of waves needed for a number of devices."""
+        return math.ceil(count / self.wave_size)
+
+    def start(self, devices: Iterable[Device],
+              on_progress: Optional[Callable[[List[WakeResult]], None]] = None,
+              on_complete: Optional[Callable[[WaveRun], None]] = None,
+              send: Optional[Callable[[List[Device]], List[WakeResult]]] = None) -> WaveRun:
+        """
+        Start waking devices in paced waves.
+
+        Args:
+            devices: Devices to wake up
+            on_progress: Called with the results of each batch as it is sent
+            on_complete: Called with the run exactly once: when every device
+                has been sent to, when an on_progress error has ended it
+                early (see WaveRun.error) or when it is cancelled
+            send: Function sending a batch of devices for this run
+                (default: the scheduler's)
+
+        Returns:
+            A WaveRun handle that can be waited on or cancelled
+        """
+        run = WaveRun(list(devices), on_complete)
+        bucket = TokenBucket(self.rate, self.burst)
+        state = {'next': 0, 'wave_left': self.wave_size}
+        sender = send or self.send
+
+        def send_batch(batch: List[Device]) -> List[WakeResult]:
+            try:
+                return sender(batch)
+            except Exception as e:
+                return [WakeResult(device, False, f"Failed to send Wake-on-LAN packet: {str(e)}")
+                        for device in batch]
+
+        def step():
+            try:
+                results = None
+                with run._lock:
+                    # cancel() may have run since this step was scheduled
+                    if run.cancelled or run.done():
+                        return
+                    remaining = len(run.devices) - state['next']
+                    wanted = min(state['wave_left'], remaining)
+                    count = bucket.take(wanted)
+                    if count:
+                        batch = run.devices[state['next']:state['next'] + count]
+                        results = send_batch(batch)
+                        run.results.extend(results)
+                        state['next'] += count
+                        state['wave_left'] -= count
+                if results and on_progress:
+                    on_progress(results)
+
+                with run._lock:
+                    if run.cancelled:
+                        return
+                    if state['next'] < len(run.devices):
+                        if state['wave_left'] == 0:
+                            state['wave_left'] = self.wave_size
+                            run._timer = self.timer(self.wave_delay, step)
+                        else:
+                            wanted = min(state['wave_left'], len(run.devices) - state['next'],
+                                         self.burst)
+                            run._timer = self.timer(bucket.time_until(wanted), step)
+                        return
+            except Exception as e:
+                # Nothing would reschedule the run, so end it instead of leaving waiters hanging.
+                run.error = e
+            run._finish()
+
+        run._timer = self.timer(0, step)
+        return run
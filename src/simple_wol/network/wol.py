@@ -2,8 +2,79 @@
 Wake-on-LAN network functionality.
 """
 
-from wakeonlan import send_magic_packet
+import socket
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .. import validation
 from ..device import Device
+from .mmsg import send_batch, sendmmsg_available
+from .packet import BROADCAST_IP, get_magic_packet
+from .planner import Destination, NetworkPlanner, bind_to_source
+
+
+class WakeResult(NamedTuple):
+    """Outcome of sending a Wake-on-LAN packet to a single device."""
+    device: Device
+    success: bool
+    error: Optional[str] = None
+
+
+def _destination(device: Device) -> Destination:
+    """Get where a device's magic packet should be sent without any planning."""
+    return Destination(device.ip_address or BROADCAST_IP, device.port)
+
+
+def _open_socket(ip_address: str) -> socket.socket:
+    """Open a UDP socket able to send broadcasts to the given address."""
+    family = socket.AF_INET6 if ':' in ip_address else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    return sock
+
+
+def _failure(device: Device, error: Exception) -> WakeResult:
+    """Build the failed WakeResult for a device."""
+    return WakeResult(device, False, f"Failed to send Wake-on-LAN packet: {str(error)}")
+
+
+def _send_portable(sock: socket.socket, destination: Tuple[str, int], devices: List[Device],
+                   indexes: List[int], results: List[Optional[WakeResult]]) -> None:
+    """Send one group's packets with one sendto() call per packet."""
+    for index in indexes:
+        device = devices[index]
+        try:
+            sock.sendto(get_magic_packet(device.mac_bytes or device.mac_address), destination)
+            results[index] = WakeResult(device, True)
+        except (OSError, ValueError) as e:
+            results[index] = _failure(device, e)
+
+
+def _send_batched(sock: socket.socket, destination: Tuple[str, int], devices: List[Device],
+                  indexes: List[int], results: List[Optional[WakeResult]]) -> None:
+    """Send one group's packets through as few sendmmsg() calls as possible."""
+    packets = []
+    pending = []
+    for index in indexes:
+        device = devices[index]
+        try:
+            packets.append(get_magic_packet(device.mac_bytes or device.mac_address))
+            pending.append(index)
+        except ValueError as e:
+            results[index] = _failure(device, e)
+    
+    try:
+        sock.connect(destination)
+        sent = send_batch(sock, packets)
+        error: Exception = OSError("packet was not accepted by the kernel")
+    except OSError as e:
+        sent = 0
+        error = e
+    
+    for position, index in enumerate(pending):
+        if position < sent:
+            results[index] = WakeResult(devices[index], True)
+        else:
+            results[index] = _failure(devices[index], error)
 
 
 class WakeOnLanSender:
@@ -21,13 +92,71 @@ class WakeOnLanSender:
             Exception: If sending the packet fails
         """
         try:
-            if device.ip_address:
-                send_magic_packet(device.mac_address, ip_address=device.ip_address, port=device.port)
-            else:
-                send_magic_packet(device.mac_address, port=device.port)
+            packet = get_magic_packet(device.mac_bytes or device.mac_address)
+            destination = _destination(device)
+            with _open_socket(destination.address) as sock:
+                sock.sendto(packet, destination[:2])
         except Exception as e:
             raise Exception(f"Failed to send Wake-on-LAN packet: {str(e)}")
     
+    @staticmethod
+    def wake_many(devices: Iterable[Device], backend: str = 'auto',
+                  planner: Optional[NetworkPlanner] = None) -> List[WakeResult]:
+        """
+        Send Wake-on-LAN packets to many devices.
+        
+        Devices are grouped by destination address and port so that each
+        group shares a single socket, instead of opening and closing one
+        socket per packet.
+        
+        Args:
+            devices: Devices to wake up
+            backend: 'portable' sends one packet per system call, while
+                'sendmmsg' and 'auto' batch packets into single sendmmsg()
+                calls on Linux and fall back to 'portable' elsewhere
+            planner: Planner choosing each device's directed broadcast address
+                and egress interface; without one, devices are sent to their
+                IP address or the limited broadcast address
+            
+        Returns:
+            One WakeResult per device, in the order the devices were given
+            
+        Raises:
+            ValueError: If backend is not a known backend name
+        """
+        if backend not in ('auto', 'portable', 'sendmmsg'):
+            raise ValueError(f"Unknown send backend: {backend!r}")
+        batched = backend != 'portable' and sendmmsg_available()
+        
+        devices = list(devices)
+        results: List[Optional[WakeResult]] = [None] * len(devices)
+        plan = planner.plan if planner else _destination
+        groups: Dict[Destination, List[int]] = {}
+        for index, device in enumerate(devices):
+            groups.setdefault(plan(device), []).append(index)
+        
+        for destination, indexes in groups.items():
+            try:
+                sock = _open_socket(destination.address)
+            except OSError as e:
+                for index in indexes:
+                    results[index] = _failure(devices[index], e)
+                continue
+            
+            with sock:
+                try:
+                    bind_to_source(sock, destination)
+                except OSError as e:
+                    for index in indexes:
+                        results[index] = _failure(devices[index], e)
+                    continue
+                if batched:
+                    _send_batched(sock, destination[:2], devices, indexes, results)
+                else:
+                    _send_portable(sock, destination[:2], devices, indexes, results)
+        
+        return results
+    
     @staticmethod
     def wake_by_mac(mac_address: str, ip_address: str = None, port: int = 9) -> None:
         """
@@ -42,10 +171,10 @@ class WakeOnLanSender:
             Exception: If sending the packet fails
         """
         try:
-            if ip_address:
-                send_magic_packet(mac_address, ip_address=ip_address, port=port)
-            else:
-                send_magic_packet(mac_address, port=port)
+            packet = get_magic_packet(mac_address)
+            destination = (ip_address or BROADCAST_IP, port)
+            with _open_socket(destination[0]) as sock:
+                sock.sendto(packet, destination)
         except Exception as e:
             raise Exception(f"Failed to send Wake-on-LAN packet: {str(e)}")
     
@@ -54,30 +183,27 @@ class WakeOnLanSender:
         """
         Validate MAC address format.
         
+        Accepts the forms listed in validation.mac_to_bytes().
+        
         Args:
             mac_address: MAC address to validate
             
         Returns:
             True if valid, False otherwise
         """
-        import re
-        mac_pattern = r'^([0-9A-Fa-f]{2}[:-]){5}([0-9A-Fa-f]{2})$'
-        return bool(re.match(mac_pattern, mac_address))
+        return validation.validate_mac_address(mac_address)
     
     @staticmethod
     def validate_ip_address(ip_address: str) -> bool:
         """
         Validate IP address format.
         
+        Accepts dotted-quad IPv4 and IPv6 addresses.
+        
         Args:
             ip_address: IP address to validate
             
         Returns:
             True if valid, False otherwise
         """
-        import socket
-        try:
-            socket.inet_aton(ip_address)
-            return True
-        except socket.error:
-            return False
+        return validation.validate_ip_address(ip_address)
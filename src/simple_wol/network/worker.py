@@ -0,0 +1,185 @@
+"""
+Wake-on-LAN sends on a background thread.
+
+A GUI must not block its event loop on sends, so WakeWorker runs
+WakeOnLanSender.wake_many() on a daemon thread, a chunk of devices at a
+time, and puts one WakeUpdate per device on a thread-safe queue. The GUI
+thread submits batches and drains the queue from its own timer, e.g.
+Tk's after().
+
+Devices are resent to according to their retry policy (Device.retry)
+from a RetryScheduler's timer thread; only the first packet's outcome is
+reported. Given a WaveScheduler, the worker paces each batch in waves
+instead of sending it at once.
+"""
+
+import functools
+import itertools
+import queue
+import threading
+import time
+from typing import Hashable, Iterable, List, NamedTuple, Optional, Tuple
+
+from ..device import Device
+from .planner import NetworkPlanner
+from .retry import RetryPolicy, RetryScheduler
+from .scheduler import WaveScheduler
+from .wol import WakeOnLanSender, WakeResult
+
+
+class WakeUpdate(NamedTuple):
+    """The outcome of one device's wake, as reported by a WakeWorker."""
+    batch: int  # as returned by WakeWorker.submit()
+    key: Hashable  # the key the device was submitted with
+    result: WakeResult
+
+
+class WakeWorker:
+    """
+    Wakes batches of devices on a background thread.
+
+    submit(), drain() and stop() may be called from any thread. Batches
+    are sent in the order they were submitted.
+    """
+
+    def __init__(self, chunk_size: int = 256, backend: str = 'auto',
+                 retry_policy: Optional[RetryPolicy] = None,
+                 planner: Optional[NetworkPlanner] = None,
+                 waves: Optional[WaveScheduler] = None):
+        """
+        Initialize the worker; its thread starts with the first batch.
+
+        Args:
+            chunk_size: Devices per wake_many() call, and so between two
+                rounds of results on the queue
+            backend: Send backend passed to WakeOnLanSender.wake_many()
+            retry_policy: Default policy for devices without their own
+                (default: no retries)
+            planner: Destination planner shared by every batch and retry
+                (default: a new NetworkPlanner)
+            waves: Paces each batch's packets in waves (default: each
+                chunk is sent at once); its limits apply, while the
+                packets go out through this worker's backend and planner
+        """
+        self.chunk_size = chunk_size
+        self.backend = backend
+        self.planner = planner or NetworkPlanner()
+        self.waves = waves
+        self.retries = RetryScheduler(retry_policy or RetryPolicy(count=0),
+                                      send=functools.partial(WakeOnLanSender.wake_many,
+                                                             backend=backend,
+                                                             planner=self.planner))
+        self.results: 'queue.Queue[WakeUpdate]' = queue.Queue()
+        self._jobs: queue.Queue = queue.Queue()
+        self._batches = itertools.count(1)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, devices: Iterable[Tuple[Hashable, Device]]) -> int:
+        """
+        Queue a batch of devices to wake.
+
+        Args:
+            devices: (key, device) pairs; the key comes back in each
+                device's WakeUpdate
+
+        Returns:
+            The batch number, also found in the batch's WakeUpdates
+        """
+        batch = next(self._batches)
+        self._jobs.put((batch, list(devices)))
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='simple-wol-wake',
+                                                daemon=True)
+                self._thread.start()
+        return batch
+
+    def drain(self, limit: Optional[int] = None) -> List[WakeUpdate]:
+        """
+        Take the results that are ready without waiting for more.
+
+        Args:
+            limit: Take at most this many results
+
+        Returns:
+            The results, in the order they were produced
+        """
+        updates = []
+        while limit is None or len(updates) < limit:
+            try:
+                updates.append(self.results.get_nowait())
+            except queue.Empty:
+                break
+        return updates
+
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        """
+        Stop the thread once the batches already submitted are sent.
+
+        Retries that have not been sent yet are dropped and the retry
+        timer thread is stopped as well.
+
+        Args:
+            timeout: Seconds to wait for both threads in all; None waits
+                until they exit
+
+        Returns:
+            True if both threads have exited, False if the timeout ran out
+            first (the worker thread then finishes its batches on its own)
+        """
+        started = time.monotonic()
+        stopped = True
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._jobs.put(None)
+            thread.join(timeout)
+            stopped = not thread.is_alive()
+        if timeout is not None:
+            timeout = max(0.0, timeout - (time.monotonic() - started))
+        return self.retries.timer.stop(timeout) and stopped
+
+    def _run(self) -> None:
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            batch, items = job
+            if self.waves is not None:
+                self._send_in_waves(batch, items)
+                continue
+            for start in range(0, len(items), self.chunk_size):
+                chunk = items[start:start + self.chunk_size]
+                devices = [device for _, device in chunk]
+                try:
+                    results = WakeOnLanSender.wake_many(devices, backend=self.backend,
+                                                        planner=self.planner)
+                except Exception as e:
+                    results = [WakeResult(device, False,
+                                          f"Failed to send Wake-on-LAN packet: {str(e)}")
+                               for device in devices]
+                self.retries.schedule(devices)
+                for (key, _), result in zip(chunk, results):
+                    self.results.put(WakeUpdate(batch, key, result))
+
+    def _send_in_waves(self, batch: int, items: List[Tuple[Hashable, Device]]) -> None:
+        """Send a batch through the wave scheduler, reporting each wave's results as it goes."""
+        reported = [0]
+
+        def on_progress(results: List[WakeResult]) -> None:
+            for result in results:
+                key = items[reported[0]][0]
+                self.results.put(WakeUpdate(batch, key, result))
+                reported[0] += 1
+            self.retries.schedule([result.device for result in results])
+
+        send = functools.partial(WakeOnLanSender.wake_many, backend=self.backend,
+                                 planner=self.planner)
+        run = self.waves.start([device for _, device in items], on_progress=on_progress,
+                               send=send)
+        run.wait()
+        # A run ended early must still account for every device it was given
+        for key, device in items[reported[0]:]:
+            self.results.put(WakeUpdate(batch, key, WakeResult(
+                device, False, f"Failed to send Wake-on-LAN packet: {str(run.error)}")))
@@ -0,0 +1,358 @@
+"""
+Ordered device collection with stable IDs and lookup indexes.
+
+Every device added to a DeviceRegistry gets an integer ID that stays the
+same while the device is edited, moved by a sort or surrounded by other
+additions and removals, so the UI can key its rows by ID instead of by
+list position. Hash indexes answer lookups by MAC address, IP address,
+name, group and tag in constant time and a sorted index answers name
+prefix searches; all of them are updated incrementally as devices change.
+"""
+
+import bisect
+import itertools
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .device import Device, SORT_KEYS
+from .validation import mac_to_bytes, normalize_ip
+
+_MAC_SEPARATORS = str.maketrans('', '', ':-. ')
+
+# Index value: the IDs with a key, as an insertion-ordered set
+_IdSet = Dict[int, None]
+
+
+def _mac_index_key(mac_address: str) -> Union[bytes, str]:
+    """Key a MAC address string the way Device.mac_bytes keys parsed ones."""
+    try:
+        return mac_to_bytes(mac_address)
+    except ValueError:
+        return mac_address.translate(_MAC_SEPARATORS).upper()
+
+
+def _device_mac_key(device: Device) -> Union[bytes, str]:
+    return device.mac_bytes or device.mac_address.translate(_MAC_SEPARATORS).upper()
+
+
+class DeviceRegistry:
+    """
+    Devices in display order, addressable by stable ID.
+
+    Devices must not be modified in place, or the indexes go stale;
+    replace them with update(). Not thread-safe: use the registry from the
+    Tk thread and hand other threads the list returned by devices().
+    """
+
+    def __init__(self, devices: Iterable[Device] = ()):
+        """
+        Initialize the registry.
+
+        Args:
+            devices: Initial devices, in order
+        """
+        self._next_id = itertools.count(1)
+        self._devices: Dict[int, Device] = {}
+        self._order: List[int] = []
+        self._positions: Optional[Dict[int, int]] = {}
+        self._by_mac: Dict[Union[bytes, str], _IdSet] = {}
+        self._by_ip: Dict[str, _IdSet] = {}
+        self._by_name: Dict[str, _IdSet] = {}
+        self._by_group: Dict[str, _IdSet] = {}
+        self._by_tag: Dict[str, _IdSet] = {}
+        self._names: List[Tuple[str, int]] = []
+        self.replace(devices)
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __iter__(self) -> Iterator[Device]:
+        devices = self._devices
+        return (devices[device_id] for device_id in self._order)
+
+    def __contains__(self, device_id: int) -> bool:
+        return device_id in self._devices
+
+    def get(self, device_id: int) -> Device:
+        """
+        Get a device by ID.
+
+        Raises:
+            KeyError: If no device has the ID
+        """
+        return self._devices[device_id]
+
+    def ids(self, start: int = 0, stop: Optional[int] = None) -> List[int]:
+        """
+        IDs of the devices, in order.
+
+        Args:
+            start: Position of the first ID to return
+            stop: Position after the last ID to return; defaults to the end
+
+        Returns:
+            The IDs in positions start to stop, copied in time proportional
+            to their number rather than to the size of the registry
+        """
+        return self._order[start:stop]
+
+    def devices(self) -> List[Device]:
+        """All devices, in order, as a new list."""
+        return list(self)
+
+    def position(self, device_id: int) -> int:
+        """
+        Get the position of a device in the list.
+
+        Raises:
+            KeyError: If no device has the ID
+        """
+        if self._positions is None:
+            self._positions = {device_id: position for position, device_id in enumerate(self._order)}
+        return self._positions[device_id]
+
+    def add(self, device: Device) -> int:
+        """
+        Append a device.
+
+        Args:
+            device: Device to add
+
+        Returns:
+            The new device's ID
+        """
+        device_id = self._append(device)
+        bisect.insort(self._names, (device.name.lower(), device_id))
+        return device_id
+
+    def extend(self, devices: Iterable[Device]) -> List[int]:
+        """
+        Append several devices, e.g. the next page of a paged load.
+
+        Returns:
+            The new devices' IDs, in order
+        """
+        ids = [self._append(device) for device in devices]
+        # Both runs are sorted, so sort() merges them in linear time
+        self._names.extend(sorted((self._devices[device_id].name.lower(), device_id)
+                                  for device_id in ids))
+        self._names.sort()
+        return ids
+
+    def update(self, device_id: int, device: Device) -> None:
+        """
+        Replace a device, keeping its ID and position.
+
+        Raises:
+            KeyError: If no device has the ID
+        """
+        self._unindex(device_id, self._devices[device_id])
+        self._devices[device_id] = device
+        self._index_hashes(device_id, device)
+        bisect.insort(self._names, (device.name.lower(), device_id))
+
+    def remove(self, device_id: int) -> Device:
+        """
+        Remove a device.
+
+        Returns:
+            The removed device
+
+        Raises:
+            KeyError: If no device has the ID
+        """
+        device = self._devices.pop(device_id)
+        self._unindex(device_id, device)
+        self._order.remove(device_id)
+        self._positions = None
+        return device
+
+    def remove_many(self, device_ids: Iterable[int]) -> List[Device]:
+        """
+        Remove several devices in one pass over the list; unknown IDs are ignored.
+
+        Returns:
+            The removed devices
+        """
+        removed = []
+        gone = set()
+        for device_id in device_ids:
+            device = self._devices.pop(device_id, None)
+            if device is not None:
+                self._unindex(device_id, device)
+                removed.append(device)
+                gone.add(device_id)
+        if gone:
+            self._order = [device_id for device_id in self._order if device_id not in gone]
+            self._positions = None
+        return removed
+
+    def replace(self, devices: Iterable[Device]) -> List[int]:
+        """
+        Replace all devices; every device gets a new ID.
+
+        Returns:
+            The IDs of the new devices, in order
+        """
+        self._devices.clear()
+        self._order.clear()
+        self._positions = {}
+        self._by_mac.clear()
+        self._by_ip.clear()
+        self._by_name.clear()
+        self._by_group.clear()
+        self._by_tag.clear()
+        # Sorting the name index once beats inserting into it per device
+        ids = [self._append(device) for device in devices]
+        self._names = sorted((self._devices[device_id].name.lower(), device_id) for device_id in ids)
+        return ids
+
+    def assign(self, devices: Iterable[Device]) -> None:
+        """
+        Replace all devices, keeping the ID of each device whose MAC address
+        was already listed.
+
+        Devices not given are removed, given devices with a listed MAC
+        address replace that device, and the rest are added; the registry
+        ends up in the order given. This lets views update only the rows
+        that actually changed.
+        """
+        devices = list(devices)
+        matched: Dict[int, Device] = {}
+        order: List[Optional[int]] = []
+        for device in devices:
+            device_id = next((candidate for candidate in self._by_mac.get(_device_mac_key(device), ())
+                              if candidate not in matched), None)
+            if device_id is not None:
+                matched[device_id] = device
+            order.append(device_id)
+
+        self.remove_many([device_id for device_id in self._order if device_id not in matched])
+        for device_id, device in matched.items():
+            if self._devices[device_id] is not device:
+                self.update(device_id, device)
+        added = [position for position, device_id in enumerate(order) if device_id is None]
+        for position in added:
+            order[position] = self._append(devices[position])
+        if len(added) > 100:
+            self._names = sorted((device.name.lower(), device_id)
+                                 for device_id, device in self._devices.items())
+        else:
+            for position in added:
+                bisect.insort(self._names, (devices[position].name.lower(), order[position]))
+        self._order = order
+        self._positions = None
+
+    def sort(self, key: str, reverse: bool = False) -> None:
+        """
+        Sort the devices by a field, keeping their IDs.
+
+        Args:
+            key: Field name from device.SORT_KEYS
+            reverse: Sort in descending order
+        """
+        sort_key = SORT_KEYS[key]
+        devices = self._devices
+        self._order.sort(key=lambda device_id: sort_key(devices[device_id]), reverse=reverse)
+        self._positions = None
+
+    def by_mac(self, mac_address: str) -> List[int]:
+        """IDs of the devices with a MAC address, in any notation."""
+        return list(self._by_mac.get(_mac_index_key(mac_address), ()))
+
+    def by_ip(self, ip_address: str) -> List[int]:
+        """IDs of the devices with an IP address (or host name)."""
+        try:
+            ip_address = normalize_ip(ip_address)
+        except ValueError:
+            pass
+        return list(self._by_ip.get(ip_address, ()))
+
+    def by_name(self, name: str) -> List[int]:
+        """IDs of the devices with a name, ignoring case."""
+        return list(self._by_name.get(name.lower(), ()))
+
+    def by_group(self, group: str) -> List[int]:
+        """IDs of the devices in a group, ignoring case."""
+        return list(self._by_group.get(group.lower(), ()))
+
+    def by_tag(self, tag: str) -> List[int]:
+        """IDs of the devices with a tag, ignoring case."""
+        return list(self._by_tag.get(tag.strip().lower(), ()))
+
+    def devices_in_group(self, group: str) -> List[Device]:
+        """Devices in a group, ignoring case."""
+        devices = self._devices
+        return [devices[device_id] for device_id in self._by_group.get(group.lower(), ())]
+
+    def devices_with_tag(self, tag: str) -> List[Device]:
+        """Devices with a tag, ignoring case."""
+        devices = self._devices
+        return [devices[device_id] for device_id in self._by_tag.get(tag.strip().lower(), ())]
+
+    def groups(self) -> List[str]:
+        """Names of all groups in use, sorted, as spelled by their first device."""
+        return sorted((self._devices[next(iter(ids))].group for key, ids in self._by_group.items()
+                       if key), key=str.lower)
+
+    def tags(self) -> List[str]:
+        """All tags in use, sorted, as spelled by their first device."""
+        found = []
+        for key, ids in self._by_tag.items():
+            tags = self._devices[next(iter(ids))].tags
+            found.append(next(tag for tag in tags if tag.lower() == key))
+        return sorted(found, key=str.lower)
+
+    def name_prefix(self, prefix: str, limit: Optional[int] = None) -> List[int]:
+        """
+        Find devices whose name starts with a prefix, ignoring case.
+
+        Args:
+            prefix: Start of the name
+            limit: Return at most this many IDs
+
+        Returns:
+            The IDs, ordered by name
+        """
+        prefix = prefix.lower()
+        names = self._names
+        found = []
+        for position in range(bisect.bisect_left(names, (prefix,)), len(names)):
+            name, device_id = names[position]
+            if not name.startswith(prefix) or (limit is not None and len(found) >= limit):
+                break
+            found.append(device_id)
+        return found
+
+    def _append(self, device: Device) -> int:
+        """Append a device to everything but the name prefix index."""
+        device_id = next(self._next_id)
+        self._devices[device_id] = device
+        if self._positions is not None:
+            self._positions[device_id] = len(self._order)
+        self._order.append(device_id)
+        self._index_hashes(device_id, device)
+        return device_id
+
+    def _index_hashes(self, device_id: int, device: Device) -> None:
+        for index, key in self._keys(device):
+            ids = index.get(key)
+            if ids is None:
+                ids = index[key] = {}
+            ids[device_id] = None
+
+    def _unindex(self, device_id: int, device: Device) -> None:
+        for index, key in self._keys(device):
+            ids = index[key]
+            del ids[device_id]
+            if not ids:
+                del index[key]
+        del self._names[bisect.bisect_left(self._names, (device.name.lower(), device_id))]
+
+    def _keys(self, device: Device) -> Iterator[Tuple[Dict[Hashable, _IdSet], Hashable]]:
+        """Each hash index a device belongs in, with its key there."""
+        yield self._by_mac, _device_mac_key(device)
+        yield self._by_ip, device.ip_address
+        yield self._by_name, device.name.lower()
+        yield self._by_group, device.group.lower()
+        for tag in {tag.lower() for tag in device.tags}:
+            yield self._by_tag, tag
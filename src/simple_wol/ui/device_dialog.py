@@ -5,17 +5,19 @@ Device add/edit dialog window.
 import tkinter as tk
 from tkinter import ttk, messagebox
 import socket
-from typing import Optional, Callable
+import time
+from typing import Iterable, Optional, Callable
 
 from ..device import Device
-from ..network.wol import WakeOnLanSender
+from .. import validation
 from .tooltip import InfoIcon
 
 
 class DeviceDialog:
     """Dialog for adding or editing devices."""
     
-    def __init__(self, parent, device: Optional[Device] = None, callback: Optional[Callable] = None):
+    def __init__(self, parent, device: Optional[Device] = None, callback: Optional[Callable] = None,
+                 groups: Iterable[str] = ()):
         """
         Initialize device dialog.
         
@@ -23,10 +25,12 @@ class DeviceDialog:
             parent: Parent window
             device: Device to edit (None for new device)
             callback: Callback function called with the device when saved
+            groups: Existing group names offered in the group field
         """
         self.parent = parent
         self.device = device
         self.callback = callback
+        self.groups = list(groups)
         self.dialog = None
         
         self.setup_dialog()
@@ -35,7 +39,7 @@ class DeviceDialog:
         """Set up the dialog window."""
         self.dialog = tk.Toplevel(self.parent)
         self.dialog.title("Add Device" if self.device is None else "Edit Device")
-        self.dialog.geometry("450x350")
+        self.dialog.geometry("450x430")
         self.dialog.resizable(False, False)
         self.dialog.grab_set()
         
@@ -51,6 +55,8 @@ class DeviceDialog:
         self.mac_var = tk.StringVar(value=self.device.mac_address if self.device else "")
         self.ip_var = tk.StringVar(value=self.device.ip_address if self.device else "")
         self.port_var = tk.StringVar(value=str(self.device.port) if self.device else "9")
+        self.group_var = tk.StringVar(value=self.device.group if self.device else "")
+        self.tags_var = tk.StringVar(value=", ".join(self.device.tags) if self.device else "")
         
         self.setup_form_fields(frame)
         self.setup_help_section(frame)
@@ -82,7 +88,7 @@ class DeviceDialog:
         mac_frame.columnconfigure(1, weight=1)
         
         ttk.Label(mac_frame, text="MAC Address:").grid(row=0, column=0, sticky=tk.W)
-        InfoIcon(mac_frame, "The device's MAC address in format:\nAA:BB:CC:DD:EE:FF or AA-BB-CC-DD-EE-FF\n\nFind it with:\n• Windows: 'ipconfig /all'\n• Linux: 'ip addr' or 'ifconfig'").grid(row=0, column=2, padx=(5, 10))
+        InfoIcon(mac_frame, "The device's MAC address in format:\nAA:BB:CC:DD:EE:FF, AA-BB-CC-DD-EE-FF,\nAABB.CCDD.EEFF or AABBCCDDEEFF\n\nFind it with:\n• Windows: 'ipconfig /all'\n• Linux: 'ip addr' or 'ifconfig'").grid(row=0, column=2, padx=(5, 10))
         self.mac_entry = ttk.Entry(mac_frame, textvariable=self.mac_var, width=30)
         self.mac_entry.grid(row=0, column=1, sticky=(tk.W, tk.E), padx=(10, 0))
         
@@ -108,13 +114,35 @@ class DeviceDialog:
         self.port_combobox = ttk.Combobox(port_frame, textvariable=self.port_var, width=27, state="normal")
         self.port_combobox['values'] = ('9', '7', '0', '1234', '4000')
         self.port_combobox.grid(row=0, column=1, sticky=(tk.W, tk.E), padx=(10, 0))
+        
+        # Group
+        group_frame = ttk.Frame(parent)
+        group_frame.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=5)
+        group_frame.columnconfigure(1, weight=1)
+        
+        ttk.Label(group_frame, text="Group (optional):").grid(row=0, column=0, sticky=tk.W)
+        InfoIcon(group_frame, "Optional: Room, rack or other group the device belongs to\n\nA whole group can be woken from the right-click menu").grid(row=0, column=2, padx=(5, 10))
+        self.group_combobox = ttk.Combobox(group_frame, textvariable=self.group_var, width=27, state="normal")
+        self.group_combobox['values'] = self.groups
+        self.group_combobox.grid(row=0, column=1, sticky=(tk.W, tk.E), padx=(10, 0))
+        
+        # Tags
+        tags_frame = ttk.Frame(parent)
+        tags_frame.grid(row=5, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=5)
+        tags_frame.columnconfigure(1, weight=1)
+        
+        ttk.Label(tags_frame, text="Tags (optional):").grid(row=0, column=0, sticky=tk.W)
+        InfoIcon(tags_frame, "Optional: Comma-separated labels such as roles\n(e.g., 'build-agent, linux')\n\nAll devices with a tag can be woken at once").grid(row=0, column=2, padx=(5, 10))
+        self.tags_entry = ttk.Entry(tags_frame, textvariable=self.tags_var, width=30)
+        self.tags_entry.grid(row=0, column=1, sticky=(tk.W, tk.E), padx=(10, 0))
     
     def setup_help_section(self, parent):
         """Set up the help section."""
         help_frame = ttk.LabelFrame(parent, text="Quick Help", padding="10")
-        help_frame.grid(row=4, column=0, columnspan=2, pady=15, sticky=(tk.W, tk.E))
+        help_frame.grid(row=6, column=0, columnspan=2, pady=15, sticky=(tk.W, tk.E))
         
-        help_text = ("MAC Address formats: AA:BB:CC:DD:EE:FF or AA-BB-CC-DD-EE-FF\n"
+        help_text = ("MAC Address formats: AA:BB:CC:DD:EE:FF, AA-BB-CC-DD-EE-FF,\n"
+                    "AABB.CCDD.EEFF or AABBCCDDEEFF\n"
                     "IP Address: Leave blank for network broadcast (recommended)\n"
                     "Port 9 is the standard - try Port 7 if it doesn't work")
         help_label = ttk.Label(help_frame, text=help_text, font=('Arial', 8), 
@@ -124,7 +152,7 @@ class DeviceDialog:
     def setup_buttons(self, parent):
         """Set up the dialog buttons."""
         button_frame = ttk.Frame(parent)
-        button_frame.grid(row=5, column=0, columnspan=2, pady=20)
+        button_frame.grid(row=7, column=0, columnspan=2, pady=20)
         
         save_btn = ttk.Button(button_frame, text="Save", command=self.save_device)
         save_btn.pack(side=tk.LEFT, padx=(0, 10))
@@ -151,17 +179,16 @@ class DeviceDialog:
             return
         
         # Validate MAC address format
-        if not WakeOnLanSender.validate_mac_address(mac):
+        if not validation.validate_mac_address(mac):
             messagebox.showerror("Error", "Invalid MAC address format.\n" +
-                               "Use format: AA:BB:CC:DD:EE:FF or AA-BB-CC-DD-EE-FF")
+                               "Use format: AA:BB:CC:DD:EE:FF, AA-BB-CC-DD-EE-FF, "
+                               "AABB.CCDD.EEFF or AABBCCDDEEFF")
             self.mac_entry.focus()
             return
         
         # Validate port
         try:
-            port = int(port_str)
-            if port < 0 or port > 65535:
-                raise ValueError()
+            port = validation.parse_port(port_str)
         except ValueError:
             messagebox.showerror("Error", "Port must be a number between 0 and 65535.")
             self.port_combobox.focus()
@@ -169,7 +196,7 @@ class DeviceDialog:
         
         # Validate IP address if provided
         if ip:
-            if not WakeOnLanSender.validate_ip_address(ip):
+            if not validation.validate_ip_address(ip):
                 if messagebox.askyesno("Invalid IP Address", 
                                      f"'{ip}' doesn't appear to be a valid IP address.\n" +
                                      "Do you want to continue anyway?"):
@@ -178,8 +205,10 @@ class DeviceDialog:
                     self.ip_entry.focus()
                     return
         
-        # Create device
-        new_device = Device(name, mac, ip, port)
+        # Create device, keeping settings the dialog does not edit
+        new_device = Device(name, mac, ip, port, retry=self.device.retry if self.device else None,
+                            updated_at=time.time(), group=self.group_var.get().strip(),
+                            tags=self.tags_var.get())
         
         # Call callback if provided
         if self.callback:
@@ -0,0 +1,96 @@
+"""
+Dialog for choosing how imported devices are applied.
+"""
+
+import tkinter as tk
+from tkinter import ttk
+from typing import Callable, Optional
+
+from ..config.importer import ImportResult
+from ..config.merge import KEEP_EXISTING, NEWEST, TAKE_INCOMING
+
+
+class ImportDialog:
+    """Asks whether to merge or replace, and how to resolve merge conflicts."""
+
+    MERGE = 'merge'
+    REPLACE = 'replace'
+
+    def __init__(self, parent, result: ImportResult, existing: int,
+                 callback: Optional[Callable] = None):
+        """
+        Initialize import dialog.
+
+        Args:
+            parent: Parent window
+            result: Result of reading the import file
+            existing: Number of devices currently listed
+            callback: Called with (mode, policy) when the user confirms
+        """
+        self.parent = parent
+        self.result = result
+        self.existing = existing
+        self.callback = callback
+
+        self.setup_dialog()
+
+    def setup_dialog(self):
+        """Set up the dialog window."""
+        self.dialog = tk.Toplevel(self.parent)
+        self.dialog.title("Import Devices")
+        self.dialog.resizable(False, False)
+        self.dialog.grab_set()
+        self.dialog.transient(self.parent)
+
+        frame = ttk.Frame(self.dialog, padding="20")
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        summary = f"Read {len(self.result.devices)} device(s) from the file."
+        if self.result.skipped:
+            summary += f"\n{self.result.skipped} invalid record(s) will be skipped:"
+            for number, error in self.result.errors[:5]:
+                summary += f"\n  Record {number}: {error}"
+        ttk.Label(frame, text=summary, justify=tk.LEFT).pack(anchor=tk.W, pady=(0, 10))
+
+        self.mode_var = tk.StringVar(value=self.MERGE if self.existing else self.REPLACE)
+        ttk.Radiobutton(frame, text=f"Merge into the current list ({self.existing} device(s))",
+                        variable=self.mode_var, value=self.MERGE,
+                        command=self.update_policy_state).pack(anchor=tk.W)
+        ttk.Radiobutton(frame, text="Replace the current list", variable=self.mode_var,
+                        value=self.REPLACE, command=self.update_policy_state).pack(anchor=tk.W)
+
+        policy_frame = ttk.LabelFrame(frame, text="When a MAC address is already listed",
+                                      padding="10")
+        policy_frame.pack(fill=tk.X, pady=10)
+        self.policy_var = tk.StringVar(value=NEWEST)
+        self.policy_buttons = [
+            ttk.Radiobutton(policy_frame, text=text, variable=self.policy_var, value=value)
+            for text, value in (("Keep the newest edit", NEWEST),
+                                ("Keep the existing device", KEEP_EXISTING),
+                                ("Take the imported device", TAKE_INCOMING))
+        ]
+        for button in self.policy_buttons:
+            button.pack(anchor=tk.W)
+        self.update_policy_state()
+
+        button_frame = ttk.Frame(frame)
+        button_frame.pack(pady=(10, 0))
+        ttk.Button(button_frame, text="Import", command=self.confirm).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(button_frame, text="Cancel", command=self.dialog.destroy).pack(side=tk.LEFT)
+
+    def update_policy_state(self):
+        """Enable the conflict options only when merging."""
+        state = ['!disabled'] if self.mode_var.get() == self.MERGE else ['disabled']
+        for button in self.policy_buttons:
+            button.state(state)
+
+    def confirm(self):
+        """Close the dialog and report the chosen mode and policy."""
+        mode, policy = self.mode_var.get(), self.policy_var.get()
+        self.dialog.destroy()
+        if self.callback:
+            self.callback(mode, policy)
+
+    def show(self):
+        """Show the dialog and wait for it to close."""
+        self.dialog.wait_window()
@@ -3,19 +3,57 @@ Main window UI for the Wake-on-LAN application.
 """
 
 import tkinter as tk
+import tkinter.font as tkfont
 from tkinter import ttk, messagebox, filedialog
-from typing import List, Optional, Callable
+from typing import Callable, Dict, Iterable, List, Optional
+import logging
 import os
 
+from ..config.journal import add_record, delete_record, sort_record, update_record
+from ..config.merge import DeviceDiff
 from ..device import Device
-from ..network.wol import WakeOnLanSender
+from ..network.async_engine import BackgroundLoop
+from ..network.discovery import (DEFAULT_PATHS, SOURCE_ARP, SOURCE_DHCPD, SOURCE_DNSMASQ,
+                                 SOURCE_IP_NEIGH)
+from ..network.probe import LivenessProber, wake_and_verify
+from ..network.scheduler import WaveScheduler
+from ..network.worker import WakeWorker
+from ..registry import DeviceRegistry
 from .tooltip import ToolTip
 from .device_dialog import DeviceDialog
 
+logger = logging.getLogger(__name__)
+
 
 class MainWindow:
     """Main window for the Wake-on-LAN application."""
     
+    # Device field shown in each column
+    COLUMN_FIELDS = {
+        'Device Name': 'name',
+        'MAC Address': 'mac_address',
+        'IP Address': 'ip_address',
+        'Port': 'port',
+        'Group': 'group',
+        'Tags': 'tags',
+    }
+    
+    # Rows inserted per Tk event loop iteration when many devices appear at once
+    LOAD_CHUNK = 500
+    
+    # From this many devices on, only the rows in view plus VIRTUAL_BUFFER
+    # rows above and below are kept in the tree view
+    VIRTUAL_THRESHOLD = 5000
+    VIRTUAL_BUFFER = 20
+    
+    # Seconds close() waits for queued wakes before the window closes anyway
+    CLOSE_TIMEOUT = 5.0
+    
+    # Status column marks for a device's last wake
+    WAKE_PENDING = '…'
+    WAKE_SENT = '✓'
+    WAKE_FAILED = '✗'
+    
     def __init__(self, root: tk.Tk):
         """
         Initialize the main window.
@@ -24,11 +62,41 @@ class MainWindow:
             root: The root Tkinter window
         """
         self.root = root
-        self.devices: List[Device] = []
+        # Tree rows use the registry's device IDs as their item IDs; tree_rows
+        # maps the ID of each device shown to the values its row displays
+        self.registry = DeviceRegistry()
+        self.tree_rows: Dict[int, tuple] = {}
+        self._load_job: Optional[str] = None
+        # True while the app is still reading pages of the device list;
+        # edits wait until the list matches what is stored
+        self.loading = False
+        
+        # Virtual list state: the position of the top row in view and the
+        # positions of the rows in the tree, as a half-open range
+        self.virtual = False
+        self._first = 0
+        self._window = (0, 0)
+        # The selected devices, which may be scrolled out of the tree in
+        # virtual mode, and the one last clicked
+        self._selected_ids: Dict[int, None] = {}
+        self._anchor_id: Optional[int] = None
+        
+        # Wakes run on a worker thread, paced in waves so a whole room does
+        # not power up at once; results are drained from its queue with
+        # after() into wake_status, the Status mark of each device ID
+        self.wake_worker = WakeWorker(waves=WaveScheduler())
+        self.wake_status: Dict[int, str] = {}
+        self._wake_batches: Dict[int, dict] = {}
+        self._wake_poll: Optional[str] = None
         self.device_changed_callback: Optional[Callable] = None
         
+        # Wake-and-verify settings; probes run on a background event loop
+        self.background_loop = BackgroundLoop()
+        self.verify_port = 22
+        self.verify_timeout = 120.0
+        
         # Sort state tracking
-        self.sort_reverse = {'Device Name': False, 'MAC Address': False, 'IP Address': False, 'Port': False}
+        self.sort_reverse = {column: False for column in self.COLUMN_FIELDS}
         self.last_sorted_column = None
         
         self.setup_window()
@@ -128,6 +196,11 @@ class MainWindow:
         # Button frame
         self.setup_buttons(main_frame)
         
+        # Status line for long-running background work
+        self.status_var = tk.StringVar()
+        ttk.Label(main_frame, textvariable=self.status_var).grid(row=3, column=0, columnspan=3,
+                                                                 sticky=tk.W)
+        
         # Context menu
         self.setup_context_menu()
     
@@ -136,36 +209,69 @@ class MainWindow:
         list_frame = ttk.LabelFrame(parent, text="Devices", padding="10")
         list_frame.grid(row=1, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
         list_frame.columnconfigure(0, weight=1)
-        list_frame.rowconfigure(0, weight=1)
+        list_frame.rowconfigure(1, weight=1)
+        
+        # Name search, answered from the registry's prefix index
+        find_frame = ttk.Frame(list_frame)
+        find_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 5))
+        ttk.Label(find_frame, text="Find:").pack(side=tk.LEFT)
+        self.find_var = tk.StringVar()
+        find_entry = ttk.Entry(find_frame, textvariable=self.find_var, width=30)
+        find_entry.pack(side=tk.LEFT, padx=(5, 0))
+        find_entry.bind('<KeyRelease>', lambda event: self.find_device())
+        find_entry.bind('<Return>', lambda event: self.find_device())
+        ToolTip(find_entry, "Type the start of a device name to select it", delay=700)
         
         # Treeview for device list
-        columns = ('Device Name', 'MAC Address', 'IP Address', 'Port')
-        self.device_tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=10)
+        columns = ('Status',) + tuple(self.COLUMN_FIELDS)
+        self.device_tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=10,
+                                        selectmode='extended')
         
         # Configure column headings and widths with sorting
+        self.device_tree.heading('Status', text='')
         self.device_tree.heading('Device Name', text='Device Name ↕', command=lambda: self.sort_column('Device Name'))
         self.device_tree.heading('MAC Address', text='MAC Address ↕', command=lambda: self.sort_column('MAC Address'))
         self.device_tree.heading('IP Address', text='IP Address ↕', command=lambda: self.sort_column('IP Address'))
         self.device_tree.heading('Port', text='Port ↕', command=lambda: self.sort_column('Port'))
+        self.device_tree.heading('Group', text='Group ↕', command=lambda: self.sort_column('Group'))
+        self.device_tree.heading('Tags', text='Tags ↕', command=lambda: self.sort_column('Tags'))
         
+        self.device_tree.column('Status', width=30, minwidth=30, stretch=False, anchor=tk.CENTER)
         self.device_tree.column('Device Name', width=200)
         self.device_tree.column('MAC Address', width=150)
         self.device_tree.column('IP Address', width=150)
         self.device_tree.column('Port', width=80)
+        self.device_tree.column('Group', width=100)
+        self.device_tree.column('Tags', width=150)
         
-        # Scrollbar for treeview
-        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.device_tree.yview)
-        self.device_tree.configure(yscrollcommand=scrollbar.set)
+        # Scrollbar for treeview; in virtual mode it scrolls through the registry instead
+        self.scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.device_tree.yview)
+        self.device_tree.configure(yscrollcommand=self.scrollbar.set)
         
-        self.device_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.device_tree.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.scrollbar.grid(row=1, column=1, sticky=(tk.N, tk.S))
         
         # Add tooltip
-        ToolTip(self.device_tree, "Double-click a device to wake it up", delay=1000)
+        ToolTip(self.device_tree, "Double-click a device to wake it up; Ctrl- or Shift-click to "
+                                  "select several", delay=1000)
         
         # Bind events
         self.device_tree.bind('<Double-1>', self.on_double_click)
         self.device_tree.bind('<Button-3>', self.on_right_click)
+        
+        # Virtual mode takes over clicks, scrolling and keyboard navigation,
+        # which Tk would otherwise apply to the partial list in the tree
+        self.device_tree.bind('<Button-1>', self._on_virtual_click)
+        self.device_tree.bind('<MouseWheel>', self._on_mouse_wheel)
+        self.device_tree.bind('<Button-4>', self._on_mouse_wheel)
+        self.device_tree.bind('<Button-5>', self._on_mouse_wheel)
+        self.device_tree.bind('<Up>', lambda event: self._move_selection(-1))
+        self.device_tree.bind('<Down>', lambda event: self._move_selection(1))
+        self.device_tree.bind('<Prior>', lambda event: self._move_selection(-self._visible_rows()))
+        self.device_tree.bind('<Next>', lambda event: self._move_selection(self._visible_rows()))
+        self.device_tree.bind('<Home>', lambda event: self._move_selection(-len(self.registry)))
+        self.device_tree.bind('<End>', lambda event: self._move_selection(len(self.registry)))
+        self.device_tree.bind('<Configure>', lambda event: self._render_window() if self.virtual else None)
     
     def setup_buttons(self, parent):
         """Set up the action buttons."""
@@ -184,7 +290,7 @@ class MainWindow:
         
         wake_btn = ttk.Button(button_frame, text="Wake Device", command=self.wake_device)
         wake_btn.pack(side=tk.LEFT, padx=5)
-        ToolTip(wake_btn, "Send Wake-on-LAN packet to selected device", delay=700)
+        ToolTip(wake_btn, "Send Wake-on-LAN packets to the selected devices", delay=700)
         
         # Separator
         ttk.Separator(button_frame, orient=tk.VERTICAL).pack(side=tk.LEFT, fill=tk.Y, padx=10)
@@ -198,6 +304,21 @@ class MainWindow:
         import_btn.pack(side=tk.LEFT, padx=5)
         ToolTip(import_btn, "Load devices from a previously saved file", delay=700)
         
+        discover_btn = ttk.Menubutton(button_frame, text="Discover")
+        discover_menu = tk.Menu(discover_btn, tearoff=0)
+        discover_menu.add_command(label="ARP Table",
+                                  command=lambda: self.discover_devices(SOURCE_ARP))
+        discover_menu.add_command(label="Neighbour Table (ip neigh)",
+                                  command=lambda: self.discover_devices(SOURCE_IP_NEIGH))
+        discover_menu.add_separator()
+        discover_menu.add_command(label="dnsmasq Leases...",
+                                  command=lambda: self.discover_devices(SOURCE_DNSMASQ, ask_path=True))
+        discover_menu.add_command(label="ISC dhcpd Leases...",
+                                  command=lambda: self.discover_devices(SOURCE_DHCPD, ask_path=True))
+        discover_btn['menu'] = discover_menu
+        discover_btn.pack(side=tk.LEFT, padx=5)
+        ToolTip(discover_btn, "Add devices seen in ARP tables or DHCP leases", delay=700)
+        
         # Second separator for utility functions
         ttk.Separator(button_frame, orient=tk.VERTICAL).pack(side=tk.LEFT, fill=tk.Y, padx=10)
         
@@ -210,6 +331,10 @@ class MainWindow:
         """Set up the right-click context menu."""
         self.context_menu = tk.Menu(self.root, tearoff=0)
         self.context_menu.add_command(label="Wake Device", command=self.wake_device)
+        self.context_menu.add_command(label="Wake and Verify", command=self.wake_and_verify_device)
+        # Filled in with the selected device's group and tags on each popup
+        self.wake_group_menu = tk.Menu(self.context_menu, tearoff=0)
+        self.context_menu.add_cascade(label="Wake Group", menu=self.wake_group_menu)
         self.context_menu.add_separator()
         self.context_menu.add_command(label="Edit Device", command=self.edit_device)
         self.context_menu.add_command(label="Remove Device", command=self.remove_device)
@@ -218,36 +343,344 @@ class MainWindow:
         self.context_menu.add_command(label="Copy IP Address", command=self.copy_ip_address)
     
     def set_devices(self, devices: List[Device]):
-        """Set the list of devices to display."""
-        self.devices = devices
+        """Set the list of devices to display, keeping the rows of devices already shown."""
+        self.registry.assign(devices)
+        self._forget_wake_status([device_id for device_id in self.wake_status
+                                  if device_id not in self.registry])
         self.refresh_device_list()
     
+    def append_devices(self, devices: List[Device]):
+        """Add another page of devices to the end of the list."""
+        self.rows_changed(added=self.registry.extend(devices))
+    
+    def _still_loading(self) -> bool:
+        """Tell the user to wait if the device list is still being loaded."""
+        if self.loading:
+            messagebox.showinfo("Loading", "Please wait until the device list has loaded.")
+        return self.loading
+    
+    def set_status(self, text: str):
+        """Show a line of status text below the buttons."""
+        self.status_var.set(text)
+    
     def set_device_changed_callback(self, callback: Callable):
         """Set the callback for when devices are changed."""
         self.device_changed_callback = callback
     
     def refresh_device_list(self):
-        """Refresh the device list in the tree view."""
-        # Clear existing items
-        for item in self.device_tree.get_children():
-            self.device_tree.delete(item)
-        
-        # Add devices to tree
-        for device in self.devices:
-            self.device_tree.insert('', tk.END, values=(
-                device.name,
-                device.mac_address,
-                device.ip_address or 'Broadcast',
-                device.port
-            ))
+        """
+        Bring the tree view in line with the registry.
+        
+        With fewer than VIRTUAL_THRESHOLD devices every device has a row;
+        beyond that the list switches to virtual mode, where only the rows
+        around the scroll position exist (see _render_window()).
+        """
+        self._cancel_load()
+        was_virtual = self.virtual
+        if not was_virtual:
+            self._anchor_id = self.get_selected_id()
+            self._selected_ids = dict.fromkeys(self.get_selected_ids())
+        self.virtual = len(self.registry) >= self.VIRTUAL_THRESHOLD
+        
+        if self.virtual:
+            self.scrollbar.configure(command=self._on_scrollbar)
+            self.device_tree.configure(yscrollcommand='')
+            self._render_window(reload=True)
+        else:
+            self.scrollbar.configure(command=self.device_tree.yview)
+            self.device_tree.configure(yscrollcommand=self.scrollbar.set)
+            self._show_rows(self.registry.ids())
+            if was_virtual:
+                self._restore_selection()
+    
+    def _show_rows(self, ids: List[int]):
+        """
+        Make the tree view show exactly the rows of the given devices, in order.
+        
+        Only rows that changed are touched: rows no longer wanted are
+        deleted, remaining rows are reordered in one call and updated if
+        their values differ, and new rows are inserted LOAD_CHUNK at a time
+        from the Tk event loop so large loads do not freeze the window.
+        """
+        wanted = set(ids)
+        gone = [device_id for device_id in self.tree_rows if device_id not in wanted]
+        if gone:
+            self.device_tree.delete(*map(str, gone))
+            for device_id in gone:
+                del self.tree_rows[device_id]
+        
+        shown = [str(device_id) for device_id in ids if device_id in self.tree_rows]
+        if tuple(shown) != self.device_tree.get_children():
+            self.device_tree.set_children('', *shown)
+        self._update_rows(int(item) for item in shown)
+        
+        pending = [(index, device_id) for index, device_id in enumerate(ids)
+                   if device_id not in self.tree_rows]
+        if pending:
+            self._insert_rows(pending, 0)
+    
+    def _insert_rows(self, pending: List[tuple], start: int):
+        """Insert a chunk of (index, device ID) rows and schedule the next one."""
+        self._load_job = None
+        for index, device_id in pending[start:start + self.LOAD_CHUNK]:
+            values = self.display_values(device_id)
+            self.device_tree.insert('', index, iid=str(device_id), values=values)
+            self.tree_rows[device_id] = values
+        
+        start += self.LOAD_CHUNK
+        if start < len(pending):
+            self.set_status(f"Loading devices... {start:,} of {len(pending):,}")
+            self._load_job = self.root.after(1, lambda: self._insert_rows(pending, start))
+        elif len(pending) > self.LOAD_CHUNK:
+            self.set_status("")
+    
+    def _render_window(self, first: Optional[int] = None, reload: bool = False):
+        """
+        Scroll the virtual list so the device at position first is the top row.
+        
+        The tree holds the rows in view plus VIRTUAL_BUFFER rows on either
+        side. Scrolling within that buffer only moves the tree's own view;
+        beyond it, or after the registry changed, the rows are replaced
+        through _show_rows(), so each step costs the same however many
+        devices there are.
+        
+        Args:
+            first: Position of the new top row; defaults to the current one
+            reload: Re-read the rows even if first stays within the buffer
+        """
+        total = len(self.registry)
+        visible = self._visible_rows()
+        first = self._first if first is None else first
+        first = max(0, min(first, total - visible))
+        self._first = first
+        
+        start, stop = self._window
+        if reload or first < start or first + visible > stop:
+            start = max(0, first - self.VIRTUAL_BUFFER)
+            stop = min(total, first + visible + self.VIRTUAL_BUFFER)
+            self._window = (start, stop)
+            self._show_rows(self.registry.ids(start, stop))
+            self._restore_selection()
+        
+        if stop > start:
+            self.device_tree.yview_moveto((first - start) / (stop - start))
+        if total:
+            self.scrollbar.set(first / total, min(first + visible, total) / total)
+        else:
+            self.scrollbar.set(0, 1)
+    
+    def _visible_rows(self) -> int:
+        """Estimate how many rows fit in the tree view."""
+        row_height = ttk.Style().lookup('Treeview', 'rowheight')
+        try:
+            row_height = int(row_height)
+        except (TypeError, ValueError):
+            row_height = tkfont.nametofont('TkDefaultFont').metrics('linespace') + 2
+        # Before the window is mapped its height is 1; fall back to the configured rows
+        rows = self.device_tree.winfo_height() // max(row_height, 1) - 1
+        return max(rows, int(self.device_tree.cget('height')), 1)
+    
+    def _on_scrollbar(self, action: str, amount: str, unit: Optional[str] = None):
+        """Scroll the virtual list from the scrollbar."""
+        if action == 'moveto':
+            first = int(float(amount) * len(self.registry))
+        else:
+            step = self._visible_rows() if unit == 'pages' else 1
+            first = self._first + int(amount) * step
+        self._render_window(first)
+    
+    def _on_mouse_wheel(self, event):
+        """Scroll the virtual list three rows per wheel step."""
+        if not self.virtual:
+            return None
+        
+        if event.num == 4 or getattr(event, 'delta', 0) > 0:
+            self._render_window(self._first - 3)
+        else:
+            self._render_window(self._first + 3)
+        return 'break'
+    
+    def _on_virtual_click(self, event):
+        """Select rows of the virtual list without letting Tk scroll the tree."""
+        if not self.virtual:
+            return None
+        if self.device_tree.identify_region(event.x, event.y) not in ('cell', 'tree'):
+            # Headings and column separators keep their usual behaviour
+            return None
+        
+        item = self.device_tree.identify_row(event.y)
+        if not item:
+            return 'break'
+        
+        device_id = int(item)
+        if event.state & 0x0001 and self._anchor_id in self.registry:
+            # Shift: select the range from the last clicked device
+            first, last = sorted((self.registry.position(self._anchor_id),
+                                  self.registry.position(device_id)))
+            self._selected_ids = dict.fromkeys(self.registry.ids(first, last + 1))
+            self._restore_selection()
+        elif event.state & 0x0004:
+            # Control: toggle the device
+            if device_id in self._selected_ids:
+                del self._selected_ids[device_id]
+            else:
+                self._selected_ids[device_id] = None
+            self._anchor_id = device_id
+            self._restore_selection()
+        else:
+            self.select_device(device_id)
+        self.device_tree.focus_set()
+        return 'break'
+    
+    def _move_selection(self, step: int):
+        """Move the selection of the virtual list up or down by step rows."""
+        if not self.virtual:
+            return None
+        if not len(self.registry):
+            return 'break'
+        
+        device_id = self.get_selected_id()
+        position = self.registry.position(device_id) + step if device_id is not None else self._first
+        position = max(0, min(position, len(self.registry) - 1))
+        self.select_device(self.registry.ids(position, position + 1)[0])
+        return 'break'
+    
+    def _restore_selection(self):
+        """Select the rows of the selected devices that are in the tree."""
+        selected = self._selected_ids
+        items = [str(device_id) for device_id in self.tree_rows if device_id in selected]
+        if tuple(items) != self.device_tree.selection():
+            self.device_tree.selection_set(items)
+        if self._anchor_id in self.tree_rows:
+            self.device_tree.focus(str(self._anchor_id))
+    
+    def select_device(self, device_id: int):
+        """
+        Select only one device and scroll it into view.
+        
+        Args:
+            device_id: Registry ID of the device
+        """
+        self._selected_ids = {device_id: None}
+        self._anchor_id = device_id
+        if self.virtual:
+            position = self.registry.position(device_id)
+            visible = self._visible_rows()
+            if position < self._first:
+                self._render_window(position)
+            elif position >= self._first + visible:
+                self._render_window(position - visible + 1)
+            self._restore_selection()
+            return
+        
+        item = str(device_id)
+        self.device_tree.selection_set(item)
+        self.device_tree.focus(item)
+        self.device_tree.see(item)
+    
+    def _cancel_load(self):
+        """Stop inserting the rest of a chunked load."""
+        if self._load_job is not None:
+            self.root.after_cancel(self._load_job)
+            self._load_job = None
+    
+    def _update_rows(self, device_ids: Iterable[int]):
+        """Refresh the values of rows whose device changed."""
+        for device_id in device_ids:
+            values = self.display_values(device_id)
+            if values != self.tree_rows.get(device_id):
+                self.device_tree.item(str(device_id), values=values)
+                self.tree_rows[device_id] = values
+    
+    def rows_changed(self, added: Iterable[int] = (), updated: Iterable[int] = (),
+                     removed: Iterable[int] = ()):
+        """
+        Reflect a few registry changes in the tree view.
+        
+        Args:
+            added: IDs of devices appended to the registry
+            updated: IDs of devices replaced in place
+            removed: IDs of devices removed from the registry
+        """
+        removed = list(removed)
+        self._forget_wake_status(removed)
+        if self.virtual or self._load_job is not None or len(self.registry) >= self.VIRTUAL_THRESHOLD:
+            # Rows still waiting to be inserted may have changed position, and
+            # the virtual list's window moves with every insertion or removal
+            self.refresh_device_list()
+            return
+        
+        gone = [device_id for device_id in removed if device_id in self.tree_rows]
+        if gone:
+            self.device_tree.delete(*map(str, gone))
+            for device_id in gone:
+                del self.tree_rows[device_id]
+        self._update_rows(updated)
+        for device_id in added:
+            values = self.display_values(device_id)
+            self.device_tree.insert('', tk.END, iid=str(device_id), values=values)
+            self.tree_rows[device_id] = values
+    
+    def _forget_wake_status(self, device_ids: Iterable[int]):
+        """Drop the Status marks of devices that are no longer in the registry."""
+        for device_id in device_ids:
+            self.wake_status.pop(device_id, None)
+    
+    def display_values(self, device_id: int) -> tuple:
+        """Get the values of a device's row: its wake status, then its fields."""
+        return (self.wake_status.get(device_id, ''),) + self.row_values(self.registry.get(device_id))
+    
+    def row_values(self, device: Device) -> tuple:
+        """Get the column values shown for a device."""
+        return (
+            device.name,
+            device.mac_address,
+            device.ip_address or 'Broadcast',
+            device.port,
+            device.group,
+            ', '.join(device.tags)
+        )
+    
+    def apply_device_diff(self, diff: DeviceDiff):
+        """
+        Apply changes made to the device list elsewhere, touching only the affected rows.
+        
+        Args:
+            diff: Added, updated and removed devices (see config.merge)
+        """
+        # Each key names one device: the n-th, in list order, with that MAC address
+        by_mac: Dict[str, List[int]] = {}
+        
+        def resolve(key) -> Optional[int]:
+            mac, occurrence = key
+            if mac not in by_mac:
+                by_mac[mac] = sorted(self.registry.by_mac(mac), key=self.registry.position)
+            matches = by_mac[mac]
+            return matches[occurrence] if occurrence < len(matches) else None
+        
+        gone = [device_id for device_id in map(resolve, diff.removed) if device_id is not None]
+        targets = [(resolve(key), device) for key, device in diff.updated]
+        self.registry.remove_many(gone)
+        
+        added, updated = [], []
+        for device_id, device in targets:
+            if device_id is not None and device_id in self.registry:
+                self.registry.update(device_id, device)
+                updated.append(device_id)
+            else:
+                added.append(self.registry.add(device))
+        for device in diff.added:
+            added.append(self.registry.add(device))
+        
+        self.rows_changed(added, updated, gone)
     
     def sort_column(self, col):
         """Sort the tree view by the specified column."""
-        if not self.devices:
+        if not len(self.registry) or self._still_loading():
             return
         
         # Update sort indicators in headers
-        for column in ['Device Name', 'MAC Address', 'IP Address', 'Port']:
+        for column in self.COLUMN_FIELDS:
             if column == col:
                 if self.last_sorted_column == col:
                     self.sort_reverse[col] = not self.sort_reverse[col]
@@ -262,21 +695,15 @@ class MainWindow:
         self.last_sorted_column = col
         
         # Sort the devices list
-        if col == 'Device Name':
-            self.devices.sort(key=lambda x: x.name.lower(), reverse=self.sort_reverse[col])
-        elif col == 'MAC Address':
-            self.devices.sort(key=lambda x: x.mac_address, reverse=self.sort_reverse[col])
-        elif col == 'IP Address':
-            self.devices.sort(key=lambda x: x.ip_address or '', reverse=self.sort_reverse[col])
-        elif col == 'Port':
-            self.devices.sort(key=lambda x: x.port, reverse=self.sort_reverse[col])
-        
-        # Refresh the display
+        key = self.COLUMN_FIELDS[col]
+        self.registry.sort(key, reverse=self.sort_reverse[col])
+        
+        # Reorder the existing rows
         self.refresh_device_list()
         
         # Notify about changes
         if self.device_changed_callback:
-            self.device_changed_callback()
+            self.device_changed_callback(change=sort_record(key, self.sort_reverse[col]))
     
     def on_double_click(self, event):
         """Handle double-click events - only wake if clicking on an actual item."""
@@ -288,9 +715,10 @@ class MainWindow:
         """Handle right-click events - show context menu if clicking on an actual item."""
         item = self.device_tree.identify_row(event.y)
         if item:
-            # Select the item that was right-clicked
-            self.device_tree.selection_set(item)
-            self.device_tree.focus(item)
+            # Select the item that was right-clicked, unless it is part of the selection
+            if not self.is_selected(int(item)):
+                self.select_device(int(item))
+            self.update_wake_group_menu()
             
             # Show context menu
             try:
@@ -300,80 +728,317 @@ class MainWindow:
     
     def get_selected_device(self) -> Optional[Device]:
         """Get the currently selected device."""
+        device_id = self.get_selected_id()
+        return self.registry.get(device_id) if device_id is not None else None
+    
+    def get_selected_id(self) -> Optional[int]:
+        """Get the registry ID of the selected device last clicked, or of the first selected one."""
+        if self.virtual:
+            # The selected rows may be scrolled out of the tree
+            device_id = self._anchor_id
+            if device_id not in self._selected_ids:
+                device_id = next(iter(self._selected_ids), None)
+            return device_id if device_id in self.registry else None
+        
         selection = self.device_tree.selection()
         if not selection:
             return None
         
-        item = selection[0]
-        index = self.device_tree.index(item)
-        return self.devices[index] if index < len(self.devices) else None
+        focus = self.device_tree.focus()
+        device_id = int(focus if focus in selection else selection[0])
+        return device_id if device_id in self.registry else None
     
-    def get_selected_index(self) -> Optional[int]:
-        """Get the index of the currently selected device."""
-        selection = self.device_tree.selection()
-        if not selection:
-            return None
+    def get_selected_ids(self) -> List[int]:
+        """Get the registry IDs of all selected devices, in list order."""
+        if self.virtual:
+            return sorted((device_id for device_id in self._selected_ids if device_id in self.registry),
+                          key=self.registry.position)
+        return [int(item) for item in self.device_tree.selection() if int(item) in self.registry]
+    
+    def is_selected(self, device_id: int) -> bool:
+        """Check whether a device is selected."""
+        if self.virtual:
+            return device_id in self._selected_ids
+        return str(device_id) in self.device_tree.selection()
+    
+    def find_device(self):
+        """Select the first device, by name, whose name starts with the search text."""
+        prefix = self.find_var.get().strip()
+        if not prefix:
+            return
         
-        item = selection[0]
-        return self.device_tree.index(item)
+        matches = self.registry.name_prefix(prefix, limit=1)
+        if matches:
+            self.select_device(matches[0])
     
     def add_device(self):
         """Open dialog to add a new device."""
+        if self._still_loading():
+            return
+        
         def on_device_added(device: Device):
-            self.devices.append(device)
-            self.refresh_device_list()
+            self.rows_changed(added=[self.registry.add(device)])
             if self.device_changed_callback:
-                self.device_changed_callback()
+                self.device_changed_callback(change=add_record(device))
         
-        dialog = DeviceDialog(self.root, callback=on_device_added)
+        dialog = DeviceDialog(self.root, callback=on_device_added, groups=self.registry.groups())
         dialog.show()
     
     def edit_device(self):
         """Open dialog to edit selected device."""
-        device = self.get_selected_device()
-        index = self.get_selected_index()
+        if self._still_loading():
+            return
         
-        if not device:
+        device_id = self.get_selected_id()
+        
+        if device_id is None:
             messagebox.showwarning("No Selection", "Please select a device to edit.")
             return
+        if len(self.get_selected_ids()) > 1:
+            messagebox.showwarning("Multiple Selection", "Please select a single device to edit.")
+            return
+        device = self.registry.get(device_id)
         
         def on_device_edited(edited_device: Device):
-            self.devices[index] = edited_device
-            self.refresh_device_list()
+            if device_id not in self.registry:
+                # Removed meanwhile, e.g. by an external edit of the config file
+                return
+            self.registry.update(device_id, edited_device)
+            self.rows_changed(updated=[device_id])
             if self.device_changed_callback:
-                self.device_changed_callback()
+                index = self.registry.position(device_id)
+                self.device_changed_callback(change=update_record(index, edited_device))
         
-        dialog = DeviceDialog(self.root, device=device, callback=on_device_edited)
+        dialog = DeviceDialog(self.root, device=device, callback=on_device_edited,
+                              groups=self.registry.groups())
         dialog.show()
     
     def remove_device(self):
-        """Remove selected device."""
-        device = self.get_selected_device()
-        index = self.get_selected_index()
+        """Remove the selected devices."""
+        if self._still_loading():
+            return
         
-        if not device:
+        device_ids = self.get_selected_ids()
+        
+        if not device_ids:
             messagebox.showwarning("No Selection", "Please select a device to remove.")
             return
         
-        if messagebox.askyesno("Confirm", f"Are you sure you want to remove '{device.name}'?"):
-            del self.devices[index]
-            self.refresh_device_list()
-            if self.device_changed_callback:
-                self.device_changed_callback()
+        if len(device_ids) == 1:
+            question = f"Are you sure you want to remove '{self.registry.get(device_ids[0]).name}'?"
+        else:
+            question = f"Are you sure you want to remove {len(device_ids):,} devices?"
+        if not messagebox.askyesno("Confirm", question):
+            return
+        
+        # Removed meanwhile, e.g. by an external edit of the config file
+        device_ids = [device_id for device_id in device_ids if device_id in self.registry]
+        # Journal from the end of the list so each record's index is still valid when replayed
+        indexes = sorted((self.registry.position(device_id) for device_id in device_ids),
+                         reverse=True)
+        self.registry.remove_many(device_ids)
+        self.rows_changed(removed=device_ids)
+        if self.device_changed_callback:
+            for index in indexes:
+                self.device_changed_callback(change=delete_record(index))
     
     def wake_device(self):
-        """Send Wake-on-LAN packet to selected device."""
+        """Send Wake-on-LAN packets to the selected devices."""
+        device_ids = self.get_selected_ids()
+        
+        if not device_ids:
+            messagebox.showwarning("No Selection", "Please select a device to wake.")
+            return
+        
+        if len(device_ids) == 1:
+            label = self.registry.get(device_ids[0]).name
+        else:
+            label = f"{len(device_ids)} selected devices"
+        self.wake_devices(device_ids, label)
+    
+    def wake_devices(self, device_ids: List[int], label: str):
+        """
+        Wake devices on the background worker, leaving the window responsive.
+        
+        Each device's Status mark shows WAKE_PENDING until its result comes
+        back, then WAKE_SENT or WAKE_FAILED; the status line shows progress
+        and a summary instead of a dialog per device.
+        
+        Args:
+            device_ids: Registry IDs of the devices to wake
+            label: Description of the devices for the status line
+        """
+        batch = self.wake_worker.submit((device_id, self.registry.get(device_id))
+                                        for device_id in device_ids)
+        self._wake_batches[batch] = {'label': label, 'total': len(device_ids), 'sent': 0, 'failed': []}
+        
+        for device_id in device_ids:
+            self.wake_status[device_id] = self.WAKE_PENDING
+        self._update_rows([device_id for device_id in device_ids if device_id in self.tree_rows])
+        self.set_status(f"Waking {label}...")
+        
+        if self._wake_poll is None:
+            self._wake_poll = self.root.after(50, self._drain_wake_results)
+    
+    def _drain_wake_results(self):
+        """Apply the wake results waiting on the worker's queue, from the Tk main loop."""
+        self._wake_poll = None
+        shown = []
+        for update in self.wake_worker.drain(limit=self.LOAD_CHUNK):
+            batch = self._wake_batches[update.batch]
+            if update.result.success:
+                batch['sent'] += 1
+                mark = self.WAKE_SENT
+            else:
+                batch['failed'].append(update.result)
+                mark = self.WAKE_FAILED
+            if update.key in self.registry:
+                # Devices removed while their wake was queued get no mark back
+                self.wake_status[update.key] = mark
+            if update.key in self.tree_rows:
+                shown.append(update.key)
+        self._update_rows(shown)
+        
+        finished = [number for number, batch in self._wake_batches.items()
+                    if batch['sent'] + len(batch['failed']) == batch['total']]
+        if finished:
+            self.set_status(self._wake_summary(self._wake_batches[finished[-1]]))
+            for number in finished:
+                del self._wake_batches[number]
+        elif self._wake_batches:
+            batch = list(self._wake_batches.values())[-1]
+            done = batch['sent'] + len(batch['failed'])
+            self.set_status(f"Waking {batch['label']}... {done:,} of {batch['total']:,}")
+        
+        if self._wake_batches:
+            self._wake_poll = self.root.after(50, self._drain_wake_results)
+    
+    def close(self):
+        """Send the wakes still queued and stop the background threads."""
+        if self._wake_batches:
+            pending = sum(batch['total'] - batch['sent'] - len(batch['failed'])
+                          for batch in self._wake_batches.values())
+            self.set_status(f"Sending {pending:,} queued Wake-on-LAN packet(s)...")
+            self.root.update_idletasks()
+        if not self.wake_worker.stop(self.CLOSE_TIMEOUT):
+            # The worker is a daemon thread, so wakes still unsent when the
+            # app exits are dropped rather than holding up the window
+            logger.warning("Closing with Wake-on-LAN packets still queued")
+        self.background_loop.stop()
+    
+    def _wake_summary(self, batch: dict) -> str:
+        """Describe the outcome of a finished wake batch in one line."""
+        failed = batch['failed']
+        if not failed:
+            return f"Wake-on-LAN packets sent to {batch['label']}"
+        
+        details = "; ".join(f"{result.device.name}: {result.error}" for result in failed[:3])
+        if len(failed) > 3:
+            details += f"; {len(failed) - 3:,} more"
+        return (f"Sent to {batch['sent']:,} of {batch['total']:,} ({batch['label']}), "
+                f"{len(failed):,} failed: {details}")
+    
+    def update_wake_group_menu(self):
+        """List the selected device's group and tags in the Wake Group menu."""
+        self.wake_group_menu.delete(0, tk.END)
         device = self.get_selected_device()
+        if device is None:
+            return
         
-        if not device:
+        if device.group:
+            count = len(self.registry.by_group(device.group))
+            self.wake_group_menu.add_command(
+                label=f"Group '{device.group}' ({count} devices)",
+                command=lambda: self.wake_group(group=device.group))
+        for tag in device.tags:
+            count = len(self.registry.by_tag(tag))
+            self.wake_group_menu.add_command(
+                label=f"Tag '{tag}' ({count} devices)",
+                command=lambda tag=tag: self.wake_group(tag=tag))
+        if not device.group and not device.tags:
+            self.wake_group_menu.add_command(label="No group or tags", state=tk.DISABLED)
+    
+    def wake_group(self, group: Optional[str] = None, tag: Optional[str] = None):
+        """
+        Wake every device in a group or with a tag in the background.
+        
+        Args:
+            group: Group to wake
+            tag: Tag to wake, if no group is given
+        """
+        if group is not None:
+            device_ids = self.registry.by_group(group)
+            label = f"group '{group}'"
+        else:
+            device_ids = self.registry.by_tag(tag)
+            label = f"tag '{tag}'"
+        
+        if not device_ids:
+            messagebox.showwarning("No Devices", f"No devices found for {label}.")
+            return
+        
+        self.wake_devices(device_ids, f"{len(device_ids)} device(s) in {label}")
+    
+    def wake_and_verify_device(self):
+        """Wake the selected devices and report each one's time to wake once all are probed."""
+        devices = [self.registry.get(device_id) for device_id in self.get_selected_ids()]
+        
+        if not devices:
             messagebox.showwarning("No Selection", "Please select a device to wake.")
             return
         
+        # Devices without an IP address cannot be probed, so they are left out
+        unverifiable = [device.name for device in devices if not device.ip_address]
+        devices = [device for device in devices if device.ip_address]
+        if not devices:
+            if len(unverifiable) == 1:
+                message = f"{unverifiable[0]} has no IP address, so it cannot be verified."
+            else:
+                message = "None of the selected devices has an IP address, so none can be verified."
+            messagebox.showwarning("No IP Address", message)
+            return
+        if unverifiable:
+            self.set_status(f"Skipped {len(unverifiable):,} device(s) without an IP address")
+        
+        prober = LivenessProber(port=self.verify_port)
+        future = self.background_loop.submit(
+            wake_and_verify(devices, prober, planner=self.wake_worker.planner,
+                            deadline=self.verify_timeout))
+        self.root.after(200, lambda: self._check_verify(future))
+    
+    def _check_verify(self, future):
+        """Poll a wake-and-verify future from the Tk main loop."""
+        if not future.done():
+            self.root.after(200, lambda: self._check_verify(future))
+            return
+        
         try:
-            WakeOnLanSender.wake_device(device)
-            messagebox.showinfo("Success", f"Wake-on-LAN packet sent to {device.name}")
+            results = future.result()
         except Exception as e:
             messagebox.showerror("Error", str(e))
+            return
+        
+        if len(results) == 1:
+            result = results[0]
+            if result.awake:
+                messagebox.showinfo("Device Awake",
+                                    f"{result.device.name} is up after {result.time_to_wake:.1f}s "
+                                    f"({result.packets_sent} packet(s) sent)")
+            else:
+                messagebox.showwarning("Device Not Responding",
+                                       f"{result.device.name}: {result.error}")
+            return
+        
+        awake = [result for result in results if result.awake]
+        lines = [f"{result.device.name}: up after {result.time_to_wake:.1f}s "
+                 f"({result.packets_sent} packet(s) sent)" if result.awake
+                 else f"{result.device.name}: {result.error}" for result in results[:20]]
+        if len(results) > 20:
+            lines.append(f"... and {len(results) - 20:,} more")
+        self.set_status(f"{len(awake):,} of {len(results):,} device(s) came up")
+        show = messagebox.showinfo if len(awake) == len(results) else messagebox.showwarning
+        show("Wake and Verify",
+             f"{len(awake):,} of {len(results):,} device(s) came up:\n\n" + "\n".join(lines))
     
     def copy_mac_address(self):
         """Copy the MAC address of the selected device to clipboard."""
@@ -408,14 +1073,15 @@ class MainWindow:
     
     def export_devices(self):
         """Export devices to a file."""
-        if not self.devices:
+        if not len(self.registry):
             messagebox.showwarning("No Devices", "No devices to export.")
             return
         
         file_path = filedialog.asksaveasfilename(
             title="Export Devices",
             defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=[("JSON files", "*.json"), ("Compact binary files", "*.swol"),
+                       ("All files", "*.*")]
         )
         
         if file_path and self.device_changed_callback:
@@ -424,15 +1090,41 @@ class MainWindow:
     
     def import_devices(self):
         """Import devices from a file."""
+        if self._still_loading():
+            return
+        
         file_path = filedialog.askopenfilename(
             title="Import Devices",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=[("Device files", "*.json *.jsonl *.ndjson *.csv *.swol"),
+                       ("JSON files", "*.json"), ("JSON Lines files", "*.jsonl *.ndjson"),
+                       ("CSV files", "*.csv"), ("Compact binary files", "*.swol"),
+                       ("All files", "*.*")]
         )
         
         if file_path and self.device_changed_callback:
             # Let the main app handle the actual import
             self.device_changed_callback(import_path=file_path)
     
+    def discover_devices(self, source: str, ask_path: bool = False):
+        """Add devices from a neighbour table or DHCP lease file."""
+        if self._still_loading():
+            return
+        
+        path = None
+        if ask_path:
+            default = DEFAULT_PATHS.get(source, '')
+            path = filedialog.askopenfilename(
+                title="Open Lease File",
+                initialdir=os.path.dirname(default) if os.path.isdir(os.path.dirname(default)) else None,
+                filetypes=[("Lease files", "*.leases"), ("All files", "*.*")]
+            )
+            if not path:
+                return
+        
+        if self.device_changed_callback:
+            # Let the main app read the source and merge the results
+            self.device_changed_callback(discover=(source, path))
+    
     def check_for_updates(self):
         """Check for application updates (placeholder functionality)."""
         from .. import __version__
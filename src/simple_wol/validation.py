@@ -0,0 +1,268 @@
+"""
+Validation and normalization of device fields.
+
+Single values are checked with the validate_* and parse_* functions;
+whole columns (an import file, a pasted list) go through validate_macs(),
+validate_ips() and validate_ports(), which check every value in one pass
+and report each bad row instead of stopping at the first.
+"""
+
+import re
+import socket
+import sys
+from typing import Iterable, List, NamedTuple, Optional, Tuple, Union
+
+# AA:BB:CC:DD:EE:FF or AA-BB-CC-DD-EE-FF (one separator throughout),
+# AABB.CCDD.EEFF, or AABBCCDDEEFF
+_MAC_PATTERN = re.compile(
+    r'[0-9A-Fa-f]{2}([:-])(?:[0-9A-Fa-f]{2}\1){4}[0-9A-Fa-f]{2}'
+    r'|[0-9A-Fa-f]{4}\.[0-9A-Fa-f]{4}\.[0-9A-Fa-f]{4}'
+    r'|[0-9A-Fa-f]{12}'
+)
+_MAC_SEPARATORS = str.maketrans('', '', ':-.')
+
+# RFC 1123 host name labels; the last label may not be all digits, so
+# shorthand IPv4 forms such as "1.2.3" are not taken for host names
+_HOST_LABEL = re.compile(r'[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?')
+_NUMERIC_LABEL = re.compile(r'[0-9]+')
+
+# Tags given as one string are separated by commas or semicolons
+_TAG_SEPARATORS = re.compile(r'[,;]')
+
+
+class ValidationError(NamedTuple):
+    """A value that failed validation."""
+    row: int       # index of the value in the validated column
+    field: str     # 'mac_address', 'ip_address' or 'port'
+    value: object
+    message: str
+
+
+class ColumnResult(NamedTuple):
+    """Normalized values of a column, None where the value was invalid."""
+    values: List
+    errors: List[ValidationError]
+
+
+def mac_to_bytes(mac_address: str) -> bytes:
+    """
+    Convert a MAC address string to its 6 raw bytes.
+
+    Accepts AA:BB:CC:DD:EE:FF, AA-BB-CC-DD-EE-FF, AABB.CCDD.EEFF and
+    AABBCCDDEEFF forms.
+
+    Args:
+        mac_address: MAC address to convert
+
+    Returns:
+        The 6-byte MAC address
+
+    Raises:
+        ValueError: If the MAC address is malformed
+    """
+    if not isinstance(mac_address, str) or not _MAC_PATTERN.fullmatch(mac_address):
+        raise ValueError(f"Incorrect MAC address format: {mac_address!r}")
+    return bytes.fromhex(mac_address.translate(_MAC_SEPARATORS))
+
+
+if sys.version_info >= (3, 8):
+    def format_mac(mac_bytes: bytes) -> str:
+        """Format 6 raw MAC bytes as AA:BB:CC:DD:EE:FF."""
+        return mac_bytes.hex(':').upper()
+else:
+    _HEX = ['%02X' % value for value in range(256)]
+
+    def format_mac(mac_bytes: bytes) -> str:
+        """Format 6 raw MAC bytes as AA:BB:CC:DD:EE:FF."""
+        return ':'.join(map(_HEX.__getitem__, mac_bytes))
+
+
+def normalize_mac(mac_address: str) -> str:
+    """
+    Bring a MAC address into AA:BB:CC:DD:EE:FF form.
+
+    Raises:
+        ValueError: If the MAC address is malformed
+    """
+    return format_mac(mac_to_bytes(mac_address))
+
+
+def validate_mac_address(mac_address: str) -> bool:
+    """Check whether a MAC address is in one of the accepted forms."""
+    return isinstance(mac_address, str) and _MAC_PATTERN.fullmatch(mac_address) is not None
+
+
+def pack_ip(ip_address: str) -> bytes:
+    """
+    Convert an IPv4 or IPv6 address to its 4 or 16 raw bytes.
+
+    IPv4 addresses must be dotted quads ("1" or "1.2.3" are rejected).
+
+    Raises:
+        ValueError: If the address is not a valid IP address
+    """
+    if isinstance(ip_address, str):
+        try:
+            return socket.inet_pton(socket.AF_INET, ip_address)
+        except OSError:
+            pass
+        try:
+            return socket.inet_pton(socket.AF_INET6, ip_address)
+        except OSError:
+            pass
+    raise ValueError(f"Invalid IP address: {ip_address!r}")
+
+
+def format_ip(packed: bytes) -> str:
+    """Format 4 or 16 raw bytes as an IPv4 or (compressed) IPv6 address."""
+    return socket.inet_ntop(socket.AF_INET if len(packed) == 4 else socket.AF_INET6, packed)
+
+
+def normalize_ip(ip_address: str) -> str:
+    """
+    Check an IPv4 or IPv6 address and bring it into its canonical form.
+
+    IPv4 addresses must be dotted quads ("1" or "1.2.3" are rejected);
+    IPv6 addresses are compressed and lower-cased.
+
+    Raises:
+        ValueError: If the address is not a valid IP address
+    """
+    return format_ip(pack_ip(ip_address))
+
+
+def validate_ip_address(ip_address: str) -> bool:
+    """Check whether a string is a valid IPv4 or IPv6 address."""
+    try:
+        normalize_ip(ip_address)
+        return True
+    except ValueError:
+        return False
+
+
+def validate_host_name(host_name: str) -> bool:
+    """Check whether a string is a valid DNS host name, such as nas.local."""
+    if not isinstance(host_name, str):
+        return False
+    name = host_name[:-1] if host_name.endswith('.') else host_name
+    if not name or len(name) > 253:
+        return False
+    labels = name.split('.')
+    return (all(_HOST_LABEL.fullmatch(label) for label in labels)
+            and not _NUMERIC_LABEL.fullmatch(labels[-1]))
+
+
+def parse_port(port) -> int:
+    """
+    Check a UDP port number given as an int or a string.
+
+    Raises:
+        ValueError: If the port is not a number between 0 and 65535
+    """
+    try:
+        value = int(port)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid port: {port!r}")
+    if isinstance(port, float) and port != value or not 0 <= value <= 65535:
+        raise ValueError(f"Invalid port: {port!r}")
+    return value
+
+
+def normalize_tags(tags: Union[str, Iterable[str], None]) -> Tuple[str, ...]:
+    """
+    Clean up a device's tags.
+
+    Args:
+        tags: Tags as an iterable, or as one string separated by commas or
+            semicolons; None means no tags
+
+    Returns:
+        The distinct non-empty tags, stripped and sorted
+    """
+    if not tags:
+        return ()
+    if isinstance(tags, str):
+        tags = _TAG_SEPARATORS.split(tags)
+    return tuple(sorted({str(tag).strip() for tag in tags} - {''}))
+
+
+def validate_macs(values: Iterable[str]) -> ColumnResult:
+    """
+    Validate and normalize a column of MAC addresses.
+
+    Args:
+        values: MAC addresses
+
+    Returns:
+        The addresses in AA:BB:CC:DD:EE:FF form, and an error for each invalid one
+    """
+    match = _MAC_PATTERN.fullmatch
+    separators = _MAC_SEPARATORS
+    normalized: List[Optional[str]] = []
+    errors: List[ValidationError] = []
+    for row, value in enumerate(values):
+        if isinstance(value, str) and match(value):
+            digits = value.translate(separators).upper()
+            normalized.append(':'.join((digits[0:2], digits[2:4], digits[4:6],
+                                        digits[6:8], digits[8:10], digits[10:12])))
+        else:
+            normalized.append(None)
+            errors.append(ValidationError(row, 'mac_address', value,
+                                          f"Invalid MAC address: {value!r}"))
+    return ColumnResult(normalized, errors)
+
+
+def validate_ips(values: Iterable[str], allow_empty: bool = True,
+                 allow_host_names: bool = False) -> ColumnResult:
+    """
+    Validate and normalize a column of IP addresses.
+
+    Args:
+        values: IPv4 or IPv6 addresses
+        allow_empty: Accept empty values (devices woken by broadcast)
+        allow_host_names: Accept DNS host names, which are kept as given
+
+    Returns:
+        The canonical addresses, and an error for each invalid one
+    """
+    normalized: List[Optional[str]] = []
+    errors: List[ValidationError] = []
+    for row, value in enumerate(values):
+        if allow_empty and not value:
+            normalized.append('')
+            continue
+        try:
+            normalized.append(normalize_ip(value))
+        except ValueError as e:
+            if allow_host_names and validate_host_name(value):
+                normalized.append(value)
+                continue
+            normalized.append(None)
+            message = f"Invalid IP address or host name: {value!r}" if allow_host_names else str(e)
+            errors.append(ValidationError(row, 'ip_address', value, message))
+    return ColumnResult(normalized, errors)
+
+
+def validate_ports(values: Iterable, default: int = 9) -> ColumnResult:
+    """
+    Validate a column of port numbers.
+
+    Args:
+        values: Ports as ints or strings; empty values and None take the default
+        default: Port used for empty values
+
+    Returns:
+        The ports as ints, and an error for each invalid one
+    """
+    normalized: List[Optional[int]] = []
+    errors: List[ValidationError] = []
+    for row, value in enumerate(values):
+        if value is None or value == '':
+            normalized.append(default)
+            continue
+        try:
+            normalized.append(parse_port(value))
+        except ValueError as e:
+            normalized.append(None)
+            errors.append(ValidationError(row, 'port', value, str(e)))
+    return ColumnResult(normalized, errors)
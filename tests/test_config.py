@@ -0,0 +1,651 @@
+"""
+Tests for device configuration storage.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import stat
+import sys
+import tempfile
+import threading
+import unittest
+import zlib
+from unittest import mock
+
+# Add src to path for testing
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from simple_wol.config import ConfigManager
+from simple_wol.config.backends import JsonBackend
+from simple_wol.config.binary_format import (FLAG_ZLIB, HEADER, MAGIC, SIZES, VERSION,
+                                             dumps_devices, loads_devices)
+from simple_wol.config.importer import StreamingImporter
+from simple_wol.config.merge import (KEEP_EXISTING, NEWEST, TAKE_INCOMING, apply_diff,
+                                     diff_devices, ingest_neighbors, mac_key, merge_devices)
+from simple_wol.config.journal import add_record, delete_record, sort_record, update_record
+from simple_wol.config.sqlite_backend import SQLiteBackend
+from simple_wol.config.writer import SaveCoalescer, atomic_write
+from simple_wol.device import Device
+from simple_wol.network.discovery import Neighbor
+
+
+def make_devices(count):
+    return [Device(f'device-{i}', f'AA:BB:CC:DD:{i // 256:02X}:{i % 256:02X}',
+                   f'192.168.1.{i % 250 + 1}') for i in range(count)]
+
+
+class ConfigTestCase(unittest.TestCase):
+    """Base class providing a temporary config file path."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'devices.json')
+
+    def manager(self, **kwargs):
+        return ConfigManager(self.path, **kwargs)
+
+    def as_dicts(self, devices):
+        return [device.to_dict() for device in devices]
+
+
+class TestJournal(ConfigTestCase):
+    """Tests for journaled saves."""
+
+    def test_changes_are_appended_not_rewritten(self):
+        manager = self.manager()
+        devices = make_devices(3)
+        manager.save_devices(devices)
+        snapshot = os.stat(self.path).st_mtime_ns
+
+        added = Device('new', 'AA:BB:CC:DD:EE:FF')
+        devices.append(added)
+        manager.record_change(add_record(added), devices)
+        devices[0] = Device('renamed', devices[0].mac_address)
+        manager.record_change(update_record(0, devices[0]), devices)
+        del devices[1]
+        manager.record_change(delete_record(1), devices)
+        devices.sort(key=lambda device: device.name.lower(), reverse=True)
+        manager.record_change(sort_record('name', True), devices)
+
+        self.assertEqual(os.stat(self.path).st_mtime_ns, snapshot)
+        self.assertEqual(self.as_dicts(self.manager().load_devices()), self.as_dicts(devices))
+
+    def test_compaction(self):
+        manager = self.manager(compact_after=3)
+        devices = []
+        for device in make_devices(5):
+            devices.append(device)
+            manager.record_change(add_record(device), devices)
+
+        with open(self.path) as f:
+            self.assertGreaterEqual(len(json.load(f)), 3)
+        self.assertEqual(self.as_dicts(self.manager().load_devices()), self.as_dicts(devices))
+
+    def test_external_edit_makes_journal_stale(self):
+        manager = self.manager()
+        devices = make_devices(2)
+        manager.save_devices(devices)
+        manager.record_change(delete_record(0), devices[1:])
+
+        with open(self.path, 'w') as f:
+            json.dump([Device('external', 'AA:BB:CC:DD:EE:FF').to_dict()], f)
+
+        loaded = self.manager().load_devices()
+        self.assertEqual([device.name for device in loaded], ['external'])
+
+    def test_torn_journal_line_is_recovered(self):
+        manager = self.manager()
+        devices = make_devices(1)
+        manager.save_devices(devices)
+        added = Device('new', 'AA:BB:CC:DD:EE:FF')
+        manager.record_change(add_record(added), devices + [added])
+        manager.backend.journal.close()
+        with open(manager.backend.journal.path, 'a') as f:
+            f.write('{"op": "add", "dev')
+
+        loaded = self.manager().load_devices()
+        self.assertEqual([device.name for device in loaded], ['device-0', 'new'])
+        self.assertEqual(len(self.manager().load_devices()), 2)
+
+
+class TestBackgroundSaves(ConfigTestCase):
+    """Tests for atomic writes and debounced background saves."""
+
+    def test_atomic_write_leaves_no_temp_files(self):
+        atomic_write(self.path, '[]')
+        atomic_write(self.path, '[1]')
+        self.assertEqual(os.listdir(self.tmpdir), ['devices.json'])
+        with open(self.path) as f:
+            self.assertEqual(f.read(), '[1]')
+
+    @unittest.skipIf(sys.platform == 'win32', 'POSIX permissions only')
+    def test_atomic_write_keeps_permissions(self):
+        atomic_write(self.path, '[]')
+        umask = os.umask(0)
+        os.umask(umask)
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o666 & ~umask)
+
+        os.chmod(self.path, 0o640)
+        atomic_write(self.path, '[1]')
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o640)
+
+    def test_bursts_are_coalesced(self):
+        flushes = []
+        flushed = threading.Event()
+
+        def flush():
+            flushes.append(1)
+            flushed.set()
+
+        coalescer = SaveCoalescer(flush, interval=0.2)
+        coalescer.mark_dirty()
+        self.assertTrue(flushed.wait(2))
+        for _ in range(100):
+            coalescer.mark_dirty()
+        coalescer.close()
+        self.assertEqual(len(flushes), 2)
+
+    def test_scheduled_changes_are_saved(self):
+        manager = self.manager(save_interval=0.05)
+        devices = []
+        for device in make_devices(50):
+            devices.append(device)
+            manager.schedule_change(add_record(device), devices)
+        manager.close()
+
+        self.assertEqual(self.as_dicts(self.manager().load_devices()), self.as_dicts(devices))
+
+    def test_scheduled_changes_without_a_device_list(self):
+        devices = make_devices(5)
+        manager = self.manager(save_interval=60)
+        manager.save_devices(devices)
+        edited = Device('edited', 'AA:BB:CC:DD:EE:01')
+        added = Device('added', 'AA:BB:CC:DD:EE:02')
+        manager.schedule_change(update_record(1, edited))
+        manager.schedule_change(delete_record(3))
+        manager.schedule_change(add_record(added))
+        manager.close()
+
+        expected = [devices[0], edited, devices[2], devices[4], added]
+        self.assertEqual(self.as_dicts(self.manager().load_devices()), self.as_dicts(expected))
+
+
+class TestLoadCache(ConfigTestCase):
+    """Tests for the binary snapshot cache."""
+
+    def test_cache_is_used_when_fresh(self):
+        devices = make_devices(10)
+        devices[0].retry = {'count': 3}
+        self.manager().save_devices(devices)
+        self.assertTrue(os.path.exists(self.path + '.cache'))
+
+        with mock.patch.object(Device, 'from_dict', side_effect=AssertionError):
+            loaded = self.manager().load_devices()
+        self.assertEqual(self.as_dicts(loaded), self.as_dicts(devices))
+
+    def test_stale_cache_is_rebuilt(self):
+        self.manager().save_devices(make_devices(2))
+        stat = os.stat(self.path)
+        with open(self.path) as f:
+            text = f.read()
+        # Same size and modification time, different contents
+        with open(self.path, 'w') as f:
+            f.write(text.replace('device-0', 'device-X'))
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        loaded = self.manager().load_devices()
+        self.assertEqual(loaded[0].name, 'device-X')
+        with mock.patch.object(Device, 'from_dict', side_effect=AssertionError):
+            self.assertEqual(self.manager().load_devices()[0].name, 'device-X')
+
+    @unittest.skipIf(sys.platform == 'win32', 'POSIX permissions only')
+    def test_cache_others_can_write_is_ignored(self):
+        self.manager().save_devices(make_devices(2))
+        cache = self.path + '.cache'
+        self.assertEqual(os.stat(cache).st_mode & 0o777, 0o600)
+
+        os.chmod(cache, 0o666)
+        with mock.patch('marshal.loads') as loads:
+            self.assertEqual(len(self.manager().load_devices()), 2)
+        loads.assert_not_called()
+
+
+class TestWatcher(ConfigTestCase):
+    """Tests for picking up changes made by other programs."""
+
+    def write_external(self, devices):
+        with open(self.path, 'w') as f:
+            json.dump(self.as_dicts(devices), f)
+
+    def check_reported(self, use_inotify):
+        devices = make_devices(3)
+        manager = self.manager()
+        manager.save_devices(devices)
+        manager.load_devices()
+        diffs = []
+        changed = threading.Event()
+
+        def on_change(diff):
+            diffs.append(diff)
+            changed.set()
+
+        manager.watch(on_change, interval=0.05, use_inotify=use_inotify)
+        self.addCleanup(manager.close)
+        self.assertEqual(manager.watcher.mode, 'inotify' if use_inotify else 'poll')
+        # The app's own saves are not reported
+        manager.save_devices(devices)
+        self.assertFalse(changed.wait(0.5))
+
+        external = [Device('renamed', devices[0].mac_address), devices[2],
+                    Device('new', 'AA:BB:CC:DD:EE:FF')]
+        self.write_external(external)
+        self.assertTrue(changed.wait(5))
+        diff = diffs[0]
+        self.assertEqual([device.name for device in diff.added], ['new'])
+        self.assertEqual([(key, device.name) for key, device in diff.updated],
+                         [((mac_key(devices[0].mac_address), 0), 'renamed')])
+        self.assertEqual(diff.removed, [('AABBCCDD0001', 0)])
+
+    def test_polling(self):
+        self.check_reported(use_inotify=False)
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'inotify is Linux only')
+    def test_inotify(self):
+        self.check_reported(use_inotify=True)
+
+    def test_pending_saves_keep_external_changes(self):
+        devices = make_devices(2)
+        manager = self.manager(save_interval=60)
+        manager.save_devices(devices)
+        manager.watch(lambda diff: None, use_inotify=False)
+
+        self.write_external([devices[0], Device('external', 'AA:BB:CC:DD:EE:02')])
+        added = Device('local', 'AA:BB:CC:DD:EE:01')
+        devices.append(added)
+        manager.schedule_change(add_record(added), devices)
+        manager.close()
+
+        self.assertEqual([device.name for device in self.manager().load_devices()],
+                         ['device-0', 'local', 'external'])
+
+    def test_external_removal_of_a_shared_mac_removes_one_device(self):
+        devices = [Device('vm-a', 'AA:BB:CC:DD:EE:01'), Device('vm-b', 'AA:BB:CC:DD:EE:01')]
+        manager = self.manager(save_interval=60)
+        manager.save_devices(devices)
+        diffs = []
+        manager.watch(diffs.append, use_inotify=False)
+
+        self.write_external([devices[0]])
+        manager.schedule_change(add_record(Device('local', 'AA:BB:CC:DD:EE:02')))
+        manager.close()
+
+        self.assertEqual(diffs[0].removed, [('AABBCCDDEE01', 1)])
+        self.assertEqual([device.name for device in self.manager().load_devices()],
+                         ['vm-a', 'local'])
+
+    def test_pending_changes_without_a_device_list_keep_external_changes(self):
+        devices = make_devices(2)
+        manager = self.manager(save_interval=60)
+        manager.save_devices(devices)
+        manager.watch(lambda diff: None, use_inotify=False)
+
+        self.write_external([devices[0], Device('external', 'AA:BB:CC:DD:EE:02')])
+        manager.schedule_change(add_record(Device('local', 'AA:BB:CC:DD:EE:01')))
+        manager.close()
+
+        self.assertEqual([device.name for device in self.manager().load_devices()],
+                         ['device-0', 'local', 'external'])
+
+
+class TestSQLiteBackend(ConfigTestCase):
+    """Tests for the SQLite storage backend."""
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.tmpdir, 'devices.db')
+
+    def tagged(self, backend, tag):
+        rows = backend.connection.execute(
+            "SELECT name FROM devices JOIN device_tags ON device_id = id WHERE tag = ? "
+            "ORDER BY position", (tag,))
+        return [name for name, in rows]
+
+    def test_backend_is_chosen_by_extension(self):
+        self.assertIsInstance(self.manager().backend, SQLiteBackend)
+        self.assertIsInstance(ConfigManager(os.path.join(self.tmpdir, 'devices.json')).backend,
+                              JsonBackend)
+
+    def test_changes_round_trip(self):
+        manager = self.manager()
+        devices = make_devices(3)
+        devices[2].retry = {'count': 5}
+        manager.save_devices(devices)
+
+        added = Device('new', 'AA:BB:CC:DD:EE:FF')
+        devices.append(added)
+        manager.record_change(add_record(added), devices)
+        devices[0] = Device('renamed', devices[0].mac_address, '10.0.0.1')
+        manager.record_change(update_record(0, devices[0]), devices)
+        del devices[1]
+        manager.record_change(delete_record(1), devices)
+        devices.sort(key=lambda device: device.name.lower(), reverse=True)
+        manager.record_change(sort_record('name', True), devices)
+        manager.close()
+
+        self.assertEqual(self.as_dicts(self.manager().load_devices()), self.as_dicts(devices))
+
+    def test_groups_and_tags(self):
+        manager = self.manager()
+        devices = make_devices(4)
+        devices[0] = Device('agent-1', devices[0].mac_address, group='Rack A', tags=['build', 'linux'])
+        devices[1] = Device('agent-2', devices[1].mac_address, group='rack a', tags='build; win')
+        manager.save_devices(devices)
+        backend = manager.backend
+
+        self.assertEqual(self.tagged(backend, 'Build'), ['agent-1', 'agent-2'])
+
+        edited = Device('agent-1', devices[0].mac_address, group='Rack B', tags=['linux'])
+        devices[0] = edited
+        manager.record_change(update_record(0, edited), devices)
+        self.assertEqual(self.tagged(backend, 'build'), ['agent-2'])
+        manager.close()
+
+        self.assertEqual(self.as_dicts(self.manager().load_devices()), self.as_dicts(devices))
+
+    def test_old_database_is_upgraded(self):
+        connection = sqlite3.connect(self.path)
+        connection.executescript("""
+            CREATE TABLE devices (id INTEGER PRIMARY KEY, position INTEGER NOT NULL,
+                name TEXT NOT NULL, mac_address TEXT NOT NULL UNIQUE,
+                ip_address TEXT NOT NULL DEFAULT '', port INTEGER NOT NULL DEFAULT 9, extra TEXT);
+            INSERT INTO devices (position, name, mac_address) VALUES (0, 'old', 'AA:BB:CC:DD:EE:FF');
+        """)
+        connection.close()
+
+        manager = self.manager()
+        self.assertEqual([device.name for device in manager.load_devices()], ['old'])
+        manager.save_devices([Device('old', 'AA:BB:CC:DD:EE:FF', group='lab', tags=['x']),
+                              Device('twin', 'AA:BB:CC:DD:EE:FF')])
+        self.assertEqual(self.tagged(manager.backend, 'x'), ['old'])
+        manager.close()
+        self.assertEqual([(device.name, device.group) for device in self.manager().load_devices()],
+                         [('old', 'lab'), ('twin', '')])
+
+    def test_shared_mac_addresses_are_kept(self):
+        manager = self.manager()
+        devices = [Device('a', 'AA:BB:CC:DD:EE:FF', tags=['x']),
+                   Device('b', 'aa-bb-cc-dd-ee-ff', '10.0.0.2', tags=['y'])]
+        manager.save_devices(devices)
+
+        devices[1] = Device('b2', 'AA:BB:CC:DD:EE:FF', '10.0.0.3')
+        manager.record_change(update_record(1, devices[1]), devices)
+        devices.sort(key=lambda device: device.name, reverse=True)
+        manager.record_change(sort_record('name', True), devices)
+        self.assertEqual(self.as_dicts(manager.load_devices()), self.as_dicts(devices))
+        self.assertEqual(self.tagged(manager.backend, 'x'), ['a'])
+        manager.close()
+
+    def test_sort_and_later_changes_share_one_transaction(self):
+        manager = self.manager()
+        devices = make_devices(5)
+        manager.save_devices(devices)
+        backend = manager.backend
+
+        devices.sort(key=lambda device: device.name, reverse=True)
+        records = [sort_record('name', True)]
+        devices[0] = Device('renamed', devices[0].mac_address)
+        records.append(update_record(0, devices[0]))
+        del devices[3]
+        records.append(delete_record(3))
+        with mock.patch.object(backend, 'save_devices') as save:
+            backend.record_changes(records, devices)
+        save.assert_not_called()
+
+        self.assertEqual(self.as_dicts(backend.load_devices()), self.as_dicts(devices))
+
+        # A failing record rolls back the sort along with it
+        records = [sort_record('name', False), delete_record(99)]
+        self.assertRaises(Exception, backend.record_changes, records, devices)
+        self.assertEqual(self.as_dicts(backend.load_devices()), self.as_dicts(devices))
+        manager.close()
+
+    def test_pages(self):
+        manager = self.manager()
+        devices = make_devices(25)
+        manager.save_devices(devices)
+        devices.sort(key=lambda device: device.name, reverse=True)
+        manager.record_change(sort_record('name', True), devices)
+
+        pages = list(manager.iter_device_pages(10))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(self.as_dicts(sum(pages, [])), self.as_dicts(devices))
+        self.assertFalse(manager.check_external_change())
+        manager.close()
+
+
+class TestStreamingImport(ConfigTestCase):
+    """Tests for incremental imports."""
+
+    def write(self, name, text):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def test_json_array_is_read_in_chunks(self):
+        devices = make_devices(3000)
+        path = self.write('export.json', json.dumps(self.as_dicts(devices), indent=2))
+        progress = []
+
+        result = StreamingImporter(path, progress_every=500).run(progress.append)
+
+        self.assertEqual(self.as_dicts(result.devices), self.as_dicts(devices))
+        self.assertEqual([p.imported for p in progress], [500 * i for i in range(1, 7)] + [3000])
+        self.assertLess(progress[0].bytes_read, progress[0].total_bytes)
+        self.assertEqual(progress[-1].fraction, 1.0)
+
+    def test_invalid_records_are_skipped(self):
+        lines = [json.dumps(device.to_dict()) for device in make_devices(3)]
+        lines.insert(1, json.dumps({'name': 'bad', 'mac_address': 'not-a-mac'}))
+        lines.insert(3, json.dumps({'name': 'port', 'mac_address': 'AA:BB:CC:DD:EE:FF',
+                                    'port': 70000}))
+        path = self.write('export.jsonl', '\n'.join(lines) + '\n')
+
+        result = StreamingImporter(path).run()
+
+        self.assertEqual([device.name for device in result.devices],
+                         ['device-0', 'device-1', 'device-2'])
+        self.assertEqual(result.skipped, 2)
+        self.assertEqual([number for number, _ in result.errors], [2, 4])
+
+    def test_host_names_are_kept(self):
+        path = self.write('export.json', json.dumps([
+            {'name': 'nas', 'mac_address': 'AA:BB:CC:DD:EE:FF', 'ip_address': 'nas.local'},
+            {'name': 'bad', 'mac_address': 'AA:BB:CC:DD:EE:01', 'ip_address': '1.2.3'},
+            {'name': 'worse', 'mac_address': 'AA:BB:CC:DD:EE:02', 'ip_address': 'a b'},
+        ]))
+
+        result = StreamingImporter(path).run()
+
+        self.assertEqual([(device.name, device.ip_address) for device in result.devices],
+                         [('nas', 'nas.local')])
+        self.assertEqual(result.skipped, 2)
+
+    def test_malformed_json_element_fails_early(self):
+        good = json.dumps(make_devices(1)[0].to_dict())
+        path = self.write('export.json', '[' + good + ', {"name": "x", oops},'
+                          + ', '.join([good] * 20000) + ']')
+
+        importer = StreamingImporter(path)
+        with self.assertRaises(ValueError):
+            with mock.patch('simple_wol.config.importer.MAX_RECORD_SIZE', 64 * 1024):
+                importer.run()
+        self.assertLess(importer._bytes_read, os.path.getsize(path))
+
+    def test_csv(self):
+        path = self.write('export.csv', 'Device Name,MAC Address,IP Address,Port,Group,Tags\n'
+                                        'nas,aa-bb-cc-dd-ee-ff,192.168.1.5,7,Basement,"storage, linux"\n'
+                                        '"desk, upstairs",AA:BB:CC:DD:EE:01,,,,\n')
+
+        devices = self.manager().import_devices(path)
+
+        self.assertEqual([(device.name, device.mac_address, device.ip_address, device.port,
+                           device.group, device.tags) for device in devices],
+                         [('nas', 'AA:BB:CC:DD:EE:FF', '192.168.1.5', 7, 'Basement',
+                           ('linux', 'storage')),
+                          ('desk, upstairs', 'AA:BB:CC:DD:EE:01', '', 9, '', ())])
+
+    def test_binary_round_trip(self):
+        devices = make_devices(300)
+        devices[0].ip_address = 'fe80::1'
+        devices[1].ip_address = 'nas.local'
+        devices[2].retry = {'count': 4}
+        devices[6].group = 'lab'
+        devices[6].tags = ['build', 'linux']
+        devices[3].updated_at = 1700000000.5
+        devices[4].name = devices[5].name = 'shared name'
+        path = os.path.join(self.tmpdir, 'export.swol')
+
+        self.manager().export_devices(devices, path)
+        self.assertLess(os.path.getsize(path), len(json.dumps(self.as_dicts(devices))) / 4)
+        self.assertEqual(self.as_dicts(self.manager().import_devices(path)),
+                         self.as_dicts(devices))
+        self.assertEqual(self.as_dicts(loads_devices(dumps_devices(devices, compress=False))),
+                         self.as_dicts(devices))
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        with self.assertRaises(ValueError):
+            loads_devices(data[:-10])
+
+    def test_binary_files_are_not_trusted(self):
+        bomb = HEADER.pack(MAGIC, VERSION, FLAG_ZLIB, 1) + zlib.compress(b'\0' * (16 * 1024 * 1024))
+        with self.assertRaises(ValueError):
+            loads_devices(bomb)
+
+        def with_extras(extras):
+            data = dumps_devices([Device('a', 'AA:BB:CC:DD:EE:01')], compress=False)
+            extra = json.dumps(extras).encode()
+            sizes = SIZES.pack(1, len(extra))
+            return data[:HEADER.size] + sizes + data[HEADER.size + SIZES.size:] + extra
+
+        self.assertEqual(loads_devices(with_extras({'0': {'tags': 'build'}}))[0].tags, ('build',))
+        for extras in ({'0': {'group': 5}}, {'0': {'tags': [1]}}, {'0': 'x'}, []):
+            with self.assertRaises(ValueError):
+                loads_devices(with_extras(extras))
+
+        data = dumps_devices([Device('ok', 'AA:BB:CC:DD:EE:01'), Device('', 'AA:BB:CC:DD:EE:02'),
+                              Device('tv', 'AA:BB:CC:DD:EE:03', port=7)])
+        path = os.path.join(self.tmpdir, 'other-host.swol')
+        with open(path, 'wb') as f:
+            f.write(data)
+        result = StreamingImporter(path).run()
+        self.assertEqual([device.name for device in result.devices], ['ok', 'tv'])
+        self.assertEqual(result.skipped, 1)
+
+    def test_binary_export_keeps_bad_macs_and_rejects_bad_fields(self):
+        devices = [Device('ok', 'AA:BB:CC:DD:EE:01'), Device('typo', 'AA:BB:CC:DD:EE')]
+        self.assertEqual(self.as_dicts(loads_devices(dumps_devices(devices))),
+                         self.as_dicts(devices))
+
+        bad_port = Device('a', 'AA:BB:CC:DD:EE:01')
+        bad_port.port = 70000
+        bad_time = Device('b', 'AA:BB:CC:DD:EE:02')
+        bad_time.updated_at = 'yesterday'
+        for device in (bad_port, bad_time):
+            with self.assertRaises(ValueError):
+                dumps_devices([device])
+
+    def test_trailing_comma_in_json_array_fails(self):
+        good = json.dumps(make_devices(1)[0].to_dict())
+        path = self.write('export.json', f'[{good},\n]')
+        with self.assertRaises(ValueError):
+            StreamingImporter(path).run()
+        path = self.write('empty.json', '[ ]')
+        self.assertEqual(StreamingImporter(path).run().devices, [])
+
+    def test_truncated_json_array_fails(self):
+        path = self.write('export.json', json.dumps(self.as_dicts(make_devices(2)))[:-20])
+        with self.assertRaises(Exception):
+            self.manager().import_devices(path)
+
+
+class TestMerge(unittest.TestCase):
+    """Tests for merge imports."""
+
+    def test_diff_removes_one_of_devices_sharing_a_mac(self):
+        old = [Device('vm-a', 'AA:BB:CC:DD:EE:01', '10.0.0.1'),
+               Device('other', 'AA:BB:CC:DD:EE:02'),
+               Device('vm-b', 'AA:BB:CC:DD:EE:01', '10.0.0.2')]
+        new = [old[0], old[1]]
+        diff = diff_devices(old, new)
+        self.assertEqual((diff.added, diff.updated), ([], []))
+        self.assertEqual(diff.removed, [('AABBCCDDEE01', 1)])
+
+        devices = list(old)
+        apply_diff(devices, diff)
+        self.assertEqual([device.name for device in devices], ['vm-a', 'other'])
+
+    def test_diff_updates_one_of_devices_sharing_a_mac(self):
+        old = [Device('vm-a', 'AA:BB:CC:DD:EE:01'), Device('vm-b', 'AA:BB:CC:DD:EE:01')]
+        new = [old[0], Device('vm-b renamed', 'AA:BB:CC:DD:EE:01')]
+        diff = diff_devices(old, new)
+
+        devices = list(old)
+        apply_diff(devices, diff)
+        self.assertEqual([device.name for device in devices], ['vm-a', 'vm-b renamed'])
+
+    def setUp(self):
+        self.existing = [Device('nas', 'AA:BB:CC:DD:EE:01', updated_at=100),
+                         Device('desk', 'AA:BB:CC:DD:EE:02', updated_at=100),
+                         Device('tv', 'AA:BB:CC:DD:EE:03')]
+        self.incoming = [Device('nas', 'aa-bb-cc-dd-ee-01'),
+                         Device('desk (new)', 'AABB.CCDD.EE02', updated_at=200),
+                         Device('tv (old)', 'AA:BB:CC:DD:EE:03', updated_at=50),
+                         Device('laptop', 'AA:BB:CC:DD:EE:04')]
+
+    def names(self, devices):
+        return [device.name for device in devices]
+
+    def test_newest_wins(self):
+        merged, summary = merge_devices(self.existing, self.incoming, NEWEST)
+        self.assertEqual(self.names(merged), ['nas', 'desk (new)', 'tv (old)', 'laptop'])
+        self.assertEqual(summary, (1, 2, 1, 2, 0))
+        self.assertEqual(self.names(self.existing), ['nas', 'desk', 'tv'])
+
+    def test_keep_existing_and_take_incoming(self):
+        merged, summary = merge_devices(self.existing, self.incoming, KEEP_EXISTING)
+        self.assertEqual(self.names(merged), ['nas', 'desk', 'tv', 'laptop'])
+        self.assertEqual((summary.conflicts, summary.kept), (2, 2))
+
+        merged, summary = merge_devices(self.existing, self.incoming, TAKE_INCOMING)
+        self.assertEqual(self.names(merged), ['nas', 'desk (new)', 'tv (old)', 'laptop'])
+
+    def test_ingest_neighbors_is_incremental(self):
+        neighbors = [Neighbor('AA:BB:CC:DD:EE:01', '10.0.0.1', 'nas-host'),
+                     Neighbor('AA:BB:CC:DD:EE:05', '10.0.0.5', 'lab-05'),
+                     Neighbor('AA:BB:CC:DD:EE:05', '10.0.0.6'),
+                     Neighbor('AA:BB:CC:DD:EE:06', '10.0.0.7')]
+        merged, summary = ingest_neighbors(self.existing, neighbors)
+        self.assertEqual([(device.name, device.ip_address) for device in merged],
+                         [('nas', '10.0.0.1'), ('desk', ''), ('tv', ''),
+                          ('lab-05', '10.0.0.6'), ('10.0.0.7', '10.0.0.7')])
+        self.assertEqual((summary.added, summary.updated), (2, 1))
+
+        merged, summary = ingest_neighbors(merged, neighbors)
+        self.assertEqual(len(merged), 5)
+        self.assertEqual((summary.added, summary.updated, summary.unchanged), (0, 0, 3))
+
+    def test_large_merge(self):
+        existing = make_devices(50000)
+        incoming = make_devices(60000)[10000:]
+        merged, summary = merge_devices(existing, incoming)
+        self.assertEqual(len(merged), 60000)
+        self.assertEqual((summary.added, summary.unchanged), (10000, 40000))
+
+
+if __name__ == '__main__':
+    unittest.main()
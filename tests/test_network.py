@@ -0,0 +1,737 @@
+"""
+Tests for the Wake-on-LAN network layer.
+"""
+
+import asyncio
+import io
+import json
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import os
+import unittest
+from unittest import mock
+
+# Add src to path for testing
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from simple_wol.cli import wake_main
+from simple_wol.device import Device
+from simple_wol.network import WakeOnLanSender, WakeResult
+from simple_wol.network.async_engine import AsyncWakeEngine, BackgroundLoop
+from simple_wol.network.discovery import (parse_dhcpd_leases, parse_dnsmasq_leases,
+                                          parse_ip_neigh, parse_proc_arp)
+from simple_wol.network.mmsg import sendmmsg_available
+from simple_wol.network.planner import Destination, NetworkPlanner
+from simple_wol.network.probe import LivenessProber, wake_and_verify
+from simple_wol.network.relay import (DEFAULT_RELAY_PORT, KEY_ENV, REQUEST_MAX_AGE, STATUS_OK,
+                                      STATUS_UNAUTHORIZED, RelayServer, decode_request,
+                                      encode_request, parse_relay_address, relay_wake)
+from simple_wol.network.retry import RetryPolicy, RetryScheduler, TimerHandle, TimerQueue
+from simple_wol.network.scheduler import TokenBucket, WaveScheduler
+from simple_wol.network.worker import WakeWorker
+from simple_wol.network.packet import MagicPacketCache, build_magic_packet, mac_to_bytes
+
+
+class TestMagicPacket(unittest.TestCase):
+    """Tests for the native magic packet builder."""
+
+    def test_mac_formats(self):
+        expected = bytes.fromhex('AABBCCDDEEFF')
+        for mac in ('AA:BB:CC:DD:EE:FF', 'aa-bb-cc-dd-ee-ff', 'AABB.CCDD.EEFF', 'AABBCCDDEEFF'):
+            self.assertEqual(mac_to_bytes(mac), expected)
+
+    def test_invalid_mac(self):
+        for mac in ('', 'AA:BB:CC:DD:EE', 'AA:BB-CC:DD:EE:FF', 'GG:BB:CC:DD:EE:FF'):
+            with self.assertRaises(ValueError):
+                mac_to_bytes(mac)
+
+    def test_packet_layout(self):
+        packet = build_magic_packet(bytes.fromhex('001122334455'))
+        self.assertEqual(len(packet), 102)
+        self.assertEqual(packet, b'\xff' * 6 + bytes.fromhex('001122334455') * 16)
+
+    def test_cache_is_bounded_lru(self):
+        cache = MagicPacketCache(maxsize=2)
+        first = cache.get('00:00:00:00:00:01')
+        cache.get('00:00:00:00:00:02')
+        self.assertIs(cache.get('00:00:00:00:00:01'), first)
+        cache.get('00:00:00:00:00:03')
+        self.assertEqual(len(cache), 2)
+        self.assertIs(cache.get('00:00:00:00:00:01'), first)
+
+
+class UdpSinkTestCase(unittest.TestCase):
+    """Base class providing a local UDP socket to receive magic packets."""
+
+    def setUp(self):
+        self.sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sink.bind(('127.0.0.1', 0))
+        self.sink.settimeout(2)
+        self.port = self.sink.getsockname()[1]
+
+    def tearDown(self):
+        self.sink.close()
+
+    def receive(self, count):
+        return [self.sink.recv(1024) for _ in range(count)]
+
+
+class TestWakeMany(UdpSinkTestCase):
+    """Tests for WakeOnLanSender.wake_many."""
+
+    backend = 'portable'
+
+    def test_sends_one_packet_per_device(self):
+        devices = [
+            Device('a', 'AA:BB:CC:DD:EE:01', '127.0.0.1', self.port),
+            Device('b', 'AA-BB-CC-DD-EE-02', '127.0.0.1', self.port),
+        ]
+        results = WakeOnLanSender.wake_many(devices, backend=self.backend)
+
+        self.assertEqual([r.device for r in results], devices)
+        self.assertTrue(all(r.success for r in results))
+        packets = self.receive(2)
+        self.assertEqual(packets[0], b'\xff' * 6 + bytes.fromhex('AABBCCDDEE01') * 16)
+        self.assertEqual(packets[1], b'\xff' * 6 + bytes.fromhex('AABBCCDDEE02') * 16)
+
+    def test_invalid_mac_does_not_stop_batch(self):
+        devices = [
+            Device('bad', 'not-a-mac', '127.0.0.1', self.port),
+            Device('good', 'AA:BB:CC:DD:EE:03', '127.0.0.1', self.port),
+        ]
+        results = WakeOnLanSender.wake_many(devices, backend=self.backend)
+
+        self.assertFalse(results[0].success)
+        self.assertIsNotNone(results[0].error)
+        self.assertTrue(results[1].success)
+        self.assertEqual(len(self.receive(1)[0]), 102)
+
+
+
+@unittest.skipUnless(sendmmsg_available(), "sendmmsg() is not available")
+class TestWakeManySendmmsg(TestWakeMany):
+    """Runs the wake_many tests through the sendmmsg() backend."""
+
+    backend = 'sendmmsg'
+
+
+class TestWakeWorker(UdpSinkTestCase):
+    """Tests for the background wake worker."""
+
+    def test_results_arrive_on_queue(self):
+        worker = WakeWorker(chunk_size=2, backend='portable')
+        devices = [(i, Device(str(i), f'AA:BB:CC:DD:EE:{i:02X}', '127.0.0.1', self.port))
+                   for i in range(5)]
+        devices.append((99, Device('bad', 'not-a-mac', '127.0.0.1', self.port)))
+        try:
+            first = worker.submit(devices[:3])
+            second = worker.submit(devices[3:])
+            updates = [worker.results.get(timeout=5) for _ in range(len(devices))]
+        finally:
+            worker.stop(timeout=5)
+
+        self.assertEqual([update.key for update in updates], [0, 1, 2, 3, 4, 99])
+        self.assertEqual([update.batch for update in updates], [first] * 3 + [second] * 3)
+        self.assertEqual([update.result.success for update in updates], [True] * 5 + [False])
+        self.assertEqual(len(self.receive(5)), 5)
+        self.assertEqual(worker.drain(), [])
+
+    def test_batches_are_paced_in_waves(self):
+        waves = WaveScheduler(rate=1000, burst=2, wave_size=3, wave_delay=0.01)
+        worker = WakeWorker(backend='portable', waves=waves)
+        devices = [(i, Device(str(i), f'AA:BB:CC:DD:EE:{i:02X}', '127.0.0.1', self.port))
+                   for i in range(5)]
+        devices.append((99, Device('bad', 'not-a-mac', '127.0.0.1', self.port)))
+        try:
+            batch = worker.submit(devices)
+            updates = [worker.results.get(timeout=5) for _ in range(len(devices))]
+        finally:
+            worker.stop(timeout=5)
+
+        self.assertEqual([update.key for update in updates], [0, 1, 2, 3, 4, 99])
+        self.assertEqual({update.batch for update in updates}, {batch})
+        self.assertEqual([update.result.success for update in updates], [True] * 5 + [False])
+        self.assertEqual(len(self.receive(5)), 5)
+
+    def test_device_retry_policy_resends(self):
+        worker = WakeWorker(backend='portable')
+        self.addCleanup(worker.retries.timer.stop)
+        retried = Device('a', 'AA:BB:CC:DD:EE:01', '127.0.0.1', self.port,
+                         retry={'count': 2, 'interval': 0.01, 'jitter': 0})
+        try:
+            worker.submit([(0, retried), (1, Device('b', 'AA:BB:CC:DD:EE:02', '127.0.0.1',
+                                                   self.port))])
+            worker.results.get(timeout=5)
+            packets = self.receive(4)
+        finally:
+            worker.stop(timeout=5)
+
+        self.assertEqual(len(packets), 4)
+
+    def test_stop_is_bounded_and_drops_retries(self):
+        release = threading.Event()
+        worker = WakeWorker(backend='portable')
+        self.addCleanup(release.set)
+        device = Device('a', 'AA:BB:CC:DD:EE:01', '127.0.0.1', self.port,
+                        retry={'count': 1, 'interval': 60, 'jitter': 0})
+        worker.retries.schedule([device])
+        self.assertEqual(worker.retries.timer.pending(), 1)
+
+        def blocked_send(devices, **kwargs):
+            release.wait(5)
+            return []
+
+        with mock.patch.object(WakeOnLanSender, 'wake_many', side_effect=blocked_send):
+            worker.submit([(0, device)])
+            self.assertFalse(worker.stop(timeout=0.1))
+        self.assertEqual(worker.retries.timer.pending(), 0)
+
+
+class TestAsyncWakeEngine(UdpSinkTestCase):
+    """Tests for the asyncio wake engine."""
+
+    def test_wake_all(self):
+        devices = [Device(str(i), f'AA:BB:CC:DD:EE:{i:02X}', '127.0.0.1', self.port)
+                   for i in range(20)]
+
+        async def run():
+            async with AsyncWakeEngine(concurrency=4) as engine:
+                return await engine.wake_all(devices)
+
+        results = asyncio.run(run())
+
+        self.assertTrue(all(r.success for r in results))
+        self.assertEqual(len(self.receive(20)), 20)
+
+    def test_background_loop(self):
+        loop = BackgroundLoop()
+        engine = AsyncWakeEngine()
+        try:
+            result = loop.submit(engine.wake(
+                Device('a', 'AA:BB:CC:DD:EE:FF', '127.0.0.1', self.port))).result(5)
+            loop.submit(engine.close()).result(5)
+        finally:
+            loop.stop()
+
+        self.assertTrue(result.success)
+        self.assertEqual(len(self.receive(1)[0]), 102)
+
+
+
+class TestWakeAndVerify(UdpSinkTestCase):
+    """Tests for liveness probing and wake-and-verify."""
+
+    def test_tcp_probe(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        self.addCleanup(listener.close)
+        prober = LivenessProber(port=listener.getsockname()[1], timeout=1)
+
+        up = asyncio.run(prober.probe_all([Device('up', 'AA:BB:CC:DD:EE:FF', '127.0.0.1'),
+                                           Device('no ip', 'AA:BB:CC:DD:EE:FF')]))
+
+        self.assertEqual(up, [True, False])
+
+    def test_resends_only_to_devices_still_down(self):
+        class FakeProber(LivenessProber):
+            calls = {}
+
+            async def probe(self, device):
+                self.calls[device.name] = self.calls.get(device.name, 0) + 1
+                return device.name == 'fast' or self.calls[device.name] >= 3
+
+        devices = [Device('fast', 'AA:BB:CC:DD:EE:01', '127.0.0.1', self.port),
+                   Device('slow', 'AA:BB:CC:DD:EE:02', '127.0.0.1', self.port)]
+        results = asyncio.run(wake_and_verify(devices, FakeProber(), interval=0.01, backoff=1))
+
+        self.assertTrue(all(r.awake for r in results))
+        self.assertEqual(results[0].packets_sent, 1)
+        self.assertEqual(results[1].packets_sent, 3)
+        self.assertLessEqual(results[0].time_to_wake, results[1].time_to_wake)
+        self.assertEqual(len(self.receive(4)), 4)
+
+    def test_time_to_wake_is_taken_per_device(self):
+        class FakeProber(LivenessProber):
+            async def probe(self, device):
+                if device.name == 'slow':
+                    await asyncio.sleep(0.3)
+                return True
+
+        devices = [Device('fast', 'AA:BB:CC:DD:EE:01', '127.0.0.1', self.port),
+                   Device('slow', 'AA:BB:CC:DD:EE:02', '127.0.0.1', self.port)]
+        results = asyncio.run(wake_and_verify(devices, FakeProber(), interval=0.01))
+
+        # Both answer in the same round, but the fast one is not charged for the slow probe
+        self.assertGreaterEqual(results[1].time_to_wake - results[0].time_to_wake, 0.2)
+
+
+class TestRelay(UdpSinkTestCase):
+    """Tests for the wake relay agent."""
+
+    def test_request_signing(self):
+        macs = [bytes.fromhex('AABBCCDDEEFF'), bytes.fromhex('001122334455')]
+        data = encode_request(macs, 7, key=b'secret', timestamp=1000, nonce=b'12345678')
+        request = decode_request(data, key=b'secret', now=1010)
+        self.assertEqual((request.port, request.macs, request.nonce), (7, macs, b'12345678'))
+        with self.assertRaises(PermissionError):
+            decode_request(data, key=b'wrong', now=1010)
+        with self.assertRaises(PermissionError):
+            decode_request(data[:-1], key=b'secret', now=1010)
+        with self.assertRaises(PermissionError):
+            decode_request(data, key=b'secret', now=1000 + REQUEST_MAX_AGE + 1)
+        with self.assertRaises(ValueError):
+            encode_request(macs, 7, key=b'')
+        with self.assertRaises(ValueError):
+            encode_request(macs, 70000, key=b'secret')
+        with self.assertRaises(ValueError):
+            encode_request(macs, 7, key=b'secret', timestamp=-1)
+
+    def test_relay_address(self):
+        self.assertEqual(parse_relay_address('relay.lan'), ('relay.lan', DEFAULT_RELAY_PORT))
+        self.assertEqual(parse_relay_address('10.0.0.2:9010'), ('10.0.0.2', 9010))
+        self.assertEqual(parse_relay_address('[fd00::2]:9010'), ('fd00::2', 9010))
+        self.assertEqual(parse_relay_address('fd00::2'), ('fd00::2', DEFAULT_RELAY_PORT))
+        for text in (':9010', 'relay.lan:99999', '[fd00::2', '[fd00::2]9010'):
+            with self.assertRaises(ValueError):
+                parse_relay_address(text)
+
+    def test_replayed_request_is_rejected(self):
+        server = RelayServer(('127.0.0.1', 0), '127.0.0.1', b'secret')
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        data = encode_request([bytes.fromhex('AABBCCDDEEFF')], self.port, b'secret')
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.settimeout(5)
+            sock.connect(server.server_address)
+            replies = []
+            for _ in range(2):
+                sock.send(data)
+                replies.append(sock.recv(16))
+
+        self.assertEqual(replies[0][3], STATUS_OK)
+        self.assertEqual(replies[1][3], STATUS_UNAUTHORIZED)
+        self.assertEqual(len(self.receive(1)[0]), 102)
+
+    def test_relay_requires_key(self):
+        env = dict(os.environ, PYTHONPATH=os.path.join(os.path.dirname(__file__), '..', 'src'))
+        env.pop(KEY_ENV, None)
+        relay = subprocess.run(
+            [sys.executable, '-m', 'simple_wol', 'relay', '--bind', '127.0.0.1', '--port', '0'],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, timeout=30)
+        self.assertNotEqual(relay.returncode, 0)
+        self.assertIn(KEY_ENV.encode(), relay.stderr)
+
+    def test_relay_end_to_end(self):
+        env = dict(os.environ, PYTHONPATH=os.path.join(os.path.dirname(__file__), '..', 'src'),
+                   **{KEY_ENV: 'secret'})
+        relay = subprocess.Popen(
+            [sys.executable, '-m', 'simple_wol', 'relay', '--bind', '127.0.0.1', '--port', '0',
+             '--broadcast', '127.0.0.1'],
+            stdout=subprocess.PIPE, env=env, universal_newlines=True)
+        self.addCleanup(relay.wait)
+        self.addCleanup(relay.kill)
+        relay_port = int(relay.stdout.readline().split()[-3].rsplit(':', 1)[1])
+
+        devices = [Device(str(i), f'AA:BB:CC:DD:EE:{i:02X}', port=self.port) for i in range(5)]
+        sent = relay_wake(('127.0.0.1', relay_port), devices, key=b'secret', timeout=5)
+
+        self.assertEqual(sent, 5)
+        self.assertEqual(sorted(self.receive(5)),
+                         sorted(b'\xff' * 6 + bytes.fromhex(f'AABBCCDDEE{i:02X}') * 16
+                                for i in range(5)))
+
+    def test_wake_command_sends_through_relay(self):
+        server = RelayServer(('127.0.0.1', 0), '127.0.0.1', b'secret')
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        config = os.path.join(tmpdir, 'devices.json')
+        key_file = os.path.join(tmpdir, 'relay.key')
+        with open(config, 'w') as f:
+            json.dump([Device('lab', 'AA:BB:CC:DD:EE:01', port=self.port, group='lab').to_dict()],
+                      f)
+        with open(key_file, 'w') as f:
+            f.write('secret\n')
+
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            status = wake_main(['--config', config, '--group', 'lab', '--relay',
+                                f'127.0.0.1:{server.server_address[1]}',
+                                '--relay-key-file', key_file])
+
+        self.assertEqual(status, 0, stdout.getvalue())
+        self.assertEqual(len(self.receive(1)), 1)
+
+
+ROUTE_TABLE = """Iface\tDestination\tGateway \tFlags\tRefCnt\tUse\tMetric\tMask\t\tMTU\tWindow\tIRTT
+eth0\t00000000\t0100A8C0\t0003\t0\t0\t100\t00000000\t0\t0\t0
+eth0\t0000A8C0\t00000000\t0001\t0\t0\t100\t00FFFFFF\t0\t0\t0
+eth1\t0000000A\t00000000\t0001\t0\t0\t0\t0000FFFF\t0\t0\t0
+"""
+
+FIB_TRIE = """Local:
+  +-- 0.0.0.0/0 3 0 5
+     |-- 10.0.3.7
+        /32 host LOCAL
+     |-- 10.0.255.255
+        /32 link BROADCAST
+     |-- 192.168.0.20
+        /32 host LOCAL
+"""
+
+
+class TestNetworkPlanner(unittest.TestCase):
+    """Tests for subnet-aware destination planning."""
+
+    def setUp(self):
+        self.planner = NetworkPlanner(ROUTE_TABLE, FIB_TRIE)
+
+    def test_connected_subnet_uses_directed_broadcast(self):
+        plan = self.planner.plan(Device('a', 'AA:BB:CC:DD:EE:FF', '10.0.40.2', 9))
+        self.assertEqual(plan, Destination('10.0.255.255', 9, 'eth1', '10.0.3.7'))
+
+    def test_remote_and_broadcast_devices(self):
+        remote = self.planner.plan(Device('a', 'AA:BB:CC:DD:EE:FF', '172.16.0.5', 7))
+        self.assertEqual(remote, Destination('172.16.0.5', 7, 'eth0', '192.168.0.20'))
+        broadcast = self.planner.plan(Device('b', 'AA:BB:CC:DD:EE:FF'))
+        self.assertEqual(broadcast, Destination('255.255.255.255', 9, 'eth0', '192.168.0.20'))
+
+    def test_group_by_destination(self):
+        devices = [Device(str(i), 'AA:BB:CC:DD:EE:FF', f'192.168.0.{i}') for i in range(1, 4)]
+        devices.append(Device('x', 'AA:BB:CC:DD:EE:FF', '10.0.0.1'))
+        groups = self.planner.group(devices)
+        self.assertEqual(sorted(len(group) for group in groups.values()), [1, 3])
+
+    def test_plans_expire(self):
+        now = [0.0]
+        planner = NetworkPlanner(ROUTE_TABLE, FIB_TRIE, max_age=60, clock=lambda: now[0])
+        device = Device('a', 'AA:BB:CC:DD:EE:FF', '10.0.40.2', 9)
+        planner.plan(device)
+        planner.routes = []
+        self.assertEqual(planner.plan(device).address, '10.0.255.255')
+
+        now[0] = 60.0
+        self.assertEqual(planner.plan(device).address, '10.0.255.255')
+        self.assertTrue(planner.routes)
+        self.assertEqual(len(planner._plans), 1)
+
+    def test_plans_stay_consistent_across_threads(self):
+        # Every plan call reloads the tables, so unlocked plans would see
+        # the routes of one load and the interfaces of another
+        now = [0.0]
+
+        def clock():
+            now[0] += 60.0
+            return now[0]
+
+        planner = NetworkPlanner(ROUTE_TABLE, FIB_TRIE, max_age=60, clock=clock)
+        devices = [Device('a', 'AA:BB:CC:DD:EE:FF', '10.0.40.2', 9),
+                   Device('b', 'AA:BB:CC:DD:EE:FF', '172.16.0.5', 7)]
+        expected = [planner.plan(device) for device in devices]
+        plans = []
+
+        def plan_all():
+            for _ in range(200):
+                plans.append([planner.plan(device) for device in devices])
+
+        threads = [threading.Thread(target=plan_all) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(plans, [expected] * 800)
+
+
+class TestWaveScheduler(unittest.TestCase):
+    """Tests for token-bucket paced wave wakes."""
+
+    def test_token_bucket(self):
+        now = [0.0]
+        bucket = TokenBucket(rate=10, burst=5, clock=lambda: now[0])
+        self.assertEqual(bucket.take(8), 5)
+        self.assertEqual(bucket.take(1), 0)
+        self.assertAlmostEqual(bucket.time_until(2), 0.2)
+        now[0] = 0.2
+        self.assertEqual(bucket.take(8), 2)
+
+    def test_estimate_duration(self):
+        scheduler = WaveScheduler(rate=10, burst=5, wave_size=10, wave_delay=1.0)
+        # Wave 1: 5 from the bucket, 5 more at 10/s. Pause refills the bucket.
+        self.assertAlmostEqual(scheduler.estimate_duration(10), 0.5)
+        self.assertAlmostEqual(scheduler.estimate_duration(20), 0.5 + 1.0 + 0.5)
+        self.assertEqual(scheduler.waves(21), 3)
+
+    def test_sends_every_device_in_waves(self):
+        batches = []
+
+        def send(devices):
+            batches.append(len(devices))
+            return [WakeResult(device, True) for device in devices]
+
+        devices = [Device(str(i), 'AA:BB:CC:DD:EE:FF') for i in range(25)]
+        scheduler = WaveScheduler(rate=1000, burst=4, wave_size=10, wave_delay=0.01, send=send)
+        run = scheduler.start(devices)
+
+        self.assertTrue(run.wait(5))
+        self.assertEqual([r.device for r in run.results], devices)
+        self.assertTrue(all(size <= 4 for size in batches))
+        self.assertEqual(sum(batches), 25)
+
+    def test_send_errors_do_not_hang_the_run(self):
+        def send(devices):
+            raise OSError("network is unreachable")
+
+        devices = [Device(str(i), 'AA:BB:CC:DD:EE:FF') for i in range(6)]
+        scheduler = WaveScheduler(rate=1000, burst=4, wave_size=10, wave_delay=0.01, send=send)
+        run = scheduler.start(devices)
+
+        self.assertTrue(run.wait(5))
+        self.assertEqual(len(run.results), 6)
+        self.assertFalse(any(result.success for result in run.results))
+        self.assertIn("network is unreachable", run.results[0].error)
+
+    def test_callback_errors_finish_the_run(self):
+        def on_progress(results):
+            raise RuntimeError("boom")
+
+        def send(devices):
+            return [WakeResult(device, True) for device in devices]
+
+        devices = [Device(str(i), 'AA:BB:CC:DD:EE:FF') for i in range(6)]
+        scheduler = WaveScheduler(rate=1000, burst=4, wave_size=10, wave_delay=0.01, send=send)
+        run = scheduler.start(devices, on_progress=on_progress)
+
+        self.assertTrue(run.wait(5))
+        self.assertIsInstance(run.error, RuntimeError)
+
+    def test_cancel_completes_once_and_stops_sending(self):
+        steps = []
+        sent = []
+        completed = []
+
+        def send(devices):
+            sent.extend(devices)
+            return [WakeResult(device, True) for device in devices]
+
+        devices = [Device(str(i), 'AA:BB:CC:DD:EE:FF') for i in range(10)]
+        scheduler = WaveScheduler(rate=1, burst=4, wave_size=10, wave_delay=1,
+                                  timer=lambda delay, step: steps.append(step), send=send)
+        run = scheduler.start(devices, on_complete=completed.append)
+        steps.pop()()
+        run.cancel()
+        run.cancel()
+        steps.pop()()
+
+        self.assertEqual(sent, devices[:4])
+        self.assertEqual(completed, [run])
+        self.assertTrue(run.cancelled and run.done())
+        self.assertEqual(steps, [])
+
+    def test_cancel_waits_for_the_batch_being_sent(self):
+        steps = []
+        completed = []
+        sending = threading.Event()
+        cancelled = threading.Event()
+
+        def send(devices):
+            sending.set()
+            # cancel() is blocked on the run's lock until this send returns
+            self.assertFalse(cancelled.wait(0.1))
+            return [WakeResult(device, True) for device in devices]
+
+        def cancel():
+            sending.wait(5)
+            run.cancel()
+            cancelled.set()
+
+        devices = [Device(str(i), 'AA:BB:CC:DD:EE:FF') for i in range(10)]
+        scheduler = WaveScheduler(rate=1, burst=4, wave_size=10, wave_delay=1,
+                                  timer=lambda delay, step: steps.append(step), send=send)
+        run = scheduler.start(devices, on_complete=completed.append)
+        canceller = threading.Thread(target=cancel)
+        canceller.start()
+        steps.pop()()
+        canceller.join(5)
+        for step in steps:
+            step()
+
+        self.assertTrue(cancelled.is_set())
+        self.assertEqual(len(run.results), 4)
+        self.assertEqual(completed, [run])
+
+
+
+class TestRetry(unittest.TestCase):
+    """Tests for retry policies and the shared timer queue."""
+
+    def test_policy_delays(self):
+        policy = RetryPolicy(count=4, interval=1, jitter=0, max_interval=3, backoff=2)
+        self.assertEqual(policy.delays(), [1, 3, 6, 9])
+
+    def test_device_overrides(self):
+        device = Device('a', 'AA:BB:CC:DD:EE:FF', retry={'count': 5})
+        policy = RetryPolicy.for_device(device, RetryPolicy(count=1, interval=2))
+        self.assertEqual((policy.count, policy.interval), (5, 2))
+        self.assertEqual(Device.from_dict(device.to_dict()).retry, {'count': 5})
+
+    def test_many_devices_share_one_thread(self):
+        sent = []
+        done = threading.Event()
+        devices = [Device(str(i), 'AA:BB:CC:DD:EE:FF') for i in range(500)]
+
+        def send(batch):
+            sent.extend(batch)
+            if len(sent) == len(devices) * 3:
+                done.set()
+            return [WakeResult(device, True) for device in batch]
+
+        timer = TimerQueue()
+        self.addCleanup(timer.stop)
+        threads = threading.active_count()
+        scheduler = RetryScheduler(RetryPolicy(count=2, interval=0.01, jitter=0.5), timer,
+                                   send, resolution=0.01, rng=random.Random(1))
+        scheduler.start(devices)
+
+        self.assertLessEqual(threading.active_count(), threads + 1)
+        self.assertTrue(done.wait(5))
+
+    def test_discard_skips_remaining_retries(self):
+        sent = []
+        timer = TimerQueue()
+        self.addCleanup(timer.stop)
+        device = Device('a', 'AA:BB:CC:DD:EE:FF')
+        scheduler = RetryScheduler(RetryPolicy(count=3, interval=0.05, jitter=0), timer,
+                                   lambda batch: sent.extend(batch) or [])
+        run = scheduler.start([device])
+        # An equal copy, e.g. from a reloaded device list, names the same device
+        run.discard(Device('a', 'aa-bb-cc-dd-ee-ff'))
+        threading.Event().wait(0.5)
+
+        self.assertEqual(sent, [device])
+
+    def test_resolution_must_be_positive(self):
+        for resolution in (0, -0.05):
+            with self.assertRaises(ValueError):
+                RetryScheduler(RetryPolicy(), resolution=resolution)
+
+    def test_retries_count_from_after_the_first_send(self):
+        scheduled = []
+
+        class Timer:
+            def call_later(self, delay, callback):
+                scheduled.append((delay, len(sent)))
+                return TimerHandle(delay, callback)
+
+        sent = []
+        scheduler = RetryScheduler(RetryPolicy(count=1, interval=0.07, jitter=0), Timer(),
+                                   lambda batch: sent.extend(batch) or [], resolution=0.05)
+        scheduler.start([Device('a', 'AA:BB:CC:DD:EE:FF')])
+
+        # Rounded up to the next slot, never down, and scheduled once the first packet is out
+        self.assertEqual(len(scheduled), 1)
+        self.assertAlmostEqual(scheduled[0][0], 0.1)
+        self.assertEqual(scheduled[0][1], 1)
+
+    def test_retry_errors_are_reported(self):
+        results = []
+        timer = TimerQueue()
+        self.addCleanup(timer.stop)
+
+        def send(batch):
+            raise OSError("network is unreachable")
+
+        scheduler = RetryScheduler(RetryPolicy(count=2, interval=0.01, jitter=0), timer, send)
+        run = scheduler.schedule([Device('a', 'AA:BB:CC:DD:EE:FF')], results.extend)
+
+        self.assertTrue(run.wait(5))
+        self.assertEqual(len(results), 2)
+        self.assertFalse(any(result.success for result in results))
+
+    def test_timer_queue_logs_callback_errors(self):
+        timer = TimerQueue()
+        self.addCleanup(timer.stop)
+        done = threading.Event()
+
+        def fail():
+            raise RuntimeError("boom")
+
+        with self.assertLogs('simple_wol.network.retry', level='ERROR'):
+            timer.call_later(0, fail)
+            timer.call_later(0.01, done.set)
+            self.assertTrue(done.wait(5))
+
+
+PROC_ARP = """\
+IP address       HW type     Flags       HW address            Mask     Device
+192.168.1.10     0x1         0x2         aa:bb:cc:dd:ee:01     *        eth0
+192.168.1.11     0x1         0x0         00:00:00:00:00:00     *        eth0
+192.168.1.12     0x1         0x2         aa:bb:cc:dd:ee:02     *        eth0
+"""
+
+IP_NEIGH = """\
+192.168.1.10 dev eth0 lladdr aa:bb:cc:dd:ee:01 REACHABLE
+192.168.1.13 dev eth0  FAILED
+fe80::1 dev eth0 lladdr aa:bb:cc:dd:ee:03 router STALE
+"""
+
+DNSMASQ_LEASES = """\
+1700000000 aa:bb:cc:dd:ee:04 192.168.1.20 printer 01:aa:bb:cc:dd:ee:04
+1700000000 aa:bb:cc:dd:ee:05 192.168.1.21 * *
+duid 00:01:00:01:2a:2b:2c:2d
+"""
+
+DHCPD_LEASES = """\
+lease 192.168.1.30 {
+  starts 1 2024/01/01 00:00:00;
+  binding state active;
+  next binding state free;
+  hardware ethernet aa:bb:cc:dd:ee:06;
+  client-hostname "lab-01";
+}
+lease 192.168.1.31 {
+  binding state active;
+  hardware ethernet aa:bb:cc:dd:ee:06;
+}
+lease 192.168.1.32 {
+  binding state free;
+  hardware ethernet aa:bb:cc:dd:ee:07;
+}
+"""
+
+
+class TestDiscovery(unittest.TestCase):
+    """Tests for neighbour table and lease file parsing."""
+
+    def pairs(self, neighbors):
+        return [(neighbor.mac_address, neighbor.ip_address, neighbor.hostname)
+                for neighbor in neighbors]
+
+    def test_neighbor_tables(self):
+        self.assertEqual(self.pairs(parse_proc_arp(PROC_ARP)),
+                         [('AA:BB:CC:DD:EE:01', '192.168.1.10', ''),
+                          ('AA:BB:CC:DD:EE:02', '192.168.1.12', '')])
+        self.assertEqual(self.pairs(parse_ip_neigh(IP_NEIGH)),
+                         [('AA:BB:CC:DD:EE:01', '192.168.1.10', ''),
+                          ('AA:BB:CC:DD:EE:03', 'fe80::1', '')])
+
+    def test_lease_files(self):
+        self.assertEqual(self.pairs(parse_dnsmasq_leases(DNSMASQ_LEASES)),
+                         [('AA:BB:CC:DD:EE:04', '192.168.1.20', 'printer'),
+                          ('AA:BB:CC:DD:EE:05', '192.168.1.21', '')])
+        self.assertEqual(self.pairs(parse_dhcpd_leases(DHCPD_LEASES)),
+                         [('AA:BB:CC:DD:EE:06', '192.168.1.31', '')])
+
+
+if __name__ == '__main__':
+    unittest.main()
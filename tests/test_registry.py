@@ -0,0 +1,138 @@
+"""
+Tests for the indexed device registry.
+"""
+
+import sys
+import os
+import unittest
+
+# Add src to path for testing
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from simple_wol.cli import select_devices
+from simple_wol.device import Device
+from simple_wol.registry import DeviceRegistry
+
+
+def make_devices(count):
+    return [Device(f'device-{i}', f'00:11:22:33:{i // 256:02X}:{i % 256:02X}',
+                   f'10.0.{i // 256}.{i % 256}') for i in range(count)]
+
+
+class TestDeviceRegistry(unittest.TestCase):
+    """Tests for DeviceRegistry."""
+
+    def setUp(self):
+        self.registry = DeviceRegistry(make_devices(5))
+        self.ids = self.registry.ids()
+
+    def test_lookups(self):
+        self.assertEqual(self.registry.by_mac('00-11-22-33-00-03'), [self.ids[3]])
+        self.assertEqual(self.registry.by_mac('001122330003'), [self.ids[3]])
+        self.assertEqual(self.registry.by_ip('10.0.0.2'), [self.ids[2]])
+        self.assertEqual(self.registry.by_name('DEVICE-4'), [self.ids[4]])
+        self.assertEqual(self.registry.by_mac('00:11:22:33:99:99'), [])
+
+    def test_ids_survive_edits_sorts_and_removals(self):
+        self.registry.update(self.ids[1], Device('zeta', '00:11:22:33:00:01', '10.0.0.99'))
+        self.registry.remove(self.ids[0])
+        self.registry.sort('name', reverse=True)
+
+        self.assertEqual(self.registry.get(self.ids[1]).name, 'zeta')
+        self.assertEqual(self.registry.position(self.ids[1]), 0)
+        self.assertEqual(self.registry.by_ip('10.0.0.99'), [self.ids[1]])
+        self.assertEqual(self.registry.by_ip('10.0.0.1'), [])
+        self.assertEqual(self.registry.by_name('device-1'), [])
+        self.assertNotIn(self.ids[0], self.registry)
+        self.assertEqual([device.name for device in self.registry],
+                         ['zeta', 'device-4', 'device-3', 'device-2'])
+
+        new_id = self.registry.add(Device('added', 'AA:BB:CC:DD:EE:FF'))
+        self.assertNotIn(new_id, self.ids)
+        self.assertEqual(self.registry.position(new_id), 4)
+
+    def test_extend(self):
+        ids = self.registry.extend([Device('alpha', 'AA:BB:CC:DD:EE:01'),
+                                    Device('device-10', 'AA:BB:CC:DD:EE:02')])
+
+        self.assertEqual([self.registry.position(device_id) for device_id in ids], [5, 6])
+        self.assertEqual(self.registry.by_mac('AA:BB:CC:DD:EE:02'), [ids[1]])
+        self.assertEqual(self.registry.name_prefix('alp'), [ids[0]])
+        self.assertEqual(self.registry.name_prefix('device-1'), [self.ids[1], ids[1]])
+
+    def test_name_prefix(self):
+        self.registry.add(Device('Desk', 'AA:BB:CC:DD:EE:01'))
+        self.registry.add(Device('desktop', 'AA:BB:CC:DD:EE:02'))
+
+        found = self.registry.name_prefix('DES')
+        self.assertEqual([self.registry.get(device_id).name for device_id in found],
+                         ['Desk', 'desktop'])
+        self.assertEqual(len(self.registry.name_prefix('device-', limit=2)), 2)
+        self.assertEqual(self.registry.name_prefix('x'), [])
+
+    def test_remove_many_and_replace(self):
+        removed = self.registry.remove_many([self.ids[1], self.ids[3], 12345])
+        self.assertEqual([device.name for device in removed], ['device-1', 'device-3'])
+        self.assertEqual([device.name for device in self.registry.devices()],
+                         ['device-0', 'device-2', 'device-4'])
+        self.assertEqual(self.registry.position(self.ids[4]), 2)
+
+        new_ids = self.registry.replace(make_devices(2))
+        self.assertEqual(len(self.registry), 2)
+        self.assertTrue(set(new_ids).isdisjoint(self.ids))
+        self.assertEqual(self.registry.name_prefix('device'), new_ids)
+
+    def test_assign_keeps_ids_by_mac(self):
+        kept = self.registry.get(self.ids[2])
+        renamed = Device('renamed', '00-11-22-33-00-04')
+        self.registry.assign([renamed, kept, Device('new', 'AA:BB:CC:DD:EE:FF')])
+
+        ids = self.registry.ids()
+        self.assertEqual(ids[:2], [self.ids[4], self.ids[2]])
+        self.assertNotIn(ids[2], self.ids)
+        self.assertNotIn(self.ids[0], self.registry)
+        self.assertEqual(self.registry.by_name('renamed'), [self.ids[4]])
+        self.assertEqual(self.registry.by_name('device-4'), [])
+        self.assertEqual(self.registry.position(ids[2]), 2)
+        self.assertEqual(self.registry.name_prefix(''), [self.ids[2], ids[2], self.ids[4]])
+
+    def test_groups_and_tags(self):
+        self.registry.update(self.ids[0], Device('a', '00:11:22:33:00:00', group='Rack 1',
+                                                 tags=['build', 'Linux']))
+        self.registry.update(self.ids[1], Device('b', '00:11:22:33:00:01', group='rack 1',
+                                                 tags='build'))
+        self.registry.update(self.ids[2], Device('c', '00:11:22:33:00:02', tags=['linux']))
+
+        self.assertEqual(self.registry.by_group('RACK 1'), [self.ids[0], self.ids[1]])
+        self.assertEqual(self.registry.by_tag('linux'), [self.ids[0], self.ids[2]])
+        self.assertEqual([device.name for device in self.registry.devices_with_tag('Build')],
+                         ['a', 'b'])
+        self.assertEqual(self.registry.groups(), ['Rack 1'])
+        self.assertEqual(self.registry.tags(), ['build', 'Linux'])
+
+        self.registry.remove(self.ids[0])
+        self.assertEqual(self.registry.by_tag('build'), [self.ids[1]])
+        self.assertEqual(self.registry.tags(), ['build', 'linux'])
+
+        selected = select_devices(self.registry, groups=['rack 1'], tags=['linux'],
+                                  names=['device-4', 'c'])
+        self.assertEqual([device.name for device in selected], ['b', 'c', 'device-4'])
+
+    def test_devices_from_hand_edited_files(self):
+        registry = DeviceRegistry([Device.from_dict({'name': 'nas', 'mac_address': 'AA:BB:CC:DD:EE:FF',
+                                                     'group': None})])
+        self.assertEqual(len(registry.by_group('')), 1)
+        self.assertEqual(registry.groups(), [])
+
+    def test_large_registry(self):
+        registry = DeviceRegistry(make_devices(50000))
+        window = registry.ids(25000, 25030)
+        self.assertEqual(len(window), 30)
+        self.assertEqual(registry.position(window[0]), 25000)
+        self.assertEqual(registry.get(window[-1]).name, 'device-25029')
+        self.assertEqual(len(registry.by_mac('00:11:22:33:C3:4F')), 1)
+        self.assertEqual(len(registry.name_prefix('device-4999')), 11)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+"""
+Tests for device field validation.
+"""
+
+import sys
+import os
+import unittest
+
+# Add src to path for testing
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from simple_wol import validation
+from simple_wol.config.importer import validate_records
+from simple_wol.device import Device
+
+
+class TestValidation(unittest.TestCase):
+    """Tests for single values and columns."""
+
+    def test_mac_forms(self):
+        for mac in ('aa:bb:cc:dd:ee:ff', 'AA-BB-CC-DD-EE-FF', 'aabb.ccdd.eeff', 'AABBCCDDEEFF'):
+            self.assertTrue(validation.validate_mac_address(mac), mac)
+            self.assertEqual(validation.normalize_mac(mac), 'AA:BB:CC:DD:EE:FF')
+        for mac in ('AA:BB-CC:DD:EE:FF', 'AA:BB:CC:DD:EE', 'GG:BB:CC:DD:EE:FF', '', None):
+            self.assertFalse(validation.validate_mac_address(mac), mac)
+            with self.assertRaises(ValueError):
+                validation.mac_to_bytes(mac)
+
+    def test_ip_addresses(self):
+        self.assertTrue(validation.validate_ip_address('192.168.1.10'))
+        self.assertEqual(validation.normalize_ip('FE80:0:0::1'), 'fe80::1')
+        # inet_aton would take these as shorthand for 0.0.0.1 and 1.2.0.3
+        for ip in ('1', '1.2.3', '256.1.1.1', 'nas.local', ''):
+            self.assertFalse(validation.validate_ip_address(ip), ip)
+
+    def test_host_names(self):
+        for name in ('nas', 'nas.local', 'build-01.lab.example.com.'):
+            self.assertTrue(validation.validate_host_name(name), name)
+        for name in ('', '1.2.3', '-nas', 'a b', 'x' * 64, None):
+            self.assertFalse(validation.validate_host_name(name), name)
+        ips = validation.validate_ips(['nas.local', '1.2.3'], allow_host_names=True)
+        self.assertEqual(ips.values, ['nas.local', None])
+
+    def test_ports(self):
+        self.assertEqual(validation.parse_port('7'), 7)
+        self.assertEqual(validation.parse_port(9.0), 9)
+        for port in ('-1', 65536, 9.5, 'x', None):
+            with self.assertRaises(ValueError):
+                validation.parse_port(port)
+
+    def test_columns_report_each_bad_row(self):
+        macs = validation.validate_macs(['aa-bb-cc-dd-ee-01', 'nope', 'AABBCCDDEE03', 42])
+        self.assertEqual(macs.values, ['AA:BB:CC:DD:EE:01', None, 'AA:BB:CC:DD:EE:03', None])
+        self.assertEqual([error.row for error in macs.errors], [1, 3])
+        self.assertEqual(macs.errors[0].field, 'mac_address')
+
+        ips = validation.validate_ips(['', '10.0.0.1', '1', '::1'])
+        self.assertEqual(ips.values, ['', '10.0.0.1', None, '::1'])
+        self.assertEqual([error.row for error in ips.errors], [2])
+        self.assertEqual(len(validation.validate_ips([''], allow_empty=False).errors), 1)
+
+        ports = validation.validate_ports([None, '', '7', '70000'], default=9)
+        self.assertEqual(ports.values, [9, 9, 7, None])
+        self.assertEqual([error.row for error in ports.errors], [3])
+
+    def test_validate_records(self):
+        devices, errors = validate_records([
+            {'name': 'nas', 'mac_address': 'aabb.ccdd.ee01', 'port': '7'},
+            {'name': '', 'mac_address': 'AA:BB:CC:DD:EE:02'},
+            {'name': 'bad ip', 'mac_address': 'AA:BB:CC:DD:EE:03', 'ip_address': '1'},
+            'not a record',
+            {'name': 'desk', 'mac_address': 'AA:BB:CC:DD:EE:05', 'ip_address': '10.0.0.5',
+             'updated_at': '1700000000'},
+        ])
+
+        self.assertEqual([(device.name, device.mac_address, device.port, device.updated_at)
+                          for device in devices],
+                         [('nas', 'AA:BB:CC:DD:EE:01', 7, None),
+                          ('desk', 'AA:BB:CC:DD:EE:05', 9, 1700000000.0)])
+        self.assertEqual([row for row, _ in errors], [1, 2, 3])
+        self.assertIn('name', errors[0][1])
+        self.assertIn('IP address', errors[1][1])
+
+
+class TestDevice(unittest.TestCase):
+    """Tests for the packed device representation."""
+
+    def test_mac_is_canonical(self):
+        a = Device('a', 'aa-bb-cc-dd-ee-ff')
+        b = Device('b', 'AABB.CCDD.EEFF')
+        self.assertEqual(a.mac_address, 'AA:BB:CC:DD:EE:FF')
+        self.assertEqual(a.mac_bytes, bytes.fromhex('AABBCCDDEEFF'))
+        self.assertEqual(a.mac_bytes, b.mac_bytes)
+        self.assertEqual(len({a.mac_bytes, b.mac_bytes}), 1)
+
+    def test_ip_is_parsed(self):
+        device = Device('nas', 'AA:BB:CC:DD:EE:FF', 'FE80::0:1', 7)
+        self.assertEqual(device.ip_address, 'fe80::1')
+        self.assertEqual(device.ip.version, 6)
+        device.ip_address = '192.168.1.5'
+        self.assertEqual(device.ip_address, '192.168.1.5')
+        self.assertEqual(str(device.ip), '192.168.1.5')
+        device.ip_address = ''
+        self.assertIsNone(device.ip)
+
+    def test_unparsed_values_are_kept(self):
+        device = Device('old', 'not-a-mac', 'nas.local')
+        self.assertEqual(device.mac_address, 'NOT-A-MAC')
+        self.assertIsNone(device.mac_bytes)
+        self.assertEqual(device.ip_address, 'nas.local')
+        self.assertIsNone(device.ip)
+        self.assertEqual(Device.from_dict(device.to_dict()).to_dict(), device.to_dict())
+
+    def test_group_is_normalized(self):
+        device = Device.from_dict({'name': 'nas', 'mac_address': 'AA:BB:CC:DD:EE:FF',
+                                   'group': None, 'tags': None})
+        self.assertEqual((device.group, device.tags), ('', ()))
+        device.group = '  Rack 1 '
+        self.assertEqual(device.group, 'Rack 1')
+        self.assertEqual(Device('x', 'AA:BB:CC:DD:EE:01', group=3).group, '3')
+
+    def test_packed_round_trip_and_slots(self):
+        device = Device('desk', 'AA:BB:CC:DD:EE:01', '10.0.0.1', 9, {'count': 2}, 1700000000.0)
+        copy = Device.from_packed(*device.to_packed())
+        self.assertEqual(copy.to_dict(), device.to_dict())
+        with self.assertRaises(AttributeError):
+            device.nickname = 'x'
+
+
+if __name__ == '__main__':
+    unittest.main()